@@ -1,6 +1,6 @@
-import numpy as np
+from knowledge import read_knowledge
 
-knowledge = np.load('Knowledge.npy', allow_pickle=True).item()
+knowledge = read_knowledge('Knowledge.npy')
 
 sorted_keys = list(knowledge.keys())
 sorted_keys.sort()
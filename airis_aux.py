@@ -6,8 +6,11 @@ import random
 import time
 import multiprocessing
 from operator import itemgetter
+from bisect import bisect_left
 from datetime import datetime
 from model import Model
+from snapshots import SnapshotStore
+from condition_index import ConditionIndex
 from other_useful_functions import *
 
 
@@ -19,7 +22,7 @@ class AIRIS(object):
         if DEBUG_WITH_LOGFILE:
             open(DEBUG_LOGFILE_PATH, 'w').close()
 
-        pprint('initializing AIRIS ...', new_line_start=True, draw_line=False)
+        log('initializing AIRIS ...', new_line_start=True, draw_line=False)
         start_time = datetime.now()
 
         # visual and non-visual (auxiliary)
@@ -32,6 +35,18 @@ class AIRIS(object):
         self.posterior_vis_env = np.array(vis_env, dtype=np.float32)
         self.posterior_aux_env = np.array(aux_env, dtype=np.float32)
 
+        # vis_data / aux_data snapshots shared by the conditions that stored them
+        self.snapshots = SnapshotStore()
+
+        # conditions of every action/output/focus value path compiled into numpy arrays for
+        # compare_conditions, see condition_refs and condition_data
+        self.ref_tables = {}
+        self.data_tables = {}
+        # aux_raw values of every action/output sorted for make_plan, see aux_raw_pairs
+        self.aux_raw_tables = {}
+        # vis_data / aux_data of the conditions, for the raw differences of compare_conditions and make_plan
+        self.condition_index = ConditionIndex()
+
         # load existing knowledge or create a new knowledge dictionary
         try:
             self.load_knowledge()
@@ -93,7 +108,7 @@ class AIRIS(object):
         self.round_to = 2
         self.assume_sample_size = 2
 
-        pprint('initialization complete. duration: %s' % (datetime.now() - start_time))
+        log('initialization complete. duration: %s', datetime.now() - start_time)
 
     def print_mind(self, indent=DEFAULT_INDENT, num_indents=0,
                    new_line_start=False, new_line_end=False,
@@ -394,7 +409,7 @@ class AIRIS(object):
 
         # main loop of AIRIS
 
-        pprint('capturing input ...', num_indents=num_indents,
+        log('capturing input ...', num_indents=num_indents,
             new_line_start=True)
         start_time = datetime.now()
 
@@ -403,7 +418,7 @@ class AIRIS(object):
         if prior:
 
             # save this environment
-            pprint('storing env before the action (prior) ...',
+            log('storing env before the action (prior) ...',
                 num_indents=num_indents + 1, new_line_start=True)
             self.prior_vis_env = np.array(vis_env, dtype=np.float32)
             self.prior_aux_env = np.array(aux_env, dtype=np.float32)
@@ -413,9 +428,9 @@ class AIRIS(object):
 
             # if its not made a plan yet
             while not self.action_plan and not self.goal_reached:
-                pprint('no plan has been made yet',
+                log('no plan has been made yet',
                     num_indents=num_indents + 1, new_line_start=True)
-                pprint('self.action_plan:\t%s' % self.action_plan,
+                log('self.action_plan:\t%s', self.action_plan,
                     num_indents=num_indents + 2)
 
                 # clear old models, create a new model of this environment
@@ -427,7 +442,7 @@ class AIRIS(object):
                 self.current_model_index = self.create_model(-1, num_indents=num_indents + 2)
 
                 # why is this a while loop ................................
-                pprint('while there is no plan ...',
+                log('while there is no plan ...',
                     num_indents=num_indents + 2, new_line_start=True)
 
                 self.store_worst_index = None
@@ -442,7 +457,7 @@ class AIRIS(object):
             if self.action_plan:
                 # get the action at the end of the list
                 if self.store_worst_index != None and len(self.action_plan) == 1:
-                    pprint('Adding to worst set: '+str(self.store_worst),
+                    log('Adding to worst set: %s', self.store_worst,
                         num_indents=num_indents + 1, new_line_start=True)
                     self.worst_set.add(self.store_worst)
 
@@ -454,23 +469,22 @@ class AIRIS(object):
                 while hold_plan:
                     self.display_plan.append(hold_plan.pop()[2])
 
-                pprint('popping the next action/output off the end of the plan ...',
+                log('popping the next action/output off the end of the plan ...',
                     num_indents=num_indents + 1, new_line_start=True)
                 action, output, predicted_model_index = self.action_plan.pop()
 
                 self.current_model_index = predicted_model_index
 
-                pprint('(action, output, predicted_model_index) = (%s, %s, %s)'
-                    % (action, output, predicted_model_index),
+                log('(action, output, predicted_model_index) = (%s, %s, %s)', action, output, predicted_model_index,
                     num_indents=num_indents + 1)
 
-                pprint('do the action in the game', num_indents=1, new_line_start=True)
+                log('do the action in the game', num_indents=1, new_line_start=True)
 
             else:
                 action = None
-                pprint('No action needs to be taken', num_indents=1, new_line_start=True)
+                log('No action needs to be taken', num_indents=1, new_line_start=True)
 
-            pprint('input captured. duration: %s' % (datetime.now() - start_time),
+            log('input captured. duration: %s', datetime.now() - start_time,
                 new_line_start=True, draw_line=True)
 
             return (action, self.models[self.current_model_index].predicted_vis_change, self.models[self.current_model_index].predicted_aux_change)
@@ -480,7 +494,7 @@ class AIRIS(object):
         else:
 
             # save this environment
-            pprint('storing env after the action (posterior) ...',
+            log('storing env after the action (posterior) ...',
                 num_indents=num_indents + 1, new_line_start=True)
             self.posterior_vis_env = np.array(vis_env, dtype=np.float32)
             self.posterior_aux_env = np.array(aux_env, dtype=np.float32)
@@ -496,7 +510,7 @@ class AIRIS(object):
 
             # self.print_mind(prior=False)
 
-            pprint('input captured. duration: %s' % (datetime.now() - start_time),
+            log('input captured. duration: %s', datetime.now() - start_time,
                 new_line_start=True, draw_line=True)
 
     def create_model(self, from_model_index, num_indents=0):
@@ -506,7 +520,7 @@ class AIRIS(object):
         # for the 1st model
         if from_model_index < 0:
 
-            pprint('creating a model from this environment ...',
+            log('creating a model from this environment ...',
                 num_indents=num_indents, new_line_start=True)
             start_time = datetime.now()
 
@@ -517,7 +531,7 @@ class AIRIS(object):
                 new_line_start=True)
 
             # add any new inputs to the visual and non-visual global sets
-            pprint('adding any new inputs to the visual and auxiliary global sets',
+            log('adding any new inputs to the visual and auxiliary global sets',
                 num_indents=num_indents + 1, new_line_start=True)
             self.vis_global_set.update(set(self.prior_vis_env.flatten()))
             self.aux_global_set.update(set(self.prior_aux_env))
@@ -546,7 +560,7 @@ class AIRIS(object):
 
         else:  # for the rest of the models
 
-            pprint('creating a model from model %s ...' % from_model_index,
+            log('creating a model from model %s ...', from_model_index,
                 num_indents=num_indents, new_line_start=True)
             start_time = datetime.now()
 
@@ -555,12 +569,12 @@ class AIRIS(object):
                 Model(prev_model=self.models[from_model_index],
                       prev_model_index=from_model_index))
 
-        pprint('updating self.current_model_index', num_indents=num_indents + 1,
+        log('updating self.current_model_index', num_indents=num_indents + 1,
             new_line_start=True)
-        pprint('from:\t\t\t%s' % self.current_model_index, num_indents=num_indents + 2)
-        pprint('to:  \t\t\t%s' % (len(self.models) - 1), num_indents=num_indents + 2)
+        log('from:\t\t\t%s', self.current_model_index, num_indents=num_indents + 2)
+        log('to:  \t\t\t%s', len(self.models) - 1, num_indents=num_indents + 2)
 
-        pprint('model created. duration: %s' % (datetime.now() - start_time),
+        log('model created. duration: %s', datetime.now() - start_time,
             num_indents=num_indents, new_line_start=True, draw_line=True)
         return len(self.models) - 1
 
@@ -587,7 +601,7 @@ class AIRIS(object):
         self.goal_condition = None
         self.goal_value = None
 
-        pprint('setting a goal ...',
+        log('setting a goal ...',
             num_indents=num_indents, new_line_start=True)
         start_time = datetime.now()
 
@@ -596,7 +610,7 @@ class AIRIS(object):
         no_conditions = False
 
         # pick a random action
-        pprint('picking a random action/output ...', num_indents=num_indents + 1,
+        log('picking a random action/output ...', num_indents=num_indents + 1,
             new_line_start=True)
         action_index = random.choice(range(len(self.action_space)))
         self.goal_action = self.action_space[action_index]
@@ -606,15 +620,15 @@ class AIRIS(object):
         action_output = self.action_output_list[action_index]
         output_range = range(action_output[0], action_output[1], action_output[2])
         self.goal_output = str(random.choice(output_range))
-        pprint('self.goal_action = %s' % self.goal_action, num_indents=num_indents + 2)
-        pprint('self.goal_output = %s' % self.goal_output, num_indents=num_indents + 2)
+        log('self.goal_action = %s', self.goal_action, num_indents=num_indents + 2)
+        log('self.goal_output = %s', self.goal_output, num_indents=num_indents + 2)
 
-        pprint('goal_type: %s' % self.goal_type,
+        log('goal_type: %s', self.goal_type,
             num_indents=num_indents + 1, new_line_start=True)
 
         if self.goal_type == 'Random':
 
-            pprint('searching for knowledge of this action/output',
+            log('searching for knowledge of this action/output',
                 num_indents=num_indents + 1, new_line_start=True, draw_line=False)
 
             # see if there's knowledge of this random action/output
@@ -626,16 +640,16 @@ class AIRIS(object):
                 knowledge_found = copy.deepcopy(self.knowledge[path])
                 knowledge_prune = []
 
-                pprint('knowledge found.', num_indents=num_indents + 2)
+                log('knowledge found.', num_indents=num_indents + 2)
                 # set self.focus_pos to the pos of a focus_value in the current model
                 model = self.models[self.current_model_index]  # current model
 
                 # prune all knowledge found whose focus_value is not in model.vis_env_count_list
-                pprint('Pruning found knowledge:', num_indents=num_indents + 2)
+                log('Pruning found knowledge:', num_indents=num_indents + 2)
                 for knowledge_focus in knowledge_found:
                     if knowledge_focus[0] != 'A':
                         if float(knowledge_focus) not in model.vis_count_list:
-                            pprint('focus value ' + str(knowledge_focus) + ' not in visual count', num_indents=num_indents + 3)
+                            log('focus value %s not in visual count', knowledge_focus, num_indents=num_indents + 3)
                             knowledge_prune.append(knowledge_focus)
 
                 for val in knowledge_prune:
@@ -659,7 +673,7 @@ class AIRIS(object):
                         except KeyError:
                             pass
                     if not keep:
-                        pprint('focus value ' + str(knowledge_focus) + ' no vis_ref in any condition data', num_indents=num_indents + 3)
+                        log('focus value %s no vis_ref in any condition data', knowledge_focus, num_indents=num_indents + 3)
                         knowledge_prune.append(knowledge_focus)
 
                 for val in knowledge_prune:
@@ -668,10 +682,10 @@ class AIRIS(object):
                     else:
                         no_conditions = True
 
-                pprint('MODEL FOCUS VALUE DEFAULT '+str(model.focus_value), num_indents=num_indents + 7)
+                log('MODEL FOCUS VALUE DEFAULT %s', model.focus_value, num_indents=num_indents + 7)
 
                 # set model.focus_value to a random focus value in knowledge_found
-                pprint('selecting a random focus_value from the usable knowledge:', num_indents=num_indents + 2)
+                log('selecting a random focus_value from the usable knowledge:', num_indents=num_indents + 2)
                 if knowledge_found:
                     model.focus_value = random.choice(knowledge_found)
                 else:
@@ -688,12 +702,11 @@ class AIRIS(object):
                     model.focus_value_is_aux else float(model.focus_value)
                 self.goal_focus_value = copy.deepcopy(model.focus_value)
                 self.print_focus_value(num_indents=4)
-                pprint('flag model.focus_value_is_aux:\t%s' %
-                    model.focus_value_is_aux, num_indents=num_indents + 2)
-                pprint('model.focus_value: '+str(model.focus_value), num_indents=num_indents + 2)
+                log('flag model.focus_value_is_aux:\t%s', model.focus_value_is_aux, num_indents=num_indents + 2)
+                log('model.focus_value: %s', model.focus_value, num_indents=num_indents + 2)
 
                 # choose a random goal condition
-                pprint('selecting a random goal_condition from the knowledge:',
+                log('selecting a random goal_condition from the knowledge:',
                     num_indents=num_indents + 2, new_line_start=True)
 
                 if not no_conditions:
@@ -729,10 +742,10 @@ class AIRIS(object):
                 self.goal_type = self.goal_type_default
 
             except KeyError:
-                pprint('we have no knowledge of this action/output', num_indents=num_indents + 2)
+                log('we have no knowledge of this action/output', num_indents=num_indents + 2)
                 self.goal_type = 'New Action'  # do an action we've not done before
                 goal_found = True
-                pprint('goal_type reset to:\t%s' % self.goal_type, num_indents=num_indents + 2)
+                log('goal_type reset to:\t%s', self.goal_type, num_indents=num_indents + 2)
 
             fv = str(model.focus_value) if not model.focus_value_is_aux else 'A' + str(model.focus_value)
             gc = str(self.goal_condition) if self.goal_condition else ''
@@ -743,7 +756,7 @@ class AIRIS(object):
 
             if not goal_found and not no_conditions:
                 try:
-                    pprint('searching for goal_source knowledge at: ' + path + '/vis_ref',
+                    log('searching for goal_source knowledge at: %s/vis_ref', path,
                            num_indents=num_indents + 1, new_line_start=True)
 
                     while True:
@@ -760,18 +773,18 @@ class AIRIS(object):
                                 # self.goal_value = prior_val if goal_type == 'Fixed' else \
                                 # random.sample(self.vis_global_set, 1)[0]
                                 goal_found = True
-                                pprint('knowledge found, goal_source set to:', num_indents=num_indents + 2)
+                                log('knowledge found, goal_source set to:', num_indents=num_indents + 2)
                                 self.print_goal_source(num_indents=num_indents + 3)
                                 break
                         except KeyError:
                             pass
                 except KeyError:
-                    pprint('knowledge not found', num_indents=num_indents + 2)
+                    log('knowledge not found', num_indents=num_indents + 2)
                     # pass
 
             if not goal_found and self.goal_condition:
                 try:
-                    pprint('searching for goal_source knowledge at: ' + path + '/aux_ref',
+                    log('searching for goal_source knowledge at: %s/aux_ref', path,
                            num_indents=num_indents + 1, new_line_start=True)
                     i, val, _ = random.choice(self.knowledge[path + '/aux_ref'])
                     self.goal_source = {
@@ -783,10 +796,10 @@ class AIRIS(object):
                     self.goal_value = val if self.goal_type == 'Fixed' else \
                         random.sample(self.aux_global_set, 1)[0]
                     goal_found = True
-                    pprint('knowledge found, goal_source set to:', num_indents=num_indents + 2)
+                    log('knowledge found, goal_source set to:', num_indents=num_indents + 2)
                     self.print_goal_source(num_indents=num_indents + 3)
                 except KeyError:
-                    pprint('knowledge not found', num_indents=num_indents + 2)
+                    log('knowledge not found', num_indents=num_indents + 2)
                     # pass
 
         if self.goal_type == 'Predict':
@@ -810,18 +823,18 @@ class AIRIS(object):
 
 
         if goal_found:
-            pprint('goal set. duration: %s' % (datetime.now() - start_time),
+            log('goal set. duration: %s', datetime.now() - start_time,
                 num_indents=num_indents, new_line_start=True, draw_line=True)
 
     def make_plan(self, action, num_indents=0):
 
         # tbd when goal_type is not New Action
 
-        pprint('making a plan to achieve the goal ...',
+        log('making a plan to achieve the goal ...',
             num_indents=num_indents, new_line_start=True)
         start_time = datetime.now()
 
-        pprint('goal_type: %s' % self.goal_type,
+        log('goal_type: %s', self.goal_type,
             num_indents=num_indents + 1, new_line_start=True)
 
         # how many steps are in the plan
@@ -829,7 +842,7 @@ class AIRIS(object):
         worst_condition = []
         new_condition = []
 
-        pprint('GOALVALUE '+str(self.goal_value), num_indents=num_indents+1)
+        log('GOALVALUE %s', self.goal_value, num_indents=num_indents+1)
 
         if (self.goal_type == 'Random' and self.goal_value != None) or self.goal_type == 'Fixed':
 
@@ -864,7 +877,7 @@ class AIRIS(object):
             if model.compare == 999999:
                 self.goal_reached = True
 
-            pprint('MODELCOMPARE '+str(model.compare), num_indents=num_indents + 1)
+            log('MODELCOMPARE %s', model.compare, num_indents=num_indents + 1)
 
             while not self.goal_reached and base_model_heap and plan_depth <= self.action_plan_depth_limit:
 
@@ -884,14 +897,14 @@ class AIRIS(object):
                 #         break
                 base_model = heapq.heappop(base_model_heap)[1]
                 plan_depth += 1
-                pprint(str(plan_depth) + ' / ' + str(self.action_plan_depth_limit), num_indents=num_indents + 1)
+                log('%s / %s', plan_depth, self.action_plan_depth_limit, num_indents=num_indents + 1)
                 for action_index, try_action in enumerate(self.action_space):
                     if not self.goal_reached:
                         for try_output in range(self.action_output_list[action_index][0], self.action_output_list[action_index][1], self.action_output_list[action_index][2]):
                             self.current_model_index = base_model
                             model = self.models[self.current_model_index]
                             hold_depth = model.depth
-                            pprint('base model depth: '+str(model.depth), num_indents=num_indents + 1)
+                            log('base model depth: %s', model.depth, num_indents=num_indents + 1)
                             self.predict(try_action, try_output, num_indents=num_indents + 1)
                             if model.best_condition_id:
                                 worst_dif = int(copy.deepcopy(model.best_condition_dif))
@@ -906,8 +919,8 @@ class AIRIS(object):
                                 if model.compare != 999999:
                                     worst_condition.append((worst_dif, model.previous_model_index, worst_id, model.compare, try_action, try_output, 999999, prev_model.focus_value, self.current_model_index))
 
-                                pprint('This model\'s (' + str(self.current_model_index) + ') depth: '+str(model.depth), num_indents=num_indents + 1)
-                                pprint('This model\'s (' + str(self.current_model_index) + ') compare: '+str(model.compare), num_indents=num_indents + 1)
+                                log("This model's (%s) depth: %s", self.current_model_index, model.depth, num_indents=num_indents + 1)
+                                log("This model's (%s) compare: %s", self.current_model_index, model.compare, num_indents=num_indents + 1)
                                 model_env = np.array_str(model.vis_env) \
                                           + np.array_str(model.aux_env)
                                 if model_env not in model_set:
@@ -918,7 +931,7 @@ class AIRIS(object):
                                     model_set.add(model_env)
                                 if model.compare == 0:
                                     if not model.focus_value_is_aux:
-                                        pprint('model compare Exception', num_indents=num_indents + 1)
+                                        log('model compare Exception', num_indents=num_indents + 1)
                                         self.predict(self.goal_action,self.goal_output, num_indents=num_indents + 1)
                                         if model.best_condition_id:
                                             source = self.current_model_index
@@ -934,7 +947,7 @@ class AIRIS(object):
                                         self.goal_reached = True
                                         break
                                     else:
-                                        pprint('model compare AUX Exception', num_indents=num_indents + 1)
+                                        log('model compare AUX Exception', num_indents=num_indents + 1)
                                         source = self.current_model_index
                                         model = self.models[source]
                                         while model.previous_model_index != None:
@@ -947,7 +960,7 @@ class AIRIS(object):
                                 source = self.models[self.current_model_index].previous_model_index
                                 new_condition.append((999999, self.current_model_index, None, self.models[source].compare , try_action, try_output, 999999, self.models[source].focus_value, self.current_model_index))
                     else:
-                        pprint('PLAN MADE!', num_indents=num_indents + 1)
+                        log('PLAN MADE!', num_indents=num_indents + 1)
                         break
 
             # if no successful plan can be found, make a plan to try the least accurate prediction
@@ -961,14 +974,16 @@ class AIRIS(object):
 
                     worst_condition.extend(new_condition)
 
-                    for i, (dif, index, id, compare, act, out, raw, focus, current) in enumerate(worst_condition):
-                        if id != None:
-                            raw_dif = 0
-                            path = self.models[index].best_condition_path
-                            condition_data_array = self.knowledge[path + 'vis_data']
-                            condition_aux_data_array = self.knowledge[path + 'aux_data']
-                            raw_dif = np.sum(array_dif(self.models[index].vis_env, condition_data_array))
-                            raw_dif += np.sum(array_dif(self.models[index].aux_env, condition_aux_data_array))
+                    # the raw difference of every worst condition's model to its best condition at once
+                    known = [i for i, condition in enumerate(worst_condition) if condition[2] != None]
+                    if known:
+                        known_models = [self.models[worst_condition[i][1]] for i in known]
+                        rows = [self.condition_index.row(self.knowledge, known_model.best_condition_path) for known_model in known_models]
+                        raw_difs = self.condition_index.distances(rows, [known_model.vis_env for known_model in known_models],
+                                                                  [known_model.aux_env for known_model in known_models])
+
+                        for i, raw_dif in zip(known, raw_difs):
+                            dif, index, id, compare, act, out, raw, focus, current = worst_condition[i]
                             worst_condition[i] = (dif, index, id, compare, act, out, round(raw_dif, 2), focus, current)
 
                     worst_condition_prune = copy.deepcopy(worst_condition)
@@ -978,7 +993,7 @@ class AIRIS(object):
                     for dif, index, id, compare, act, out, raw, focus, current in worst_condition_prune:
                         check_worst = (str(self.models[index].vis_env)+str(self.models[index].aux_env), act, out, raw)
                         if check_worst in self.worst_set:
-                            pprint('deleting duplicate worst_condition: ('+str(dif)+','+str(index)+','+str(act)+','+str(out)+','+str(raw)+')', num_indents=num_indents + 1)
+                            log('deleting duplicate worst_condition: (%s,%s,%s,%s,%s)', dif, index, act, out, raw, num_indents=num_indents + 1)
                             #print('deleting duplicate worst_condition: ('+str(dif)+','+str(index)+','+str(act)+','+str(out)+','+str(raw)+')')
                             worst_condition.remove((dif, index, id, compare, act, out, raw, focus, current))
 
@@ -998,7 +1013,7 @@ class AIRIS(object):
                     # if we cant figure out how to achieve our goal
                     # then instead, do whatever action we're the least confident about to see what action to do
                     if worst_condition:
-                        pprint('worst_condition: '+str(worst_condition), num_indents=num_indents + 1)
+                        log('worst_condition: %s', worst_condition, num_indents=num_indents + 1)
                         print('Trying the closest thing I can think of...')
                         print('worst_condition: ', worst_condition)
                         worst_index = worst_condition.index(min(worst_condition, key=itemgetter(3)))
@@ -1010,15 +1025,15 @@ class AIRIS(object):
                             print('I think I\'ve tried \''+str(worst_condition[worst_index][4])+'\' under these conditions before.')
                             self.action_plan.append((worst_condition[worst_index][4], worst_condition[worst_index][5], worst_condition[worst_index][8]))
                         elif worst_condition[worst_index][0] == 999999:
-                            pprint('New Action Exception', num_indents=num_indents + 1)
+                            log('New Action Exception', num_indents=num_indents + 1)
                             print('I don\'t know what will happen when I \''+str(worst_condition[worst_index][4])+'\' under these conditions...')
                             self.action_plan.append((worst_condition[worst_index][4], worst_condition[worst_index][5], worst_condition[worst_index][8]))
                             self.current_model_index = self.models[self.current_model_index].previous_model_index
                         elif 0 < worst_condition[worst_index][0] < 999999:
                             print('I\'m not sure about trying \''+str(worst_condition[worst_index][4])+'\' under these conditions...')
                             self.action_plan.append((worst_condition[worst_index][4], worst_condition[worst_index][5], worst_condition[worst_index][8]))
-                        pprint('Cannot determine how to achieve goal.', num_indents=num_indents + 1)
-                        pprint('Attempting worst_condition: '+str(worst_condition[worst_index]), num_indents=num_indents + 1)
+                        log('Cannot determine how to achieve goal.', num_indents=num_indents + 1)
+                        log('Attempting worst_condition: %s', worst_condition[worst_index], num_indents=num_indents + 1)
 
                         if self.current_model_index != None:
                             model = self.models[self.current_model_index]
@@ -1036,7 +1051,7 @@ class AIRIS(object):
                         self.current_model_index = closest_model
                         model = self.models[self.current_model_index]
                         if not model.focus_value_is_aux:
-                            pprint('model compare Exception', num_indents=num_indents + 1)
+                            log('model compare Exception', num_indents=num_indents + 1)
                             self.predict(self.goal_action, self.goal_output, num_indents=num_indents + 1)
                             if model.best_condition_id:
                                 source = self.current_model_index
@@ -1052,7 +1067,7 @@ class AIRIS(object):
                             self.goal_reached = True
 
                         else:
-                            pprint('model compare AUX Exception', num_indents=num_indents + 1)
+                            log('model compare AUX Exception', num_indents=num_indents + 1)
                             source = self.current_model_index
                             model = self.models[source]
                             while model.previous_model_index != None:
@@ -1061,38 +1076,38 @@ class AIRIS(object):
                                 model = self.models[source]  # model.previous is an index
                             self.goal_reached = True
 
-                        pprint('Cannot determine how to achieve goal.', num_indents=num_indents + 1)
-                        pprint('No more worst_condition\'s left to try.', num_indents=num_indents + 1)
-                        pprint('Closest I can think of is '+str(closest_model), num_indents=num_indents + 1)
+                        log('Cannot determine how to achieve goal.', num_indents=num_indents + 1)
+                        log('No more worst_condition\'s left to try.', num_indents=num_indents + 1)
+                        log('Closest I can think of is %s', closest_model, num_indents=num_indents + 1)
                         #pprint('Clearing worst_set:', num_indents=num_indents)
                         #self.worst_set.clear()
                         #print('Clearing worst_set')
 
         elif self.goal_type == 'New Action':
 
-            pprint('since the goal type is New Action', num_indents=num_indents + 2)
-            pprint('just append the randomly determined action/output', num_indents=num_indents + 2)
-            pprint('to the plan, along with self.current_model_index', num_indents=num_indents + 2)
+            log('since the goal type is New Action', num_indents=num_indents + 2)
+            log('just append the randomly determined action/output', num_indents=num_indents + 2)
+            log('to the plan, along with self.current_model_index', num_indents=num_indents + 2)
             self.action_plan.append((self.goal_action, self.goal_output, 0))
 
         elif self.goal_type == 'Predict':
-            pprint ('Making a prediction...', num_indents=num_indents + 1)
+            log ('Making a prediction...', num_indents=num_indents + 1)
             for action_index, try_action in enumerate(self.action_space):
                 for try_output in range(self.action_output_list[action_index][0], self.action_output_list[action_index][1], self.action_output_list[action_index][2]):
                     self.predict(try_action, try_output, num_indents=num_indents + 1)
                     self.action_plan.append((try_action, try_output, self.current_model_index))
-                    pprint ('Plan: '+str(self.action_plan), num_indents=num_indents + 1)
+                    log ('Plan: %s', self.action_plan, num_indents=num_indents + 1)
 
         elif self.goal_type == 'Observe':
-            pprint ('Observing...', num_indents=num_indents + 1)
+            log ('Observing...', num_indents=num_indents + 1)
             self.predict(action, 1, num_indents=num_indents + 1)
             self.action_plan.append((action, 1, self.current_model_index))
-            pprint ('Observed action: '+str(self.action_plan), num_indents=num_indents + 1)
+            log ('Observed action: %s', self.action_plan, num_indents=num_indents + 1)
 
-        pprint('self.action_plan:\t%s' % self.action_plan,
+        log('self.action_plan:\t%s', self.action_plan,
             num_indents=num_indents + 1, new_line_start=True)
 
-        pprint('plan made. duration: %s' % (datetime.now() - start_time),
+        log('plan made. duration: %s', datetime.now() - start_time,
             num_indents=num_indents, new_line_start=True, draw_line=True)
 
     def compare_model(self, model_index, num_indents=0):
@@ -1100,11 +1115,11 @@ class AIRIS(object):
         # set the specified model's compare field to the distance
         # from the predicted goal value's pos to the closest actual goal value
 
-        pprint('compare_model: setting the specified model\'s compare field',
+        log('compare_model: setting the specified model\'s compare field',
             num_indents=num_indents, new_line_start=True, draw_line=False)
-        pprint('to the distance from the predicted goal value\'s pos to the',
+        log('to the distance from the predicted goal value\'s pos to the',
             num_indents=num_indents)
-        pprint('closest actual goal value ...',
+        log('closest actual goal value ...',
             num_indents=num_indents)
         start_time = datetime.now()
 
@@ -1120,7 +1135,7 @@ class AIRIS(object):
                 if model.vis_count[fv]:
                     for fx, fy in model.vis_count_pos[fv]:
                         gx, gy = fx + self.goal_source['x'], fy + self.goal_source['y']
-                        pprint('gx, gy: '+str(gx)+','+str(gy), num_indents=num_indents)
+                        log('gx, gy: %s,%s', gx, gy, num_indents=num_indents)
                         if not 0 <= gx < len(vis_env) or not 0 <= gy < len(vis_env[0]):
                             compare = 999999
 
@@ -1207,16 +1222,16 @@ class AIRIS(object):
                             if vis_env[gx][gy] == self.goal_value:
                                 best_compare = 0
 
-                            pprint('the current goal value\'s position satisfies the knowledge condition.',
+                            log('the current goal value\'s position satisfies the knowledge condition.',
                                 num_indents=num_indents + 1, new_line_start=True, draw_line=False)
 
                         if compare == None:
 
-                            pprint('the current goal value\'s position does not satisfy the knowledge condition.',
+                            log('the current goal value\'s position does not satisfy the knowledge condition.',
                                 num_indents=num_indents + 1, new_line_start=True, draw_line=False)
-                            pprint('using an expanding square search of the model\'s vis_env',
+                            log('using an expanding square search of the model\'s vis_env',
                                 num_indents=num_indents + 1)
-                            pprint('to find the closest goal value ...', num_indents=num_indents + 1)
+                            log('to find the closest goal value ...', num_indents=num_indents + 1)
 
                             d = 1  # d = distance from focus value
                             while True:
@@ -1271,8 +1286,7 @@ class AIRIS(object):
 
         model.compare = round(best_compare, self.round_to)
 
-        pprint('goal value%sfound. model.compare set to: %s. duration: %s' %
-            (' ' if model.compare != None else ' not ', model.compare, (datetime.now() - start_time)),
+        log('goal value%sfound. model.compare set to: %s. duration: %s', ' ' if model.compare != None else ' not ', model.compare, datetime.now() - start_time,
             num_indents=num_indents, new_line_start=True, draw_line=True)
 
     def predict(self, action, output, num_indents=0):
@@ -1281,7 +1295,7 @@ class AIRIS(object):
         # past knowledge of an experience closest to the
         # current environment
 
-        pprint('making a prediction for action: %s ...' % action, num_indents=num_indents, new_line_start=True)
+        log('making a prediction for action: %s ...', action, num_indents=num_indents, new_line_start=True)
         start_time = datetime.now()
 
         # get the difference between memory and
@@ -1299,14 +1313,14 @@ class AIRIS(object):
         # if we found a condition
         if model.best_condition_id:
 
-            pprint('best_condition_id: ' + str(model.best_condition_id),
+            log('best_condition_id: %s', model.best_condition_id,
                 num_indents=num_indents + 1, new_line_start=True)
 
             self.models[self.current_model_index].source_condition_path = model.best_condition_path
             model = self.models[self.current_model_index]
             focus_found = False
 
-            pprint('new model initial focus_pos: ' + str(model.focus_pos),
+            log('new model initial focus_pos: %s', model.focus_pos,
                 num_indents=num_indents + 1, new_line_start=True)
             model.previous_action = action
             model.previous_output = output
@@ -1340,7 +1354,7 @@ class AIRIS(object):
                         model.focus_pos = (x, y)
                         focus_found = True
             if model.focus_pos:
-                pprint('new model predicted focus_pos: ' + str(model.focus_pos),
+                log('new model predicted focus_pos: %s', model.focus_pos,
                     num_indents=num_indents + 1, new_line_start=True)
 
             try:
@@ -1357,8 +1371,8 @@ class AIRIS(object):
 
             # Update focus value if previous models focus value no longer exists
             if not focus_found:
-                focus_heap = copy.deepcopy(model.vis_count_heap)
-                count_pos = copy.deepcopy(model.vis_count_pos)
+                focus_heap = list(model.vis_count_heap)
+                count_pos = model.vis_count_pos
 
                 if self.focus_global_set:
                     while focus_heap and not focus_found:
@@ -1371,15 +1385,15 @@ class AIRIS(object):
 
             try:
                 if self.knowledge[model.source_condition_path + 'rel_abs'] == -1:
-                    pprint('Changing Model to ABS',
+                    log('Changing Model to ABS',
                         num_indents=num_indents + 1, new_line_start=True)
                     model = self.models[self.current_model_index]
                     model.initialize_from_env(
                         self.knowledge[model.source_condition_path + 'post_vis_data'],
                         self.knowledge[model.source_condition_path + 'post_aux_data'])
 
-                    focus_heap = copy.deepcopy(model.vis_count_heap)
-                    count_pos = copy.deepcopy(model.vis_count_pos)
+                    focus_heap = list(model.vis_count_heap)
+                    count_pos = model.vis_count_pos
                     focus_found = False
 
                     if self.focus_global_set:
@@ -1394,7 +1408,7 @@ class AIRIS(object):
                 pass
 
         else:
-            pprint('No matching condition found.',
+            log('No matching condition found.',
                 num_indents=num_indents + 1, new_line_start=True)
             dest = self.models[self.current_model_index]
             dest.focus_value = model.focus_value
@@ -1403,11 +1417,11 @@ class AIRIS(object):
             dest.focus_index = model.focus_index
             model = self.models[self.current_model_index]
 
-        pprint('visual prediction: ' + str(model.predicted_vis_change),
+        log('visual prediction: %s', model.predicted_vis_change,
             num_indents=num_indents + 1, new_line_start=True)
-        pprint('auxiliary prediction: ' + str(model.predicted_aux_change),
+        log('auxiliary prediction: %s', model.predicted_aux_change,
             num_indents=num_indents + 1)
-        pprint('prediction made. duration: %s' % (datetime.now() - start_time),
+        log('prediction made. duration: %s', datetime.now() - start_time,
             num_indents=1, new_line_start=True, draw_line=True)
 
     def find_changes(self, num_indents=0):
@@ -1419,11 +1433,11 @@ class AIRIS(object):
         # self.aux_change_list
         # and return a boolean flagging if there was a difference at all
 
-        pprint('determining if our prediction was correct ...',
+        log('determining if our prediction was correct ...',
             num_indents=num_indents, new_line_start=True)
         start_time = datetime.now()
 
-        pprint('self.current_model_index = %d' % self.current_model_index,
+        log('self.current_model_index = %d', self.current_model_index,
             num_indents=num_indents + 1, new_line_start=True)
         model = self.models[self.current_model_index]  # current model
         vis_change_found = False
@@ -1440,9 +1454,9 @@ class AIRIS(object):
 
         # get difference between the current vis env and the current model
         # (the current model is modeling the vis env prior to the action)
-        pprint('getting the difference between the current model\'s',
+        log('getting the difference between the current model\'s',
             num_indents=num_indents + 1, new_line_start=True)
-        pprint('predicted vis env and the actual posterior vis env', num_indents=num_indents + 1)
+        log('predicted vis env and the actual posterior vis env', num_indents=num_indents + 1)
         vis_change_array = array_dif(
             self.posterior_vis_env,
             model.vis_env)
@@ -1451,12 +1465,12 @@ class AIRIS(object):
         print_vis_env(vis_change_array, title='Visual Difference:', num_indents=num_indents + 2)
 
         # get the (x, y) locations of the changes
-        pprint('getting the (x, y) locations of the vis differences',
+        log('getting the (x, y) locations of the vis differences',
             num_indents=num_indents + 1, new_line_start=True)
         change_x, change_y = np.nonzero(vis_change_array)
         vis_change_found = len(change_x) > 0  # flag if any visual changes were found
-        pprint('x pos of changes from prediction:\t%s' % change_x, num_indents=num_indents + 2)
-        pprint('y pos of changes from prediction:\t%s' % change_y, num_indents=num_indents + 2)
+        log('x pos of changes from prediction:\t%s', change_x, num_indents=num_indents + 2)
+        log('y pos of changes from prediction:\t%s', change_y, num_indents=num_indents + 2)
 
         if vis_change_found:
             # Check to see if it's an absolute change
@@ -1486,7 +1500,7 @@ class AIRIS(object):
             if not vis_abs_found:
                 try:
                     vis_check_found = True
-                    pprint('checking ABS 1', num_indents=num_indents + 1)
+                    log('checking ABS 1', num_indents=num_indents + 1)
                     if self.knowledge[model.source_condition_path + 'rel_abs'] == -1:
 
                         check = self.create_model(model.previous_model_index, num_indents=num_indents + 1)
@@ -1495,7 +1509,7 @@ class AIRIS(object):
 
                         is_aux = str(check_model.focus_value)
 
-                        pprint('checking ABS 2', num_indents=num_indents + 1)
+                        log('checking ABS 2', num_indents=num_indents + 1)
 
                         if is_aux[0] == 'A':
                             predicted_posterior_value = self.knowledge[path + 'posterior_val']
@@ -1505,7 +1519,7 @@ class AIRIS(object):
                             predicted_posterior_value = self.knowledge[path + 'posterior_val']
                             check_model.update_vis_value(predicted_posterior_value, check_model.focus_pos)
 
-                        pprint('checking ABS 3', num_indents=num_indents + 2)
+                        log('checking ABS 3', num_indents=num_indents + 2)
 
                         try:
                             predict_vis_ref = self.knowledge[path + 'vis_ref']
@@ -1513,12 +1527,12 @@ class AIRIS(object):
                         except KeyError:
                             predict_vis_ref = []
 
-                        pprint('checking ABS 4 '+str(predict_vis_ref), num_indents=num_indents + 1)
+                        log('checking ABS 4 %s', predict_vis_ref, num_indents=num_indents + 1)
 
                         if check_model.focus_pos:
                             cfx, cfy = copy.deepcopy(check_model.focus_pos)
 
-                        pprint('checking ABS 5 '+str(cfx)+'/'+str(cfy), num_indents=num_indents + 1)
+                        log('checking ABS 5 %s/%s', cfx, cfy, num_indents=num_indents + 1)
 
                         for cdx, cdy, prior_val, posterior_val in predict_vis_ref:
                             x, y = cfx + cdx, cfy + cdy
@@ -1531,7 +1545,7 @@ class AIRIS(object):
                         except KeyError:
                             predict_aux_ref = []
 
-                        pprint('checking ABS 6 '+str(predict_aux_ref), num_indents=num_indents + 1)
+                        log('checking ABS 6 %s', predict_aux_ref, num_indents=num_indents + 1)
 
                         for i, prior_val, posterior_val in predict_aux_ref:
                             check_model.update_aux_value(posterior_val, i)
@@ -1543,13 +1557,13 @@ class AIRIS(object):
                         check_x, check_y = np.nonzero(vis_check_array)
                         vis_check_found = len(check_x) > 0  # flag if any visual changes were found
                 except:
-                    pprint('checking ABS except', num_indents=num_indents + 1)
+                    log('checking ABS except', num_indents=num_indents + 1)
                     vis_check_found = True
 
                 if vis_check_found:
-                    pprint('getting the difference between the previous vis env\'s',
+                    log('getting the difference between the previous vis env\'s',
                         num_indents=num_indents + 1, new_line_start=True)
-                    pprint('and the actual posterior vis env', num_indents=num_indents + 1)
+                    log('and the actual posterior vis env', num_indents=num_indents + 1)
                     vis_prior_array = array_dif(
                         self.posterior_vis_env,
                         self.prior_vis_env)
@@ -1558,13 +1572,13 @@ class AIRIS(object):
                     print_vis_env(vis_change_array, title='Visual Difference:', num_indents=num_indents + 2)
                     change_x, change_y = np.nonzero(vis_prior_array)
                     vis_prior_found = len(change_x) > 0
-                    pprint('x pos of changes from prior to post:\t%s' % change_x, num_indents=num_indents + 2)
-                    pprint('y pos of changes from prior to post:\t%s' % change_y, num_indents=num_indents + 2)
+                    log('x pos of changes from prior to post:\t%s', change_x, num_indents=num_indents + 2)
+                    log('y pos of changes from prior to post:\t%s', change_y, num_indents=num_indents + 2)
 
                     # iterate over the changes in the visual environment
-                    pprint('appending differences to self.vis_change_list:',
+                    log('appending differences to self.vis_change_list:',
                         num_indents=num_indents + 1, new_line_start=True)
-                    pprint('key: [(x, y, prior_val, actual_posterior_val), ...]',
+                    log('key: [(x, y, prior_val, actual_posterior_val), ...]',
                         num_indents=num_indents + 1)
                     for x, y in zip(change_x, change_y):
                         prior_val = self.prior_vis_env[x][y]
@@ -1572,7 +1586,7 @@ class AIRIS(object):
                         change_data = (x, y, prior_val, posterior_val)
                         self.vis_change_list.append(copy.deepcopy(change_data))
                 else:
-                    pprint ('NOT ABS', num_indents=num_indents + 1, new_line_start=True)
+                    log ('NOT ABS', num_indents=num_indents + 1, new_line_start=True)
                     self.knowledge[model.source_condition_path + 'rel_abs'] = 1
                     vis_change_found = False
                     #self.action_plan = []
@@ -1580,13 +1594,13 @@ class AIRIS(object):
             else:
                 vis_change_found = False
 
-        pprint('Actual Visual Change List:   \t\t%s' % self.vis_change_list,
+        log('Actual Visual Change List:   \t\t%s', self.vis_change_list,
             num_indents=num_indents + 2)
 
         # do all the same stuff for the aux env
-        pprint('getting the difference between the current model\'s', num_indents=num_indents + 1,
+        log('getting the difference between the current model\'s', num_indents=num_indents + 1,
             new_line_start=True)
-        pprint('predicted aux env and the actual posterior aux env', num_indents=num_indents + 1)
+        log('predicted aux env and the actual posterior aux env', num_indents=num_indents + 1)
         aux_change_array = array_dif(
             self.posterior_aux_env,
             model.aux_env)
@@ -1594,17 +1608,17 @@ class AIRIS(object):
         print_aux_env(self.posterior_aux_env, title='Actual Auxiliary Env:', num_indents=num_indents + 2)
         print_aux_env(aux_change_array, title='Auxiliary Difference:', num_indents=num_indents + 2)
 
-        pprint('getting the indexes of the aux differences',
+        log('getting the indexes of the aux differences',
             num_indents=num_indents + 1, new_line_start=True)
         aux_change_index, = np.nonzero(aux_change_array)
         aux_change_found = len(aux_change_index) > 0
-        pprint('indexes of changes:\t\t%s' % aux_change_index, num_indents=num_indents + 2)
+        log('indexes of changes:\t\t%s', aux_change_index, num_indents=num_indents + 2)
 
-        pprint('appending differences to self.aux_change_list',
+        log('appending differences to self.aux_change_list',
             num_indents=num_indents + 1, new_line_start=True)
-        pprint('key: [(index, prior_val, actual_posterior_val), ...]',
+        log('key: [(index, prior_val, actual_posterior_val), ...]',
             num_indents=num_indents + 1)
-        pprint('aux_change_list = '+str(aux_change_index),
+        log('aux_change_list = %s', aux_change_index,
             num_indents=num_indents + 1)
 
         if aux_change_found:
@@ -1655,12 +1669,12 @@ class AIRIS(object):
                 self.aux_change_index = i
                 self.aux_change_list.append(copy.deepcopy(change_data))
 
-        pprint('Actual Auxiliary Change List:\t\t%s' % self.aux_change_list,
+        log('Actual Auxiliary Change List:\t\t%s', self.aux_change_list,
             num_indents=num_indents + 2)
 
         # include real values of all predicted aux changes
         if aux_change_found and not abs_source:
-            pprint('appending prediction to self.aux_change_list:',
+            log('appending prediction to self.aux_change_list:',
                 num_indents=num_indents + 1, new_line_start=True)
             for i, prior_val, posterior_val in model.predicted_aux_change:
                 if not [index for index in self.aux_change_list if index[0] == i]:
@@ -1675,7 +1689,7 @@ class AIRIS(object):
 
         # include real values of all predicted changes if there's an unpredicted change but no difference in the env
         if vis_change_found and vis_check_found and not abs_source:
-            pprint('appending prediction to self.vis_change_list:',
+            log('appending prediction to self.vis_change_list:',
                 num_indents=num_indents + 1, new_line_start=True)
             for x, y, prior_val, _ in model.predicted_vis_change:
                 if not [pos for pos in self.vis_change_list if pos[0] == x and pos[1] == y]:
@@ -1700,16 +1714,13 @@ class AIRIS(object):
             if model.best_condition_dif > self.knowledge[model.best_condition_path + 'moe']:
                 self.knowledge[model.best_condition_path + 'moe'] = model.best_condition_dif
 
-        pprint('Actual + Predicted Visual Change List:   \t\t%s' % self.vis_change_list,
+        log('Actual + Predicted Visual Change List:   \t\t%s', self.vis_change_list,
             num_indents=num_indents + 2)
-        pprint('Actual + Predicted Auxiliary Change List:\t\t%s' % self.aux_change_list,
+        log('Actual + Predicted Auxiliary Change List:\t\t%s', self.aux_change_list,
             num_indents=num_indents + 2)
 
         # return if ANY changes were found
-        pprint('differences were%sfound, prediction %s. duration: %s' %
-            ((' ' if (vis_change_found or aux_change_found) else ' not '),
-            ('incorrect' if (vis_change_found or aux_change_found) else 'correct'),
-            (datetime.now() - start_time)),
+        log('differences were%sfound, prediction %s. duration: %s', ' ' if (vis_change_found or aux_change_found) else ' not ', 'incorrect' if (vis_change_found or aux_change_found) else 'correct', datetime.now() - start_time,
             num_indents=num_indents, new_line_start=True, draw_line=True)
 
         return vis_change_found or aux_change_found
@@ -1721,12 +1732,12 @@ class AIRIS(object):
 
         if self.goal_type == 'New Action':
             print('This is a new Action')
-            pprint('This is a New Action.',
+            log('This is a New Action.',
                 num_indents=num_indents + 1, new_line_start=True)
         else:
             print('This is not the outcome I predicted')
 
-        pprint('creating condition ...', num_indents=num_indents, new_line_start=True)
+        log('creating condition ...', num_indents=num_indents, new_line_start=True)
         start_time = datetime.now()
         print('Saving new knowledge ...')
 
@@ -1751,7 +1762,7 @@ class AIRIS(object):
             # (focus value is the least frequent value that changed in
             #  the posterior, but were looking in the prior)
             # and set self.posterior_focus_value to the actual posterior value
-            pprint('setting self.posterior_focus_value to the actual posterior value',
+            log('setting self.posterior_focus_value to the actual posterior value',
                 num_indents=num_indents + 1, new_line_start=True, draw_line=False)
 
             while vis_env_heap and not condition_focus_value:
@@ -1789,8 +1800,8 @@ class AIRIS(object):
                         break
 
             if not condition_focus_value and len(self.aux_change_list) == 0:
-                pprint('potential focus values not found in focus_global_set', num_indents=num_indents + 1)
-                pprint('choosing one and adding it to the set', num_indents=num_indents + 1)
+                log('potential focus values not found in focus_global_set', num_indents=num_indents + 1)
+                log('choosing one and adding it to the set', num_indents=num_indents + 1)
 
                 while no_focus_vis_env_heap and not condition_focus_value:
                     _, least_frequent_val = heapq.heappop(no_focus_vis_env_heap)
@@ -1816,11 +1827,11 @@ class AIRIS(object):
                         self.focus_global_set.add(least_frequent_val)
 
             if condition_focus_value:
-                pprint('self.posterior_focus_value     %s' % self.posterior_focus_value, num_indents=num_indents + 2)
-                pprint('self.vis_change_index          %s' % self.vis_change_index, num_indents=num_indents + 2)
+                log('self.posterior_focus_value     %s', self.posterior_focus_value, num_indents=num_indents + 2)
+                log('self.vis_change_index          %s', self.vis_change_index, num_indents=num_indents + 2)
 
-                pprint('Focus Set: '+str(self.focus_global_set), num_indents=num_indents + 1)
-                pprint('Not Focus Set: '+str(self.not_focus_global_set), num_indents=num_indents + 1)
+                log('Focus Set: %s', self.focus_global_set, num_indents=num_indents + 1)
+                log('Not Focus Set: %s', self.not_focus_global_set, num_indents=num_indents + 1)
 
                 self.store_condition(last_action, last_output, '',
                                         condition_focus_value,
@@ -1833,7 +1844,7 @@ class AIRIS(object):
             focus_index, condition_focus_value, self.posterior_focus_value = \
             self.aux_change_list[0]
 
-            pprint('self.aux_change_list     %s' % self.aux_change_list, num_indents=num_indents + 2)
+            log('self.aux_change_list     %s', self.aux_change_list, num_indents=num_indents + 2)
 
             self.store_condition(last_action, last_output, 'A',
                                  condition_focus_value, focus_index=focus_index,
@@ -1841,7 +1852,7 @@ class AIRIS(object):
 
         self.goal_type = self.goal_type_default
 
-        pprint('condition created. duration: %s' % (datetime.now() - start_time),
+        log('condition created. duration: %s', datetime.now() - start_time,
             num_indents=num_indents, new_line_start=True, draw_line=True)
 
     def store_condition(self, action, output, A, condition_focus_value,
@@ -1853,7 +1864,7 @@ class AIRIS(object):
 
         if condition_focus_value != None:
 
-            pprint('Updating Knowledge:',
+            log('Updating Knowledge:',
                 num_indents=num_indents, new_line_start=True)
 
             action = str(action)
@@ -1882,11 +1893,9 @@ class AIRIS(object):
             if A == "A":
                 auxpath = action + '/' + output + '/aux_raw'
                 try:
-                    self.knowledge[auxpath].index(float(condition_focus_value))
+                    self.add_aux_raw(self.knowledge[auxpath], self.aux_raw_pairs(auxpath), float(condition_focus_value))
                 except KeyError:
                     self.knowledge[auxpath] = [float(condition_focus_value)]
-                except ValueError:
-                    self.knowledge[auxpath].append(float(condition_focus_value))
 
             path += '/' + A + condition_focus_value
             duplicate = False
@@ -1994,11 +2003,11 @@ class AIRIS(object):
                 else:
                     self.knowledge[path + 'focus_i'] = focus_index
 
-                self.knowledge[path + 'vis_data'] = copy.deepcopy(self.prior_vis_env)
-                self.knowledge[path + 'aux_data'] = copy.deepcopy(self.prior_aux_env)
+                self.knowledge[path + 'vis_data'] = self.snapshots.intern(self.prior_vis_env)
+                self.knowledge[path + 'aux_data'] = self.snapshots.intern(self.prior_aux_env)
 
-                self.knowledge[path + 'post_vis_data'] = copy.deepcopy(self.posterior_vis_env)
-                self.knowledge[path + 'post_aux_data'] = copy.deepcopy(self.posterior_aux_env)
+                self.knowledge[path + 'post_vis_data'] = self.snapshots.intern(self.posterior_vis_env)
+                self.knowledge[path + 'post_aux_data'] = self.snapshots.intern(self.posterior_aux_env)
 
                 self.knowledge[path + 'rel_abs'] = 0
                 self.knowledge[path + 'moe'] = 0
@@ -2034,7 +2043,7 @@ class AIRIS(object):
                 self.condition_id -= 1
 
         else:
-            pprint('not updating knowledge, no condition_focus_value',
+            log('not updating knowledge, no condition_focus_value',
                 num_indents=num_indents, new_line_start=True)
 
         self.print_knowledge(num_indents=num_indents + 1, new_line_start=True)
@@ -2043,31 +2052,31 @@ class AIRIS(object):
 
         #self.save_knowledge()
 
-        pprint('update complete. duration: %s' % (datetime.now() - start_time),
+        log('update complete. duration: %s', datetime.now() - start_time,
             num_indents=num_indents, new_line_start=True, draw_line=True)
 
     def compare_conditions(self, action, output, model_index, num_indents=0):
 
         # get the best condition
-        pprint('getting the difference between memory and what we\'re currently looking at',
+        log('getting the difference between memory and what we\'re currently looking at',
             num_indents=num_indents + 1, new_line_start=True)
         start_time = datetime.now()
 
         model = self.models[model_index]
-        model_heap = copy.deepcopy(model.vis_count_heap)
-        vis_model = copy.deepcopy(model.vis_env)
-        aux_model = copy.deepcopy(model.aux_env)
+        model_heap = list(model.vis_count_heap)
+        vis_model = model.vis_env
+        aux_model = model.aux_env
         model.best_condition_id = None  # whip best condition just before we do a new prediction
         model.best_condition_dif = None
         condition_heap = []
         condition_count = {}
         condition_count_heap = []
         condition_count_max_value = None
-        pprint('original model focus_pos: ' + str(model.focus_pos), num_indents=num_indents + 1)
-        pprint(str(action), num_indents=num_indents + 1)
-        pprint('model_index = %s' % model_index, num_indents=num_indents + 1)
+        log('original model focus_pos: %s', model.focus_pos, num_indents=num_indents + 1)
+        log('%s', action, num_indents=num_indents + 1)
+        log('model_index = %s', model_index, num_indents=num_indents + 1)
         path = str(action) + '/' + str(output)
-        pprint('path = ' + path, num_indents=num_indents + 1)
+        log('path = %s', path, num_indents=num_indents + 1)
         try:
             focus_list = self.knowledge[path]
         except KeyError:
@@ -2076,49 +2085,40 @@ class AIRIS(object):
         if focus_list:
             while model_heap:
                 _, heap_val = heapq.heappop(model_heap)
-                pprint('heap_val = ' + str(heap_val), num_indents=num_indents + 1)
+                log('heap_val = %s', heap_val, num_indents=num_indents + 1)
                 if str(heap_val) in focus_list:
                     model.focus_value = heap_val
-                    pprint('focus_value = ' + str(model.focus_value), num_indents=num_indents + 1)
+                    log('focus_value = %s', model.focus_value, num_indents=num_indents + 1)
                     condition_path = path + '/' + str(model.focus_value)
 
                     try:
-                        for focus_x, focus_y in model.vis_count_pos[model.focus_value]:
-                            try:
-                                condition_list = self.knowledge[condition_path]
-                            except KeyError:
-                                condition_list = []
+                        focus_positions = model.vis_count_pos[model.focus_value]
+                        try:
+                            condition_list = self.knowledge[condition_path]
+                        except KeyError:
+                            condition_list = []
 
-                            for condition_id in condition_list:
-                                data_path = condition_path + '/' + str(condition_id) + '/'
-                                condition_dif = 0
+                        # every condition at every focus position at once, see score_refs
+                        if condition_list:
+                            refs = self.condition_refs(condition_path, condition_list)
+                            condition_difs = self.score_refs(refs, focus_positions, vis_model, aux_model)
 
-                                try:
-                                    for dx, dy, prior_val, _ in self.knowledge[data_path + 'vis_ref']:
-                                        x, y = focus_x + dx, focus_y + dy
-                                        if 0 <= x < len(vis_model) and 0 <= y < len(vis_model[0]):
-                                            if vis_model[x][y] != prior_val:
-                                                condition_dif += abs(vis_model[x][y] - prior_val)
+                        for p, (focus_x, focus_y) in enumerate(focus_positions):
+                            for c, condition_id in enumerate(condition_list):
+                                data_path = refs['paths'][c]
+                                condition_dif = condition_difs[p][c]
 
+                                if refs['has_vis'][c]:
                                     try:
                                         condition_count[model.focus_value] += 1
                                     except KeyError:
                                         condition_count[model.focus_value] = 1
-                                except KeyError:
-                                    pass
-
-                                try:
-                                    for i, prior_val, _ in self.knowledge[data_path + 'aux_ref']:
-                                        if i < len(aux_model):
-                                            if aux_model[i] != prior_val:
-                                                condition_dif += abs(aux_model[i] - prior_val)
 
+                                if refs['has_aux'][c]:
                                     try:
                                         condition_count[model.focus_value] += 1
                                     except KeyError:
                                         condition_count[model.focus_value] = 1
-                                except KeyError:
-                                    pass
 
                                 heapq.heappush(condition_heap, (round(condition_dif, self.round_to), model.focus_value, condition_id, focus_x, focus_y, data_path))
 
@@ -2135,19 +2135,19 @@ class AIRIS(object):
                 condition_count_max_value = max(condition_count, key=lambda key: condition_count[key])
                 condition_count_heap = [i for i in condition_count_heap if i[1] == condition_count_max_value]
                 heapq.heapify(condition_count_heap)
-                pprint('condition heap post-prune:', num_indents=num_indents + 1)
-                pprint(str(condition_count_heap), num_indents=num_indents + 1)
+                log('condition heap post-prune:', num_indents=num_indents + 1)
+                log('%s', condition_count_heap, num_indents=num_indents + 1)
                 model.best_condition_dif = condition_count_heap[0][0]
-                pprint('best_condition_dif: '+str(condition_count_heap[0][0]), num_indents=num_indents + 1)
+                log('best_condition_dif: %s', condition_count_heap[0][0], num_indents=num_indents + 1)
                 model.focus_value = condition_count_heap[0][1]
-                pprint('focus_value: '+str(condition_count_heap[0][1]), num_indents=num_indents + 1)
+                log('focus_value: %s', condition_count_heap[0][1], num_indents=num_indents + 1)
                 model.focus_value_is_aux = False
                 model.best_condition_id = condition_count_heap[0][2]
-                pprint('best_condition_id: ' + str(condition_count_heap[0][2]), num_indents=num_indents + 1)
+                log('best_condition_id: %s', condition_count_heap[0][2], num_indents=num_indents + 1)
                 model.focus_pos = (condition_count_heap[0][3], condition_count_heap[0][4])
-                pprint('updated model focus_pos: ' + str(model.focus_pos), num_indents=num_indents + 1)
+                log('updated model focus_pos: %s', model.focus_pos, num_indents=num_indents + 1)
                 model.best_condition_path = condition_count_heap[0][5]
-                pprint('best_condition_path: ' + str(condition_heap[0][5]), num_indents=num_indents + 1)
+                log('best_condition_path: %s', condition_heap[0][5], num_indents=num_indents + 1)
                 heapq.heappop(condition_count_heap)
 
                 if condition_count_heap:
@@ -2165,7 +2165,7 @@ class AIRIS(object):
                                 else:
                                     j = 0
 
-                                pprint('i / j: ' + str(i) + '/' + str(j), num_indents=num_indents + 1)
+                                log('i / j: %s/%s', i, j, num_indents=num_indents + 1)
 
                                 vis_model = self.knowledge[path + 'vis_data']
                                 aux_model = self.knowledge[path + 'aux_data']
@@ -2177,10 +2177,10 @@ class AIRIS(object):
                                         if 0 <= x < len(vis_model) and 0 <= y < len(vis_model[0]):
                                             if vis_model[x][y] != prior_val:
                                                 competing_dif[i] += abs(vis_model[x][y] - prior_val)
-                                                pprint('competing_vis_dif', num_indents=num_indents + 1)
+                                                log('competing_vis_dif', num_indents=num_indents + 1)
                                         else:
                                             competing_dif[i] += prior_val
-                                            pprint('competing_vis_dif', num_indents=num_indents + 1)
+                                            log('competing_vis_dif', num_indents=num_indents + 1)
                                 except KeyError:
                                     pass
 
@@ -2189,15 +2189,15 @@ class AIRIS(object):
                                         if ind < len(aux_model):
                                             if aux_model[ind] != prior_val:
                                                 competing_dif[i] += abs(aux_model[ind] - prior_val)
-                                                pprint('competing_aux_dif ' + str(i), num_indents=num_indents + 1)
+                                                log('competing_aux_dif %s', i, num_indents=num_indents + 1)
                                         else:
                                             competing_dif[i] += prior_val
-                                            pprint('competing_aux_dif' + str(i), num_indents=num_indents + 1)
+                                            log('competing_aux_dif%s', i, num_indents=num_indents + 1)
                                 except KeyError:
                                     pass
 
-                            pprint('competing_dif: ' + str(competing_dif), num_indents=num_indents + 1)
-                            pprint('competing_data_path: ' + str(competing_data_path), num_indents=num_indents + 1)
+                            log('competing_dif: %s', competing_dif, num_indents=num_indents + 1)
+                            log('competing_data_path: %s', competing_data_path, num_indents=num_indents + 1)
 
                             if competing_dif[1] < competing_dif[0]:
                                 model.best_condition_dif = condition_count_heap[0][0]
@@ -2206,11 +2206,11 @@ class AIRIS(object):
                                 model.best_condition_id = condition_count_heap[0][2]
                                 model.focus_pos = (condition_count_heap[0][3], condition_count_heap[0][4])
                                 model.best_condition_path = condition_count_heap[0][5]
-                                pprint('updated model focus_pos: ' + str(model.focus_pos), num_indents=num_indents + 1)
-                                pprint('updated model best condition: ' + str(model.best_condition_id), num_indents=num_indents + 1)
+                                log('updated model focus_pos: %s', model.focus_pos, num_indents=num_indents + 1)
+                                log('updated model best condition: %s', model.best_condition_id, num_indents=num_indents + 1)
                                 heapq.heappop(condition_count_heap)
                             else:
-                                pprint('Keeping original best condition.', num_indents=num_indents + 1)
+                                log('Keeping original best condition.', num_indents=num_indents + 1)
                                 heapq.heappop(condition_count_heap)
 
                         else:
@@ -2220,59 +2220,34 @@ class AIRIS(object):
                             break
 
             elif condition_heap:
-                pprint('No condition_count_heap!', num_indents=num_indents + 1)
-                pprint(str(condition_heap), num_indents=num_indents + 1)
+                log('No condition_count_heap!', num_indents=num_indents + 1)
+                log('%s', condition_heap, num_indents=num_indents + 1)
                 model.best_condition_dif = condition_heap[0][0]
-                pprint('best_condition_dif: '+str(condition_heap[0][0]), num_indents=num_indents + 1)
+                log('best_condition_dif: %s', condition_heap[0][0], num_indents=num_indents + 1)
                 model.focus_value = condition_heap[0][1]
-                pprint('focus_value: '+str(condition_heap[0][1]), num_indents=num_indents + 1)
+                log('focus_value: %s', condition_heap[0][1], num_indents=num_indents + 1)
                 model.focus_value_is_aux = False
                 model.best_condition_id = condition_heap[0][2]
-                pprint('best_condition_id: ' + str(condition_heap[0][2]), num_indents=num_indents + 1)
+                log('best_condition_id: %s', condition_heap[0][2], num_indents=num_indents + 1)
                 model.focus_pos = (condition_heap[0][3], condition_heap[0][4])
-                pprint('updated model focus_pos: ' + str(model.focus_pos), num_indents=num_indents + 1)
+                log('updated model focus_pos: %s', model.focus_pos, num_indents=num_indents + 1)
                 model.best_condition_path = condition_heap[0][5]
                 heapq.heappop(condition_heap)
 
-                if condition_heap:
-                    while model.best_condition_dif == condition_heap[0][0]:
-
-                        if model.best_condition_id != condition_heap[0][2]:
-
-                            best_raw_dif = 0
-                            raw_dif = 0
-                            best_path = str(action) + '/' + str(output) + '/' + str(model.focus_value) + '/' + str(model.best_condition_id) + '/'
-                            path = str(action) + '/' + str(output) + '/' + str(condition_heap[0][1]) + '/' + str(condition_heap[0][2]) + '/'
-                            best_condition_data_array = self.knowledge[best_path + 'vis_data']
-                            condition_data_array = self.knowledge[path + 'vis_data']
-                            best_condition_aux_array = self.knowledge[best_path + 'aux_data']
-                            condition_aux_data_array = self.knowledge[path + 'aux_data']
-
-                            raw_dif = np.sum(array_dif(vis_model, condition_data_array))
-                            raw_dif += np.sum(array_dif(aux_model, condition_aux_data_array))
-                            best_raw_dif = np.sum(array_dif(vis_model, best_condition_data_array))
-                            best_raw_dif += np.sum(array_dif(aux_model, best_condition_aux_array))
-
-                            if raw_dif < best_raw_dif:
-                                model.best_condition_dif = condition_heap[0][0]
-                                model.focus_value = condition_heap[0][1]
-                                model.focus_value_is_aux = False
-                                model.best_condition_id = condition_heap[0][2]
-                                model.focus_pos = (condition_heap[0][3], condition_heap[0][4])
-                                model.best_condition_path = condition_heap[0][5]
-                                pprint('updated model focus_pos: ' + str(model.focus_pos), num_indents=num_indents + 1)
-                                pprint('updated model best condition: ' + str(model.best_condition_id), num_indents=num_indents + 1)
-                                heapq.heappop(condition_heap)
-                            else:
-                                pprint('Keeping original best condition.', num_indents=num_indents + 1)
-                                heapq.heappop(condition_heap)
-
-                            if condition_heap == []:
-                                break
-                        else:
-                            heapq.heappop(condition_heap)
-                            if condition_heap == []:
-                                break
+                # of the conditions tied with the best one, keep the first in heap order whose raw data is
+                # closest to the model
+                tied = sorted(entry for entry in condition_heap if entry[0] == model.best_condition_dif)
+                if tied:
+                    rows = [self.condition_index.row(self.knowledge, data_path) for data_path in [model.best_condition_path] + [entry[5] for entry in tied]]
+                    closest = self.condition_index.closest(rows, vis_model, aux_model)
+                    if closest:
+                        _, model.focus_value, model.best_condition_id, focus_x, focus_y, model.best_condition_path = tied[closest - 1]
+                        model.focus_value_is_aux = False
+                        model.focus_pos = (focus_x, focus_y)
+                        log('updated model focus_pos: %s', model.focus_pos, num_indents=num_indents + 1)
+                        log('updated model best condition: %s', model.best_condition_id, num_indents=num_indents + 1)
+                    else:
+                        log('Keeping original best condition.', num_indents=num_indents + 1)
 
             condition_heap = []
             condition_count_heap = []
@@ -2282,12 +2257,11 @@ class AIRIS(object):
                 model.focus_value = 'A' + str(model.aux_env[model.focus_index])
                 model.focus_value_is_aux = True
                 try:
-                    array = np.asarray(self.knowledge[str(action) + '/' + str(output) + '/aux_raw'])
+                    auxpath = str(action) + '/' + str(output) + '/aux_raw'
                     value = model.aux_env[model.focus_index]
 
-                    for i in range(self.assume_sample_size):
-                        idx = (np.abs(array - value)).argmin()
-                        assume_value = 'A' + str(array[idx])
+                    for assume_raw in self.nearest_aux_raw(self.aux_raw_pairs(auxpath), value, self.assume_sample_size):
+                        assume_value = 'A' + str(assume_raw)
 
                         condition_path = str(action) + '/' + str(output) + '/' + assume_value
                         try:
@@ -2295,21 +2269,15 @@ class AIRIS(object):
                         except KeyError:
                             condition_list = []
 
-                        for condition_id in condition_list:
-                            data_path = condition_path + '/' + str(condition_id) + '/'
-                            if model.focus_index == self.knowledge[data_path + 'focus_i']:
-                                condition_data_array = self.knowledge[data_path + 'vis_data']
-                                condition_aux_data_array = self.knowledge[data_path + 'aux_data']
-
-                                condition_dif = np.sum(array_dif(vis_model, condition_data_array))
-                                condition_dif += np.sum(array_dif(aux_model, condition_aux_data_array))
-
-                                heapq.heappush(condition_heap, (round(condition_dif, self.round_to), 'A' + str(model.aux_env[model.focus_index]), model.focus_index, condition_id, data_path, assume_value))
+                        # the raw difference of every condition with this model's focus index at once
+                        if condition_list:
+                            data = self.condition_data(condition_path, condition_list)
+                            matches = [c for c, focus_i in enumerate(data['focus_i']) if model.focus_index == focus_i]
+                            if matches:
+                                condition_difs = self.condition_index.distances([data['rows'][c] for c in matches], vis_model, aux_model)
 
-                        if len(array) > 0:
-                            array = np.delete(array, idx)
-                            if len(array) == 0:
-                                break
+                                for c, condition_dif in zip(matches, condition_difs):
+                                    heapq.heappush(condition_heap, (round(condition_dif, self.round_to), 'A' + str(model.aux_env[model.focus_index]), model.focus_index, condition_list[c], data['paths'][c], assume_value))
 
                     if condition_heap:
                         if len(condition_heap) > 1:
@@ -2380,9 +2348,9 @@ class AIRIS(object):
                     pass
 
 
-        pprint('model.best_condition_id = ' + str(model.best_condition_id), num_indents=num_indents + 1)
-        pprint('model.best_condition_path = ' + str(model.best_condition_path), num_indents=num_indents + 1)
-        pprint('difference found. duration: %s' % (datetime.now() - start_time),
+        log('model.best_condition_id = %s', model.best_condition_id, num_indents=num_indents + 1)
+        log('model.best_condition_path = %s', model.best_condition_path, num_indents=num_indents + 1)
+        log('difference found. duration: %s', datetime.now() - start_time,
             num_indents=1, new_line_start=True, draw_line=True)
 
 
@@ -2393,6 +2361,154 @@ class AIRIS(object):
     def load_knowledge(self):
         # Load
         self.knowledge = np.load('Knowledge.npy', allow_pickle=True).item()
+        self.ref_tables = {}
+        self.data_tables = {}
+        self.aux_raw_tables = {}
+        self.condition_index = ConditionIndex()
+
+    # aux_raw holds every raw aux focus value stored for an action/output in the order they were first seen.
+    # Its (value, position in aux_raw) pairs are kept sorted next to it for the lookups of make_plan. Raises
+    # KeyError when nothing is stored yet. Like condition_refs, the pairs stay valid while only add_aux_raw
+    # grows the list
+    def aux_raw_pairs(self, auxpath):
+        aux_raw = self.knowledge[auxpath]
+        try:
+            table = self.aux_raw_tables[auxpath]
+            if table[0] is aux_raw and len(table[1]) == len(aux_raw):
+                return table[1]
+        except KeyError:
+            pass
+        pairs = sorted((float(raw), seq) for seq, raw in enumerate(aux_raw))
+        self.aux_raw_tables[auxpath] = (aux_raw, pairs)
+        return pairs
+
+    # Adds value to aux_raw and its sorted pairs unless it is already there
+    @staticmethod
+    def add_aux_raw(aux_raw, pairs, value):
+        i = bisect_left(pairs, (value,))
+        if i < len(pairs) and pairs[i][0] == value:
+            return
+        pairs.insert(i, (value, len(aux_raw)))
+        aux_raw.append(value)
+
+    # Up to k values of the sorted pairs closest to value, closest first. Of two equally close values the one
+    # stored first comes first
+    @staticmethod
+    def nearest_aux_raw(pairs, value, k):
+        value = float(value)
+        hi = bisect_left(pairs, (value,))
+        lo = hi - 1
+        nearest = []
+        while len(nearest) < k and (lo >= 0 or hi < len(pairs)):
+            if hi == len(pairs) or (lo >= 0 and (value - pairs[lo][0], pairs[lo][1]) < (pairs[hi][0] - value, pairs[hi][1])):
+                nearest.append(pairs[lo][0])
+                lo -= 1
+            else:
+                nearest.append(pairs[hi][0])
+                hi += 1
+        return nearest
+
+    # vis_ref and aux_ref of the conditions in condition_list packed into (condition, ref) arrays, vis refs
+    # first. kind is 0 for a vis ref at (dx, dy) = (a, b), 1 for an aux ref at index a and -1 for padding.
+    # Conditions are only ever appended to a path and never change once stored, so a table stays valid
+    # until the list grows
+    def condition_refs(self, condition_path, condition_list):
+        try:
+            refs = self.ref_tables[condition_path]
+            if refs['conditions'] is condition_list and refs['count'] == len(condition_list):
+                return refs
+        except KeyError:
+            pass
+
+        paths = []
+        has_vis = []
+        has_aux = []
+        rows = []
+        for condition_id in condition_list:
+            data_path = condition_path + '/' + str(condition_id) + '/'
+            row = []
+            try:
+                row.extend((0, dx, dy, prior_val) for dx, dy, prior_val, _ in self.knowledge[data_path + 'vis_ref'])
+                has_vis.append(True)
+            except KeyError:
+                has_vis.append(False)
+            try:
+                row.extend((1, i, 0, prior_val) for i, prior_val, _ in self.knowledge[data_path + 'aux_ref'])
+                has_aux.append(True)
+            except KeyError:
+                has_aux.append(False)
+            paths.append(data_path)
+            rows.append(row)
+
+        width = max(len(row) for row in rows)
+        kind = np.full((len(rows), width), -1)
+        a = np.zeros((len(rows), width), dtype=int)
+        b = np.zeros((len(rows), width), dtype=int)
+        # the type the env values and prior values are subtracted in one at a time. Python numbers take the
+        # type of the env, numpy ones can widen it. Stored prior values all come from the float32 envs, a path
+        # mixing numpy widths would be scored in the widest and could differ from one at a time in the last bit
+        prior_types = set(ref[3].dtype for row in rows for ref in row if isinstance(ref[3], np.generic))
+        prior = np.zeros((len(rows), width), dtype=np.result_type(np.float32, *prior_types))
+        for c, row in enumerate(rows):
+            for r, (ref_kind, ref_a, ref_b, prior_val) in enumerate(row):
+                kind[c, r] = ref_kind
+                a[c, r] = ref_a
+                b[c, r] = ref_b
+                prior[c, r] = prior_val
+
+        refs = {'conditions': condition_list, 'count': len(condition_list), 'paths': paths,
+                'has_vis': has_vis, 'has_aux': has_aux, 'kind': kind, 'a': a, 'b': b, 'prior': prior}
+        self.ref_tables[condition_path] = refs
+        return refs
+
+    # condition_dif of every condition of refs with the focus value at every one of focus_positions, as
+    # [position][condition]. Refs out of the env and refs that match add nothing, and the differences are
+    # added up in ref order so the sums are exactly those of adding them one at a time
+    def score_refs(self, refs, focus_positions, vis_model, aux_model):
+        vis_env = np.asarray(vis_model)
+        aux_env = np.asarray(aux_model)
+        kind = refs['kind'][None, :, :]
+        a = refs['a'][None, :, :]
+        prior = refs['prior'][None, :, :]
+        positions = np.array(focus_positions, dtype=int).reshape(-1, 2)
+        x = positions[:, 0, None, None] + a
+        y = positions[:, 1, None, None] + refs['b'][None, :, :]
+
+        rows, cols = vis_env.shape[0], vis_env.shape[1]
+        vis_in = (kind == 0) & (0 <= x) & (x < rows) & (0 <= y) & (y < cols)
+        aux_in = (kind == 1) & (a < len(aux_env))
+        value = vis_env[np.clip(x, 0, rows - 1), np.clip(y, 0, cols - 1)]
+        if len(aux_env):
+            value = np.where(vis_in, value, aux_env[np.clip(a, 0, len(aux_env) - 1)])
+        used = (vis_in | aux_in) & (value != prior)
+        difs = np.where(used, np.abs(value - prior), 0)
+
+        # a running sum adds in order, a plain sum would not
+        if difs.shape[2]:
+            sums = np.cumsum(difs, axis=2)[:, :, -1]
+        else:
+            sums = np.zeros(difs.shape[:2])
+        used = used.any(axis=2)
+
+        # a condition that nothing was added to stays at the integer 0 it starts at
+        return [[sums[p, c] if used[p, c] else 0 for c in range(sums.shape[1])] for p in range(sums.shape[0])]
+
+    # focus_i and condition_index rows of the conditions in condition_list. Valid until the list grows, like
+    # condition_refs
+    def condition_data(self, condition_path, condition_list):
+        try:
+            data = self.data_tables[condition_path]
+            if data['conditions'] is condition_list and data['count'] == len(condition_list):
+                return data
+        except KeyError:
+            pass
+
+        paths = [condition_path + '/' + str(condition_id) + '/' for condition_id in condition_list]
+        data = {'conditions': condition_list, 'count': len(condition_list), 'paths': paths,
+                'focus_i': [self.knowledge[data_path + 'focus_i'] for data_path in paths],
+                'rows': [self.condition_index.row(self.knowledge, data_path) for data_path in paths]}
+        self.data_tables[condition_path] = data
+        return data
 
     def first_key(self, val):
         return val[0]
\ No newline at end of file
@@ -1,14 +1,37 @@
 import copy
 import numpy as np
 import heapq
-from state import State
+from state import State, state_hash
+from frontier import Frontier
+from knowledge import Knowledge
+from rule_matcher import RuleMatcher
+from trace_log import TraceWriter
 from copy import deepcopy
-from collections import defaultdict
-from operator import itemgetter
-import uuid
+from collections import defaultdict, OrderedDict, deque
+import multiprocessing
 import time
 
 
+# The AIRIS object a planning worker predicts with, a forked copy of the one that started the pool
+planner = None
+
+
+def start_planner(airis):
+    global planner
+    planner = airis
+    planner.plan_log = None
+    planner.predict_log = None
+
+
+# Worker side of AIRIS.expand_frontier: predicts act from a copy of the base state and returns the
+# predict_cache entry of the result
+def predict_worker(task):
+    act, input_1D, input_2D, input_2D_idx, step, action, prev_action, last_pos_change_2d = task
+    base = State(input_1D, input_2D, input_2D_idx, action, 0, step, last_pos_change_2d, prev_action)
+    planner.states = [base]
+    return planner.predict_entry(base, planner.predict_rules(act, 0, step + 1))
+
+
 class AIRIS(object):
 
     def __init__(self, input_1d, input_2d, action_space):
@@ -35,7 +58,39 @@ class AIRIS(object):
         self.innovate = False
         self.debug = False
         self.last_action = None
-        self.knowledge = dict()
+        self.knowledge = Knowledge()
+        # save_knowledge appends changes to <fname>.journal instead of rewriting the whole file every call
+        self.knowledge_journal = True
+        # LRU transposition cache of predict() results keyed on the base state contents and action
+        self.predict_cache = OrderedDict()
+        self.predict_cache_size = 2048
+        self.predict_values = set()
+        # goal_table() of every given goal seen, with the versions of its 1D indices it was compiled at
+        self.goal_tables = dict()
+        # score rules with the numpy RuleMatcher instead of the reference loop in predict_rules
+        self.vectorized_predict = False
+        self.rule_stencils = dict()
+        # make_plan predicts the next plan_batch frontier states across plan_workers forked processes.
+        # The plan is the same as with 0 workers, which expands one state at a time in this process
+        self.plan_workers = 0
+        self.plan_batch = 16
+        self.plan_pool = None
+        # TraceWriters of the planned and predicted grids minds_eye.py shows, see start_trace
+        self.plan_log = None
+        self.predict_log = None
+        # Anytime planning: make_plan stops after plan_deadline ms and / or plan_max_states predicted states
+        # and plans to the best state found so far. plan_truncated tells whether the last plan was cut short
+        self.plan_deadline = None
+        self.plan_max_states = None
+        self.plan_truncated = False
+        # make_plan keeps at most plan_keep_states states in self.states (None keeps them all). Past that it drops
+        # states that are on no heap and that no kept state was predicted from, their slots become None
+        self.plan_keep_states = None
+        self.plan_children = []
+        self.plan_frontier = set()
+        self.plan_held = set()
+        self.plan_leaves = deque()
+        self.plan_kept = 0
         self.applied_rules = set()
         self.applied_rules_loc = set()
         self.applied_exceptions = set()
@@ -213,11 +268,10 @@ class AIRIS(object):
             if self.debug: print('last change 1D', self.last_change_1D)
             # If there was a change, create a rule (discarding the new rule if the rule already exists)
             for cox, coy, cod, cord, coad in self.last_change_2D:
-                rule_id = str(uuid.uuid4())[:6]
                 if input_2d[cox][coy] != self.states[state].input_2D[cox][coy]:
                     clear_plan = True
 
-                new_rule = self.create_rule(action, cox, coy, cod, cord, coad, rule_id, state, self.states[state].prev_state, self.input_1D, input_1d, self.input_2D, input_2d, self.time_step)
+                new_rule = self.create_rule(action, cox, coy, cod, cord, coad, state, self.states[state].prev_state, self.input_1D, input_1d, self.input_2D, input_2d, self.time_step)
                 self.applied_rules.add(new_rule)
                 self.applied_rules_loc.add((new_rule, cox, coy))
                 if self.debug: print('Attempted to create rule', new_rule)
@@ -226,14 +280,13 @@ class AIRIS(object):
 
             # If there was a rule applied to a location but no change occurred there, then create a "No change" rule
             for loc_key in self.states[state].applied_rules.keys():
-                rule_id = str(uuid.uuid4())[:6]
                 rule_data = self.states[state].applied_rules[loc_key]
                 key = loc_key.split(':')
                 loc_x = int(key[0])
                 loc_y = int(key[1])
                 if rule_data[1] == 'None' and self.input_2D[loc_x][loc_y] - input_2d[loc_x][loc_y] == 0:
-                    new_rule = self.create_rule(action, loc_x, loc_y, self.input_2D[loc_x][loc_y], 0, input_2d[loc_x][loc_y], rule_id, state, self.states[state].prev_state, self.input_1D, input_1d, self.input_2D, input_2d, self.time_step)
-                    if self.debug: print('No change rule created', new_rule, rule_id)
+                    new_rule = self.create_rule(action, loc_x, loc_y, self.input_2D[loc_x][loc_y], 0, input_2d[loc_x][loc_y], state, self.states[state].prev_state, self.input_1D, input_1d, self.input_2D, input_2d, self.time_step)
+                    if self.debug: print('No change rule created', new_rule)
 
             if self.debug: print('self.applied_rules: ', self.applied_rules)
             if self.debug: print('self.applied_exceptions: ', self.applied_exceptions)
@@ -251,7 +304,7 @@ class AIRIS(object):
 
             # If this was the last action in the plan, then add the previous state to state_history
             if not self.action_plan:
-                if (str(self.input_1D), str(self.input_2D), action) not in self.state_history:
+                if (state_hash(self.input_1D, self.input_2D), action) not in self.state_history:
                     if self.debug: print('adding this state with', action)
                     if self.debug: print('full state history addition', ((str(self.input_1D), str(self.input_2D)), action))
                     if self.debug: print('Added to state history', self.time_step, action, self.input_1D, '+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
@@ -271,7 +324,7 @@ class AIRIS(object):
                         if self.debug: print('')
                         if self.debug: print("[' 0', ' 1', ' 2', ' 3', ' 4', ' 5', ' 6', ' 7', ' 8', ' 9', '10', '11', '12', '13', '14', '15', '16', '17', '18', '19']")
 
-                self.state_history.add(((str(self.input_1D), str(self.input_2D)), action))
+                self.state_history.add((state_hash(self.input_1D, self.input_2D), action))
                 if self.debug: print('state history length ', len(self.state_history))
 
             # If there was an unxpected change during plan execution, abandon the plan
@@ -302,6 +355,7 @@ class AIRIS(object):
     def make_plan(self, given_goal, generated):
         starttime = time.time()
         self.goal_reached = True
+        self.plan_truncated = False
 
         self.current_state = 0
         self.best_state = 0
@@ -318,23 +372,35 @@ class AIRIS(object):
             else:
                 self.goal_reached = False
         state_heap = [(0, self.current_state, 0)]
-        confidence_heap = []
+        confidence_heap = Frontier(self.states)
         state_set = {(self.states[0].hash(), None)}
         depth = 0
+        expanded = set()
+        self.plan_children = [0]
+        self.plan_frontier = {0}
+        self.plan_held = set()
+        self.plan_leaves = deque()
+        self.plan_kept = 1
         while not self.goal_reached:
             depth += 1
 
-            if state_heap and depth <= self.plan_depth:
+            if state_heap and depth <= self.plan_depth and (depth == 1 or not self.plan_budget_spent(starttime)):
+                if self.plan_workers > 0 and len(state_heap) >= self.plan_batch and state_heap[0][1] not in expanded:
+                    self.expand_frontier(state_heap, expanded)
                 self.current_state = heapq.heappop(state_heap)[1]
+                self.plan_frontier.discard(self.current_state)
             else:
-                if depth > self.plan_depth:
+                if state_heap and depth <= self.plan_depth:
+                    if self.debug: print('Plan budget spent', round(time.time() - starttime, 3), len(self.states))
+                    self.plan_truncated = True
+                    if confidence_heap:
+                        self.best_state = confidence_heap.pop_until(self.planned_before)
+                    else:
+                        self.best_state = state_heap[0][1]
+                elif depth > self.plan_depth:
                     self.plan_depth += 1000
                     if self.debug: print('Plan limit reached', self.plan_depth)
-                    far = sorted(confidence_heap, key=itemgetter(1))
-                    find_state = -1
-                    while self.states[far[find_state][1]].anti_goal:
-                        find_state -= 1
-                    self.best_state = far[find_state][1]
+                    self.best_state = confidence_heap.furthest()
 
 
                     if self.debug: print('Trying furthest state')
@@ -356,8 +422,8 @@ class AIRIS(object):
                     if self.debug: print('no more states', len(confidence_heap), depth, self.plan_depth)
                     if confidence_heap:
                         if self.debug: print('confidence heap ', confidence_heap)
-                        self.best_state = heapq.heappop(confidence_heap)[1]
-                        while confidence_heap and (self.states[self.states[self.best_state].prev_state].hash(), self.states[self.best_state].action) in self.state_history:
+                        self.best_state = confidence_heap.pop()[1]
+                        while confidence_heap and self.planned_before(self.best_state):
                             if self.debug: print('confidence heap ', confidence_heap)
                             if self.debug: print('in history ', self.best_state, self.states[self.best_state].prev_state, self.states[self.best_state].action)
                             if self.debug:
@@ -376,9 +442,9 @@ class AIRIS(object):
                                 if self.debug: print('')
                                 if self.debug: print("[' 0', ' 1', ' 2', ' 3', ' 4', ' 5', ' 6', ' 7', ' 8', ' 9', '10', '11', '12', '13', '14', '15', '16', '17', '18', '19']")
 
-                            self.best_state = heapq.heappop(confidence_heap)[1]
+                            self.best_state = confidence_heap.pop()[1]
                         if not confidence_heap:
-                            if (self.states[self.states[self.best_state].prev_state].hash(), self.states[self.best_state].action) in self.state_history:
+                            if self.planned_before(self.best_state):
                                 if self.debug: print('All unknowns already in history. Resetting history')
                                 self.state_history = set()
 
@@ -389,6 +455,7 @@ class AIRIS(object):
                 break
 
             for act in self.action_space:
+                heaped = (len(state_heap), len(confidence_heap))
                 new_state, predict_rules_2d, predict_rules_1d, _, _, _, no_rule_found = self.predict(act, self.current_state, self.states[self.current_state].step + 1)
                 check_hash = new_state.hash()
                 confidence = 0
@@ -439,19 +506,19 @@ class AIRIS(object):
                                     heapq.heappush(state_heap, (new_state.step, len(self.states) - 1, new_state.step))
                                     if self.debug: print('added to state heap 1')
                                 if confidence == 1 and no_rule_found:
-                                    heapq.heappush(confidence_heap, (0.99, len(self.states) - 1))
+                                    confidence_heap.push((0.99, len(self.states) - 1))
                                     if self.debug: print('no rule added to confidence heap')
                                 elif confidence != 1:
-                                    heapq.heappush(confidence_heap, (confidence, len(self.states) - 1))
+                                    confidence_heap.push((confidence, len(self.states) - 1))
                                     if self.debug: print('added to confidence heap 1')
 
                             else:
                                 if confidence == 1 and no_rule_found:
-                                    heapq.heappush(confidence_heap, (0.99, len(self.states) - 1))
+                                    confidence_heap.push((0.99, len(self.states) - 1))
 
                                     if self.debug: print('no rule added to confidence heap')
                                 elif confidence != 1:
-                                    heapq.heappush(confidence_heap, (confidence + 1000, len(self.states) - 1))
+                                    confidence_heap.push((confidence + 1000, len(self.states) - 1))
                                     if self.debug: print('added to confidence heap 2')
 
                             self.goal_reached = False
@@ -471,43 +538,43 @@ class AIRIS(object):
                                     if self.debug: print('added to state heap 4')
                             if confidence == 1 and no_rule_found:
                                 if compare_diff is not None:
-                                    heapq.heappush(confidence_heap, (0.99 + compare_diff + 1, len(self.states) - 1))
+                                    confidence_heap.push((0.99 + compare_diff + 1, len(self.states) - 1))
                                     if self.debug: print('added to confidence heap 5')
                                 else:
-                                    heapq.heappush(confidence_heap, (0.99, len(self.states) - 1))
+                                    confidence_heap.push((0.99, len(self.states) - 1))
                                     if self.debug: print('added to confidence heap 6')
                                 if self.debug: print('no rule added to confidence heap')
                             elif confidence != 1:
                                 if compare_diff is not None:
-                                    heapq.heappush(confidence_heap, (confidence + compare_diff, len(self.states) - 1))
+                                    confidence_heap.push((confidence + compare_diff, len(self.states) - 1))
                                     if self.debug: print('added to confidence heap 7')
                                 else:
-                                    heapq.heappush(confidence_heap, (confidence, len(self.states) - 1))
+                                    confidence_heap.push((confidence, len(self.states) - 1))
                                     if self.debug: print('added to confidence heap 8')
 
                         else:
                             if confidence == 1 and no_rule_found:
                                 if compare_diff is not None:
-                                    heapq.heappush(confidence_heap, (0.99 + compare_diff + 1, len(self.states) - 1))
+                                    confidence_heap.push((0.99 + compare_diff + 1, len(self.states) - 1))
                                     if self.debug: print('added to confidence heap 9')
                                 else:
-                                    heapq.heappush(confidence_heap, (0.99, len(self.states) - 1))
+                                    confidence_heap.push((0.99, len(self.states) - 1))
                                     if self.debug: print('added to confidence heap 10')
 
                                 if self.debug: print('no rule added to confidence heap')
                             elif confidence == 1 and new_state.anti_goal:
                                 if compare_diff is not None:
-                                    heapq.heappush(confidence_heap, (confidence + 6000 + compare_diff, len(self.states) - 1))
+                                    confidence_heap.push((confidence + 6000 + compare_diff, len(self.states) - 1))
                                     if self.debug: print('added to confidence heap 13')
                                 else:
-                                    heapq.heappush(confidence_heap, (confidence + 6000, len(self.states) - 1))
+                                    confidence_heap.push((confidence + 6000, len(self.states) - 1))
                                     if self.debug: print('added to confidence heap 14')
                             elif confidence != 1:
                                 if compare_diff is not None:
-                                    heapq.heappush(confidence_heap, (confidence + 1000 + compare_diff, len(self.states) - 1))
+                                    confidence_heap.push((confidence + 1000 + compare_diff, len(self.states) - 1))
                                     if self.debug: print('added to confidence heap 15')
                                 else:
-                                    heapq.heappush(confidence_heap, (confidence + 1000, len(self.states) - 1))
+                                    confidence_heap.push((confidence + 1000, len(self.states) - 1))
                                     if self.debug: print('added to confidence heap 16')
 
                 else:
@@ -518,44 +585,51 @@ class AIRIS(object):
                     if not new_state.anti_goal or confidence != 1:
                         if confidence == 1 and no_rule_found:
                             if compare_diff is not None:
-                                heapq.heappush(confidence_heap, (0.99 + compare_diff + 1, len(self.states) - 1))
+                                confidence_heap.push((0.99 + compare_diff + 1, len(self.states) - 1))
                                 if self.debug: print('added to confidence heap 17')
                             else:
-                                heapq.heappush(confidence_heap, (0.99, len(self.states) - 1))
+                                confidence_heap.push((0.99, len(self.states) - 1))
                                 if self.debug: print('added to confidence heap 18')
                             if self.debug: print('no rule added to confidence heap')
                         elif confidence != 1:
                             if compare_diff is not None:
-                                heapq.heappush(confidence_heap, (confidence + compare_diff, len(self.states) - 1))
+                                confidence_heap.push((confidence + compare_diff, len(self.states) - 1))
                                 if self.debug: print('added to confidence heap 19')
                             else:
-                                heapq.heappush(confidence_heap, (confidence, len(self.states) - 1))
+                                confidence_heap.push((confidence, len(self.states) - 1))
                                 if self.debug: print('added to confidence heap 20')
 
                     else:
                         if confidence == 1 and no_rule_found:
                             if compare_diff is not None:
-                                heapq.heappush(confidence_heap, (0.99 + compare_diff + 1, len(self.states) - 1))
+                                confidence_heap.push((0.99 + compare_diff + 1, len(self.states) - 1))
                                 if self.debug: print('added to confidence heap 21')
                             else:
-                                heapq.heappush(confidence_heap, (0.99, len(self.states) - 1))
+                                confidence_heap.push((0.99, len(self.states) - 1))
                                 if self.debug: print('added to confidence heap 22')
                             if self.debug: print('no rule added to confidence heap')
                         if confidence == 1 and new_state.anti_goal:
                             if compare_diff is not None:
-                                heapq.heappush(confidence_heap, (confidence + 6000 + compare_diff, len(self.states) - 1))
+                                confidence_heap.push((confidence + 6000 + compare_diff, len(self.states) - 1))
                                 if self.debug: print('added to confidence heap 23')
                             else:
-                                heapq.heappush(confidence_heap, (confidence + 6000, len(self.states) - 1))
+                                confidence_heap.push((confidence + 6000, len(self.states) - 1))
                                 if self.debug: print('added to confidence heap 24')
                         elif confidence != 1:
                             if compare_diff is not None:
-                                heapq.heappush(confidence_heap, (confidence + 1000 + compare_diff, len(self.states) - 1))
+                                confidence_heap.push((confidence + 1000 + compare_diff, len(self.states) - 1))
                                 if self.debug: print('added to confidence heap 25')
                             else:
-                                heapq.heappush(confidence_heap, (confidence + 1000, len(self.states) - 1))
+                                confidence_heap.push((confidence + 1000, len(self.states) - 1))
                                 if self.debug: print('added to confidence heap 26')
 
+                if self.plan_keep_states is not None:
+                    self.keep_plan_state(len(state_heap) > heaped[0], len(confidence_heap) > heaped[1])
+
+            # a reached goal breaks out of the actions before its states are recorded, and ends the search
+            if self.plan_keep_states is not None and not self.goal_reached:
+                self.evict_plan_states()
+
             if self.debug: print('planning debug - state heap', len(state_heap), 'conf heap', len(confidence_heap), 'goal reached', self.goal_reached)
 
         if self.best_state != 0 or (self.goal_reached and self.best_state == 0):
@@ -575,8 +649,8 @@ class AIRIS(object):
             if self.debug: print('Action Plan: ', self.action_plan)
 
             for plan in self.action_plan:
-                with open('./plan_log/' + str(self.time_step) + '.txt', 'a') as f:
-                    f.write(str(self.states[plan[1]].input_2D) + '\n')
+                if self.plan_log is not None:
+                    self.plan_log.write(self.time_step, self.states[plan[1]].input_2D)
 
                 if self.debug: print('plan state', plan[1], self.states[plan[1]].action, self.states[plan[1]].applied_rule_ids, self.states[plan[1]].compare, self.states[plan[1]].anti_goal, self.states[plan[1]].input_1D, self.states[plan[1]].step, self.plan_depth, self.states[plan[1]].confidence, self.states[plan[1]].last_pos_change_2d, '+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+')
                 if self.debug:
@@ -595,16 +669,222 @@ class AIRIS(object):
                     if self.debug: print('')
                     if self.debug: print("[' 0', ' 1', ' 2', ' 3', ' 4', ' 5', ' 6', ' 7', ' 8', ' 9', '10', '11', '12', '13', '14', '15', '16', '17', '18', '19']")
 
+            if self.plan_keep_states is not None:
+                self.compact_plan_states()
+
+        self.stop_plan_pool()
+        if self.plan_log is not None:
+            self.plan_log.flush()
+        if self.predict_log is not None:
+            self.predict_log.flush()
         if self.debug: print('++++++++++ make plan time:', round(time.time() - starttime, 10))
         if self.debug: print('---------- make plan states / dupes:', len(self.states), dupes)
 
+    # Traces every plan to plan_dir and every predicted state to predict_dir for minds_eye.py. The grids are
+    # buffered and written by a background thread, max_bytes and keep_files bound the disk each one uses
+    def start_trace(self, plan_dir='./plan_log', predict_dir='./predict_log', max_bytes=1 << 24, keep_files=4):
+        self.stop_trace()
+        self.plan_log = TraceWriter(plan_dir, max_bytes, keep_files)
+        self.predict_log = TraceWriter(predict_dir, max_bytes, keep_files)
+
+    # Both writers are stopped even when closing the first one raises the error of its writer thread
+    def stop_trace(self):
+        plan_log, self.plan_log = self.plan_log, None
+        predict_log, self.predict_log = self.predict_log, None
+        try:
+            if plan_log is not None:
+                plan_log.close()
+        finally:
+            if predict_log is not None:
+                predict_log.close()
+
+    # Records the state make_plan just appended and whether it went on state_heap / confidence_heap. A state on
+    # neither heap is never expanded or planned to, so it is a leaf evict_plan_states can drop
+    def keep_plan_state(self, in_frontier, in_held):
+        index = len(self.states) - 1
+        self.plan_children.append(0)
+        self.plan_children[self.states[index].prev_state] += 1
+        self.plan_kept += 1
+        if in_frontier:
+            self.plan_frontier.add(index)
+        if in_held:
+            self.plan_held.add(index)
+        if not in_frontier and not in_held:
+            self.plan_leaves.append(index)
+
+    # Drops leaves, oldest first, until at most plan_keep_states states are kept. The state a leaf was predicted
+    # from becomes a leaf itself once it is off the heaps and its last kept child is gone, so every kept state
+    # still has its whole prev_state chain back to state 0 to build a plan from
+    def evict_plan_states(self):
+        skipped = []
+        while self.plan_kept > self.plan_keep_states and self.plan_leaves:
+            index = self.plan_leaves.popleft()
+            if index == self.best_state:
+                skipped.append(index)
+                continue
+            state = self.states[index]
+            self.states[index] = None
+            state.release()
+            self.plan_kept -= 1
+            parent = state.prev_state
+            self.plan_children[parent] -= 1
+            if parent != 0 and self.plan_children[parent] == 0 and parent not in self.plan_frontier and parent not in self.plan_held:
+                self.plan_leaves.append(parent)
+        self.plan_leaves.extendleft(skipped)
+        if self.debug: print('Plan states kept', self.plan_kept, 'of', len(self.states))
+
+    # Only the states of the action plan are read while it is carried out, the rest of the search graph is dropped
+    def compact_plan_states(self):
+        plan = set(step[1] for step in self.action_plan)
+        plan.add(0)
+        for index, state in enumerate(self.states):
+            if state is not None and index not in plan:
+                self.states[index] = None
+                state.release()
+
+    # Whether the action of state index was already taken from the state it was predicted from
+    def planned_before(self, index):
+        return (self.states[self.states[index].prev_state].hash(), self.states[index].action) in self.state_history
+
+    # Whether the anytime budget of the current make_plan call is used up
+    def plan_budget_spent(self, starttime):
+        if self.plan_deadline is not None and (time.time() - starttime) * 1000 >= self.plan_deadline:
+            return True
+        if self.plan_max_states is not None and len(self.states) - 1 >= self.plan_max_states:
+            return True
+        return False
+
+    # Forks the planning workers with a copy of the current knowledge. Predictions come back through
+    # predict_cache, so there is nothing to do without it. make_plan only starts the pool once its frontier
+    # holds plan_batch states, forking costs more than planning the small plans in this process
+    def start_plan_pool(self):
+        self.stop_plan_pool()
+        if self.plan_workers > 0 and self.predict_cache_size > 0:
+            if 'fork' in multiprocessing.get_all_start_methods():
+                self.plan_pool = multiprocessing.get_context('fork').Pool(self.plan_workers, initializer=start_planner, initargs=(self,))
+            else:
+                if self.debug: print('fork is not available, planning in this process')
+
+    # Lets the workers exit instead of terminating them, SDL keeps SIGTERM from killing a forked pygame process
+    def stop_plan_pool(self):
+        if self.plan_pool is not None:
+            self.plan_pool.close()
+            self.plan_pool.join()
+            self.plan_pool = None
+
+    # Predicts every action from the next plan_batch states of state_heap in the worker pool and stores the
+    # results in predict_cache. make_plan then expands the states one by one in its usual order and picks
+    # the predictions up as cache hits, so the plan does not depend on the number of workers
+    def expand_frontier(self, state_heap, expanded):
+        if self.plan_pool is None:
+            self.start_plan_pool()
+            if self.plan_pool is None:
+                return
+        keys = []
+        tasks = []
+        for entry in heapq.nsmallest(self.plan_batch, state_heap):
+            if entry[1] in expanded:
+                continue
+            expanded.add(entry[1])
+            base = self.states[entry[1]]
+            for act in self.action_space:
+                key = self.predict_key(act, base)
+                if key not in self.predict_cache and key not in keys:
+                    keys.append(key)
+                    tasks.append((act, base.input_1D, base.input_2D, base.input_2D_idx, base.step, base.action, base.prev_action, base.last_pos_change_2d))
+        if not tasks:
+            return
+        chunksize = max(1, len(tasks) // (self.plan_workers * 4))
+        for key, entry in zip(keys, self.plan_pool.map(predict_worker, tasks, chunksize)):
+            self.predict_cache[key] = entry
+            if len(self.predict_cache) > self.predict_cache_size:
+                self.predict_cache.popitem(last=False)
+
+    # Returns the cached prediction of act from the contents of base_state if there is one, otherwise runs
+    # the rules. Entries keep the version of the rules of every value the prediction looked at and are dropped
+    # as soon as create_rule / update_rule / clean_rule changed a rule of one of those values. A plan made
+    # after the last one was abandoned gets every prediction of the old search graph this way that no rule
+    # change touched, without predicting it again
     def predict(self, act, base_state, step):
+        if self.predict_cache_size <= 0:
+            return self.predict_rules(act, base_state, step)
+
+        base = self.states[base_state]
+        key = self.predict_key(act, base)
+        try:
+            versions, cached_state, result, anti_goal, no_change, last_changes = self.predict_cache[key]
+            if all(self.knowledge.versions.get(val, 0) == version for val, version in versions):
+                self.predict_cache.move_to_end(key)
+                predict_rule_2d, predict_rule_1d, uncertainty, exception_uncertainty, exceptions, no_rule_found = result
+                input_1D, delta_2d, zobrist, input_2D_idx, applied_rules, applied_rule_ids, applied_exceptions, applied_exception_ids = cached_state
+                if base.action is None:
+                    prev_action = base.prev_action
+                else:
+                    prev_action = base.action
+                # a prediction without rules keeps the change list of its base state
+                if last_changes is None:
+                    last_changes = base.last_pos_change_2d
+                else:
+                    last_changes = list(last_changes)
+                # the delta was taken against a state with the same contents as base
+                predict_state = State.derive(base, act, base_state, base.step + 1, last_changes, prev_action)
+                predict_state.input_1D = list(input_1D)
+                predict_state.delta_2d = dict(delta_2d)
+                predict_state.zobrist = zobrist
+                predict_state.input_2D_idx = defaultdict(list, input_2D_idx)
+                predict_state.applied_rules = dict(applied_rules)
+                predict_state.applied_rule_ids = set(applied_rule_ids)
+                predict_state.applied_exceptions = dict(applied_exceptions)
+                predict_state.applied_exception_ids = set(applied_exception_ids)
+                predict_state.anti_goal = anti_goal
+                predict_state.no_change = no_change
+
+                if self.predict_log is not None:
+                    self.predict_log.write(self.time_step, predict_state.input_2D)
+                if self.debug: print('predict cache hit', act, base_state)
+                return predict_state, dict(predict_rule_2d), dict(predict_rule_1d), uncertainty, exception_uncertainty, dict(exceptions), no_rule_found
+            del self.predict_cache[key]
+        except KeyError:
+            pass
+
+        result = self.predict_rules(act, base_state, step)
+        self.predict_cache[key] = self.predict_entry(base, result)
+        if len(self.predict_cache) > self.predict_cache_size:
+            self.predict_cache.popitem(last=False)
+        return result
+
+    # The state hash stands in for the contents, so a lookup neither walks nor materializes input_2D.
+    # State.verify_hashes guards against two states sharing a hash. predict_rules only pops the changed
+    # positions from a heap, so their order does not matter. Sorting them lets an observed state share
+    # entries with the predicted state it matches
+    def predict_key(self, act, base):
+        if base.last_pos_change_2d:
+            return act, base.hash(), tuple(sorted(base.last_pos_change_2d))
+        return act, base.hash(), None
+
+    # predict_cache entry of the predict_rules result from base. The entry only depends on the rules of the
+    # values predict_rules looked at, so a rule change elsewhere in the grid leaves it valid
+    def predict_entry(self, base, result):
+        predict_state = result[0]
+        versions = tuple((val, self.knowledge.versions.get(val, 0)) for val in self.predict_values)
+        if predict_state.last_pos_change_2d is base.last_pos_change_2d:
+            last_changes = None
+        else:
+            last_changes = tuple(predict_state.last_pos_change_2d)
+        # the returned objects are only read after predict, so the entry keeps them as they are. The state
+        # itself is not kept, it would hold on to the whole chain of states it was derived from
+        cached_state = (predict_state.input_1D, predict_state.delta_2d, predict_state.zobrist, predict_state.input_2D_idx, predict_state.applied_rules, predict_state.applied_rule_ids, predict_state.applied_exceptions, predict_state.applied_exception_ids)
+        return versions, cached_state, result[1:], predict_state.anti_goal, predict_state.no_change, last_changes
+
+    def predict_rules(self, act, base_state, step):
         starttime = time.time()
         if self.states[base_state].action is None:
-            predict_state = State(self.states[base_state].input_1D, self.states[base_state].input_2D, self.states[base_state].input_2D_idx, act, base_state, self.states[base_state].step + 1, self.states[base_state].last_pos_change_2d, self.states[base_state].prev_action)
+            predict_state = State.derive(self.states[base_state], act, base_state, self.states[base_state].step + 1, self.states[base_state].last_pos_change_2d, self.states[base_state].prev_action)
         else:
-            predict_state = State(self.states[base_state].input_1D, self.states[base_state].input_2D, self.states[base_state].input_2D_idx, act, base_state, self.states[base_state].step + 1, self.states[base_state].last_pos_change_2d, self.states[base_state].action)
+            predict_state = State.derive(self.states[base_state], act, base_state, self.states[base_state].step + 1, self.states[base_state].last_pos_change_2d, self.states[base_state].action)
         state_pos_change_2D = self.states[base_state].last_pos_change_2d
+        # values whose rules this prediction read, predict_entry keeps their versions
+        self.predict_values = set()
         predict_heap_2d = []
         predict_rule_2d = dict()
         predict_rule_1d = dict()
@@ -632,6 +912,13 @@ class AIRIS(object):
 
             heapq.heapify(check_pos)
 
+            matcher = None
+            if self.vectorized_predict:
+                try:
+                    matcher = RuleMatcher(self.knowledge, self.rule_stencils, predict_state.input_2D, predict_state.input_1D, self.states[base_state].input_1D, act, check_pos)
+                except ValueError:
+                    if self.debug: print('input_2D not rectangular, using the reference rule loop')
+
             while len(check_pos):
                 pos = heapq.heappop(check_pos)
                 if self.debug: print(pos[0], pos[1])
@@ -639,304 +926,294 @@ class AIRIS(object):
                     val = predict_state.input_2D[pos[0]][pos[1]]
                 except IndexError:
                     continue
-                rules = []
-
-                try:
-                    rules = self.knowledge['2d/' + str(val)]
-                except KeyError:
-                    pass
+                self.predict_values.add(val)
+                rules = self.knowledge.rules_for(val)
 
                 if len(rules) > 0:
                     if self.debug: print('\npos', pos, val)
                     dix = pos[0]
                     diy = pos[1]
 
-                    for ri, rule in enumerate(rules):
-                        match = 0
-                        uncertainty = 0
-                        abs_pos = False
-                        match_count = 0
-                        condition_group = self.knowledge['2d/' + str(val) + '/' + str(rule)]
-                        exception_heap = []
-                        if self.debug: print('checking rule ', rule)
-
-                        if self.knowledge['2d/' + str(val) + '/' + str(condition_group) + '/combined']:
-                            if self.debug: print('rule combined, skipping')
-                            continue
-
-                        try:
-                            if str(dix) + ':' + str(diy) in self.knowledge['2d/' + str(val) + '/' + str(condition_group) + '/apos'].keys():
-                                abs_pos = True
-                                if self.debug: print('abs pos found')
-                            else:
-                                if len(self.knowledge['2d/' + str(val) + '/' + str(condition_group) + '/apos'].keys()) != 0:
+                    if matcher is not None:
+                        last_rule_1d = matcher.push_cell(rules, val, dix, diy, predict_heap_2d)
+                        if last_rule_1d is not None:
+                            predict_rule_1d = last_rule_1d
+                    else:
+                        for ri, group_data in enumerate(rules):
+                            match = 0
+                            uncertainty = 0
+                            abs_pos = False
+                            match_count = 0
+                            rule = group_data.id
+                            condition_group = group_data.index
+                            exception_heap = []
+                            if self.debug: print('checking rule ', rule)
+
+                            if group_data.combined:
+                                if self.debug: print('rule combined, skipping')
+                                continue
+
+                            if group_data.apos:
+                                if str(dix) + ':' + str(diy) in group_data.apos:
+                                    abs_pos = True
+                                    if self.debug: print('abs pos found')
+                                else:
                                     match_count += 1
                                     if self.debug: print('abs pos not found')
                                     continue
-                        except KeyError:
-                            pass
 
-                        try:
-                            rel_condition_data = self.knowledge['2d/' + str(val) + '/' + str(condition_group) + '/inclusions/rel']
-                            for ci, condition in enumerate(rel_condition_data):
-                                crx, cry, cod, cor = condition
-                                if predict_state.input_2D[dix + crx][diy + cry] == cod:
-                                    pass
-                        except IndexError:
-                            continue
+                            try:
+                                rel_condition_data = group_data.inclusions
+                                for ci, condition in enumerate(rel_condition_data):
+                                    crx, cry, cod, cor = condition
+                                    if predict_state.input_2D[dix + crx][diy + cry] == cod:
+                                        pass
+                            except IndexError:
+                                continue
 
-                        try:
-                            act_data = self.knowledge['2d/' + str(val) + '/' + str(condition_group) + '/act'][act]
-                            if act_data[0] / act_data[1] == 1:
-                                match += 1
-                                match_count += 1
-                                if self.debug: print('act found', match, match_count)
-                                act_found = True
+                            try:
+                                act_data = group_data.act[act]
+                                if act_data[0] / act_data[1] == 1:
+                                    match += 1
+                                    match_count += 1
+                                    if self.debug: print('act found', match, match_count)
+                                    act_found = True
 
-                        except KeyError:
-                            if len(self.knowledge['2d/' + str(val) + '/' + str(condition_group) + '/act'].keys()) == 0:
-                                match += 1
-                            match_count += 1
-                            if self.debug: print('act not found', match, match_count)
-                            continue
+                            except KeyError:
+                                if len(group_data.act) == 0:
+                                    match += 1
+                                match_count += 1
+                                if self.debug: print('act not found', match, match_count)
+                                continue
 
-                        rel_heap = []
-                        rel_data = self.knowledge['2d/' + str(val) + '/' + str(condition_group) + '/rel']
-                        for rel_key in self.knowledge['2d/' + str(val) + '/' + str(condition_group) + '/rel'].keys():
-                            heapq.heappush(rel_heap, (-(rel_data[rel_key][0] / rel_data[rel_key][1]), rel_key))
+                            rel_heap = []
+                            rel_data = group_data.rel
+                            for rel_key in rel_data.keys():
+                                heapq.heappush(rel_heap, (-(rel_data[rel_key][0] / rel_data[rel_key][1]), rel_key))
 
-                        change_type = ('rel', rel_heap[0][1])
+                            change_type = ('rel', rel_heap[0][1])
 
-                        if change_type[1] == 0:
-                            match = match_count
+                            if change_type[1] == 0:
+                                match = match_count
 
-                        hold_rel = dict()
+                            hold_rel = dict()
 
-                        rel_condition_data = self.knowledge['2d/' + str(val) + '/' + str(condition_group) + '/inclusions/rel']
+                            rel_condition_data = group_data.inclusions
 
-                        for ci, condition in enumerate(rel_condition_data):
-                            crx, cry, cod, cor = condition
-                            try:
-                                if hold_rel[str(dix + crx) + ':' + str(diy + cry)]:
-                                    pass
-                            except KeyError:
-                                hold_rel[str(dix + crx) + ':' + str(diy + cry)] = []
+                            for ci, condition in enumerate(rel_condition_data):
+                                crx, cry, cod, cor = condition
+                                try:
+                                    if hold_rel[str(dix + crx) + ':' + str(diy + cry)]:
+                                        pass
+                                except KeyError:
+                                    hold_rel[str(dix + crx) + ':' + str(diy + cry)] = []
 
-                            try:
-                                if self.debug: print('rule', rule, 'condition group', condition_group)
-                                if self.debug: print('rel condition data', rel_condition_data)
-                                if self.debug: print('CRX', crx, 'CRY', cry, 'COD', cod, 'ACTUAL', predict_state.input_2D[dix + crx][diy + cry])
-                                if predict_state.input_2D[dix + crx][diy + cry] == cod:
-                                    heapq.heappush(hold_rel[str(dix + crx) + ':' + str(diy + cry)], -1)
-                                else:
-                                    if cod != 0 and predict_state.input_2D[dix + crx][diy + cry] != 0:
-                                        if cod < predict_state.input_2D[dix + crx][diy + cry]:
-                                            heapq.heappush(hold_rel[str(dix + crx) + ':' + str(diy + cry)], -(cod / predict_state.input_2D[dix + crx][diy + cry]))
-                                        else:
-                                            heapq.heappush(hold_rel[str(dix + crx) + ':' + str(diy + cry)], -(predict_state.input_2D[dix + crx][diy + cry] / cod))
+                                try:
+                                    if self.debug: print('rule', rule, 'condition group', condition_group)
+                                    if self.debug: print('rel condition data', rel_condition_data)
+                                    if self.debug: print('CRX', crx, 'CRY', cry, 'COD', cod, 'ACTUAL', predict_state.input_2D[dix + crx][diy + cry])
+                                    if predict_state.input_2D[dix + crx][diy + cry] == cod:
+                                        heapq.heappush(hold_rel[str(dix + crx) + ':' + str(diy + cry)], -1)
                                     else:
-                                        heapq.heappush(hold_rel[str(dix + crx) + ':' + str(diy + cry)], 0)
+                                        if cod != 0 and predict_state.input_2D[dix + crx][diy + cry] != 0:
+                                            if cod < predict_state.input_2D[dix + crx][diy + cry]:
+                                                heapq.heappush(hold_rel[str(dix + crx) + ':' + str(diy + cry)], -(cod / predict_state.input_2D[dix + crx][diy + cry]))
+                                            else:
+                                                heapq.heappush(hold_rel[str(dix + crx) + ':' + str(diy + cry)], -(predict_state.input_2D[dix + crx][diy + cry] / cod))
+                                        else:
+                                            heapq.heappush(hold_rel[str(dix + crx) + ':' + str(diy + cry)], 0)
 
-                            except IndexError:
-                                heapq.heappush(hold_rel[str(dix + crx) + ':' + str(diy + cry)], 0)
+                                except IndexError:
+                                    heapq.heappush(hold_rel[str(dix + crx) + ':' + str(diy + cry)], 0)
 
-                        for key in hold_rel.keys():
-                            if -(hold_rel[key][0]) != 1:
-                                match += -(hold_rel[key][0])
-                                if hold_rel[key][0] != 0:
-                                    uncertainty += -(hold_rel[key][0])
+                            for key in hold_rel.keys():
+                                if -(hold_rel[key][0]) != 1:
+                                    match += -(hold_rel[key][0])
+                                    if hold_rel[key][0] != 0:
+                                        uncertainty += -(hold_rel[key][0])
+                                    else:
+                                        uncertainty += 1
                                 else:
-                                    uncertainty += 1
-                            else:
-                                match += 1
-                            match_count += 1
-                            if self.debug: print('hold rel', match, match_count)
-
-                        predict_rule_1d = dict()
-                        try:
-                            rule_1d_data = self.knowledge['1d/' + rule]
-                            for di in rule_1d_data:
-                                predict_rule_1d[di] = []
-                                di_heap = []
-                                condition_group_1d = self.knowledge['1d/' + str(di) + '/' + str(rule)]
-                                oval_data = self.knowledge['1d/' + str(di) + '/' + str(condition_group_1d) + '/oval']
-                                oval = predict_state.input_1D[di]
-                                try:
-                                    check = oval_data[oval]
                                     match += 1
-                                    match_count += 1
-                                    if self.debug: print('1d found', match, match_count)
-                                except KeyError:
-                                    for key in oval_data.keys():
-                                        if key != 0 and oval != 0:
-                                            if key > 0 and oval > 0:
-                                                if key < oval:
-                                                    heapq.heappush(di_heap, (-(key / oval), key))
-                                                else:
-                                                    heapq.heappush(di_heap, (-(oval / key), key))
-                                            elif key < 0 and oval < 0:
-                                                if key > oval:
-                                                    heapq.heappush(di_heap, (-(-key / -oval), key))
+                                match_count += 1
+                                if self.debug: print('hold rel', match, match_count)
+
+                            predict_rule_1d = dict()
+                            if group_data.dims_1d is not None:
+                                for di in group_data.dims_1d:
+                                    predict_rule_1d[di] = []
+                                    di_heap = []
+                                    group_1d = group_data.rules_1d[di]
+                                    oval_data = group_1d.oval
+                                    oval = predict_state.input_1D[di]
+                                    try:
+                                        check = oval_data[oval]
+                                        match += 1
+                                        match_count += 1
+                                        if self.debug: print('1d found', match, match_count)
+                                    except KeyError:
+                                        for key in oval_data.keys():
+                                            if key != 0 and oval != 0:
+                                                if key > 0 and oval > 0:
+                                                    if key < oval:
+                                                        heapq.heappush(di_heap, (-(key / oval), key))
+                                                    else:
+                                                        heapq.heappush(di_heap, (-(oval / key), key))
+                                                elif key < 0 and oval < 0:
+                                                    if key > oval:
+                                                        heapq.heappush(di_heap, (-(-key / -oval), key))
+                                                    else:
+                                                        heapq.heappush(di_heap, (-(-oval / -key), key))
                                                 else:
-                                                    heapq.heappush(di_heap, (-(-oval / -key), key))
+                                                    if oval < 0:
+                                                        hold_val = -oval + key
+                                                        heapq.heappush(di_heap, (-(key / hold_val), key))
+                                                    else:
+                                                        hold_val = -key + oval
+                                                        heapq.heappush(di_heap, (-(oval / hold_val), key))
                                             else:
-                                                if oval < 0:
-                                                    hold_val = -oval + key
-                                                    heapq.heappush(di_heap, (-(key / hold_val), key))
-                                                else:
-                                                    hold_val = -key + oval
-                                                    heapq.heappush(di_heap, (-(oval / hold_val), key))
-                                        else:
-                                            heapq.heappush(di_heap, (0, key))
+                                                heapq.heappush(di_heap, (0, key))
 
-                                    if di_heap:
-                                        if -(di_heap[0][0]) != 1:
-                                            match += -(di_heap[0][0])
-                                            if di_heap[0][0] != 0:
-                                                uncertainty += -(di_heap[0][0])
+                                        if di_heap:
+                                            if -(di_heap[0][0]) != 1:
+                                                match += -(di_heap[0][0])
+                                                if di_heap[0][0] != 0:
+                                                    uncertainty += -(di_heap[0][0])
+                                                else:
+                                                    uncertainty += 1
                                             else:
-                                                uncertainty += 1
-                                        else:
-                                            match += 1
-                                        match_count += 1
-                                        if self.debug: print('other 1d', di_heap[0][1], match, match_count)
+                                                match += 1
+                                            match_count += 1
+                                            if self.debug: print('other 1d', di_heap[0][1], match, match_count)
 
-                                rel_1d_data = self.knowledge['1d/' + str(di) + '/' + str(condition_group_1d) + '/rel']
-                                for rel_key in rel_1d_data.keys():
-                                    heapq.heappush(predict_rule_1d[di], (-(rel_1d_data[rel_key][0] / rel_1d_data[rel_key][1]), 'rel', rel_key, condition_group_1d, self.states[base_state].input_1D[di]))
+                                    rel_1d_data = group_1d.rel
+                                    for rel_key in rel_1d_data.keys():
+                                        heapq.heappush(predict_rule_1d[di], (-(rel_1d_data[rel_key][0] / rel_1d_data[rel_key][1]), 'rel', rel_key, group_1d.index, self.states[base_state].input_1D[di]))
 
-                        except KeyError:
-                            pass
+                            exception_heap = []
+                            if group_data.exceptions:
+                                for exception_group in group_data.exceptions:
+                                    exception_match = 0
+                                    exception_match_count = 0
+                                    exception_uncertainty = 0
+                                    exception_data = group_data.exception_groups[exception_group]
 
-                        exception_heap = []
-                        group_exists = True
-                        try:
-                            exception_groups = self.knowledge['2d/' + str(val) + '/' + str(condition_group) + '/exceptions']
-                        except KeyError:
-                            group_exists = False
+                                    exception_act_data = exception_data.act
 
-                        if group_exists:
-                            for exception_group in exception_groups:
-                                exception_match = 0
-                                exception_match_count = 0
-                                exception_uncertainty = 0
-
-                                exception_act_data = self.knowledge['2d/' + str(val) + '/' + str(condition_group) + '/exceptions/' + str(exception_group) + '/act']
-
-                                try:
-                                    if exception_act_data[act][0] / exception_act_data[act][1] == 1:
-                                        exception_match += 1
+                                    try:
+                                        if exception_act_data[act][0] / exception_act_data[act][1] == 1:
+                                            exception_match += 1
+                                            exception_match_count += 1
+                                            if self.debug: print('ex act found', exception_match, exception_match_count)
+                                    except KeyError:
+                                        if len(exception_act_data.keys()) == 0:
+                                            exception_match += 1
                                         exception_match_count += 1
-                                        if self.debug: print('ex act found', exception_match, exception_match_count)
-                                except KeyError:
-                                    if len(exception_act_data.keys()) == 0:
-                                        exception_match += 1
-                                    exception_match_count += 1
-                                    if self.debug: print('ex act not found', exception_match, exception_match_count)
+                                        if self.debug: print('ex act not found', exception_match, exception_match_count)
 
-                                hold_except_rel = dict()
-                                exception_rel_condition_data = self.knowledge['2d/' + str(val) + '/' + str(condition_group) + '/exceptions/' + str(exception_group) + '/rel']
+                                    hold_except_rel = dict()
+                                    exception_rel_condition_data = exception_data.rel
 
-                                for ci, condition in enumerate(exception_rel_condition_data):
-                                    crx, cry, cod, cor = condition
+                                    for ci, condition in enumerate(exception_rel_condition_data):
+                                        crx, cry, cod, cor = condition
 
-                                    try:
-                                        if hold_except_rel[str(dix + crx) + ':' + str(diy + cry)]:
-                                            pass
-                                    except KeyError:
-                                        hold_except_rel[str(dix + crx) + ':' + str(diy + cry)] = []
+                                        try:
+                                            if hold_except_rel[str(dix + crx) + ':' + str(diy + cry)]:
+                                                pass
+                                        except KeyError:
+                                            hold_except_rel[str(dix + crx) + ':' + str(diy + cry)] = []
 
-                                    try:
-                                        if predict_state.input_2D[dix + crx][diy + cry] == cod:
-                                            heapq.heappush(hold_except_rel[str(dix + crx) + ':' + str(diy + cry)], -1)
-                                        else:
-                                            if cod != 0 and predict_state.input_2D[dix + crx][diy + cry] != 0:
-                                                if cod < predict_state.input_2D[dix + crx][diy + cry]:
-                                                    heapq.heappush(hold_except_rel[str(dix + crx) + ':' + str(diy + cry)], -(cod / predict_state.input_2D[dix + crx][diy + cry]))
+                                        try:
+                                            if predict_state.input_2D[dix + crx][diy + cry] == cod:
+                                                heapq.heappush(hold_except_rel[str(dix + crx) + ':' + str(diy + cry)], -1)
+                                            else:
+                                                if cod != 0 and predict_state.input_2D[dix + crx][diy + cry] != 0:
+                                                    if cod < predict_state.input_2D[dix + crx][diy + cry]:
+                                                        heapq.heappush(hold_except_rel[str(dix + crx) + ':' + str(diy + cry)], -(cod / predict_state.input_2D[dix + crx][diy + cry]))
+                                                    else:
+                                                        heapq.heappush(hold_except_rel[str(dix + crx) + ':' + str(diy + cry)], -(predict_state.input_2D[dix + crx][diy + cry] / cod))
                                                 else:
-                                                    heapq.heappush(hold_except_rel[str(dix + crx) + ':' + str(diy + cry)], -(predict_state.input_2D[dix + crx][diy + cry] / cod))
+                                                    heapq.heappush(hold_except_rel[str(dix + crx) + ':' + str(diy + cry)], 0)
+                                        except IndexError:
+                                            heapq.heappush(hold_except_rel[str(dix + crx) + ':' + str(diy + cry)], 0)
+
+                                    for key in hold_except_rel.keys():
+                                        if -(hold_except_rel[key][0]) != 1:
+                                            exception_match += -(hold_except_rel[key][0])
+                                            if hold_except_rel[key][0] != 0:
+                                                exception_uncertainty += -(hold_except_rel[key][0])
                                             else:
-                                                heapq.heappush(hold_except_rel[str(dix + crx) + ':' + str(diy + cry)], 0)
-                                    except IndexError:
-                                        heapq.heappush(hold_except_rel[str(dix + crx) + ':' + str(diy + cry)], 0)
-
-                                for key in hold_except_rel.keys():
-                                    if -(hold_except_rel[key][0]) != 1:
-                                        exception_match += -(hold_except_rel[key][0])
-                                        if hold_except_rel[key][0] != 0:
-                                            exception_uncertainty += -(hold_except_rel[key][0])
+                                                exception_uncertainty += 1
                                         else:
-                                            exception_uncertainty += 1
-                                    else:
-                                        exception_match += 1
-                                    exception_match_count += 1
-                                    if self.debug: print('ex hold_rel', exception_match, exception_match_count)
-
-                                try:
-                                    rule_1d_data = self.knowledge['1d/' + rule]
-                                    for di in rule_1d_data:
-                                        di_heap = []
-                                        condition_group_1d = self.knowledge['1d/' + str(di) + '/' + str(rule)]
-                                        oval_data = self.knowledge['1d/' + str(di) + '/' + str(condition_group_1d) + '/exceptions/' + str(exception_group) + '/oval']
-                                        oval = predict_state.input_1D[di]
-                                        try:
-                                            check = oval_data[oval]
                                             exception_match += 1
-                                            exception_match_count += 1
-                                            if self.debug: print('ex 1d found', exception_match, exception_match_count)
-                                        except KeyError:
-                                            for key in oval_data.keys():
-                                                if key != 0 and oval != 0:
-                                                    if key > 0 and oval > 0:
-                                                        if key < oval:
-                                                            heapq.heappush(di_heap, (-(key / oval), key))
-                                                        else:
-                                                            heapq.heappush(di_heap, (-(oval / key), key))
-                                                    elif key < 0 and oval < 0:
-                                                        if key > oval:
-                                                            heapq.heappush(di_heap, (-(-key / -oval), key))
+                                        exception_match_count += 1
+                                        if self.debug: print('ex hold_rel', exception_match, exception_match_count)
+
+                                    try:
+                                        rule_1d_data = group_data.dims_1d or ()
+                                        for di in rule_1d_data:
+                                            di_heap = []
+                                            group_1d = group_data.rules_1d[di]
+                                            oval_data = group_1d.exception_oval[exception_group]
+                                            oval = predict_state.input_1D[di]
+                                            try:
+                                                check = oval_data[oval]
+                                                exception_match += 1
+                                                exception_match_count += 1
+                                                if self.debug: print('ex 1d found', exception_match, exception_match_count)
+                                            except KeyError:
+                                                for key in oval_data.keys():
+                                                    if key != 0 and oval != 0:
+                                                        if key > 0 and oval > 0:
+                                                            if key < oval:
+                                                                heapq.heappush(di_heap, (-(key / oval), key))
+                                                            else:
+                                                                heapq.heappush(di_heap, (-(oval / key), key))
+                                                        elif key < 0 and oval < 0:
+                                                            if key > oval:
+                                                                heapq.heappush(di_heap, (-(-key / -oval), key))
+                                                            else:
+                                                                heapq.heappush(di_heap, (-(-oval / -key), key))
                                                         else:
-                                                            heapq.heappush(di_heap, (-(-oval / -key), key))
+                                                            if oval < 0:
+                                                                hold_val = -oval + key
+                                                                heapq.heappush(di_heap, (-(key / hold_val), key))
+                                                            else:
+                                                                hold_val = -key + oval
+                                                                heapq.heappush(di_heap, (-(oval / hold_val), key))
                                                     else:
-                                                        if oval < 0:
-                                                            hold_val = -oval + key
-                                                            heapq.heappush(di_heap, (-(key / hold_val), key))
-                                                        else:
-                                                            hold_val = -key + oval
-                                                            heapq.heappush(di_heap, (-(oval / hold_val), key))
-                                                else:
-                                                    heapq.heappush(di_heap, (0, key))
+                                                        heapq.heappush(di_heap, (0, key))
 
-                                            if di_heap:
-                                                if -(di_heap[0][0]) != 1:
-                                                    exception_match += -(di_heap[0][0])
-                                                    if di_heap[0][0] != 0:
-                                                        exception_uncertainty += -(di_heap[0][0])
+                                                if di_heap:
+                                                    if -(di_heap[0][0]) != 1:
+                                                        exception_match += -(di_heap[0][0])
+                                                        if di_heap[0][0] != 0:
+                                                            exception_uncertainty += -(di_heap[0][0])
+                                                        else:
+                                                            exception_uncertainty += 1
                                                     else:
-                                                        exception_uncertainty += 1
-                                                else:
-                                                    exception_match += 1
-                                                exception_match_count += 1
-                                                if self.debug: print('ex 1d other', di_heap[0][1], exception_match, exception_match_count, 'oval data', self.knowledge['1d/' + str(di) + '/' + str(condition_group_1d) + '/exceptions/' + str(exception_group) + '/oval'])
+                                                        exception_match += 1
+                                                    exception_match_count += 1
+                                                    if self.debug: print('ex 1d other', di_heap[0][1], exception_match, exception_match_count, 'oval data', oval_data)
 
-                                except KeyError:
-                                    pass
+                                    except KeyError:
+                                        pass
 
-                                if self.debug: print('Exception Data: ', rule, exception_group, -(exception_match / exception_match_count))
-                                heapq.heappush(exception_heap, (-(exception_match / exception_match_count), rule, condition_group, exception_group, str(dix) + ':' + str(diy), exception_uncertainty, predict_rule_1d, dix, diy, val))
+                                    if self.debug: print('Exception Data: ', rule, exception_group, -(exception_match / exception_match_count))
+                                    heapq.heappush(exception_heap, (-(exception_match / exception_match_count), rule, condition_group, exception_group, str(dix) + ':' + str(diy), exception_uncertainty, predict_rule_1d, dix, diy, val))
 
-                        if exception_heap:
-                            heapq.heappush(predict_heap_2d, (-(match / match_count), rule, condition_group, change_type, abs_pos, str(dix) + ':' + str(diy), uncertainty, predict_rule_1d, dix, diy, exception_heap[0], val))
-                        elif change_type[1] == 0:
-                            heapq.heappush(predict_heap_2d, (-(match / match_count), rule, condition_group, change_type, abs_pos, str(dix) + ':' + str(diy), uncertainty, predict_rule_1d, dix, diy, [0], val))
-                        else:
-                            heapq.heappush(predict_heap_2d, (-(match / match_count), rule, condition_group, change_type, abs_pos, str(dix) + ':' + str(diy), uncertainty, predict_rule_1d, dix, diy, [1], val))
-                        if self.debug: print('Rule ID', rule)
-                        try:
-                            if self.debug: print('exception match', exception_heap[0][0], str(dix) + ':' + str(diy))
-                        except IndexError:
-                            if self.debug: print('exception match', 'NONE', str(dix) + ':' + str(diy))
-                        if self.debug: print('prediction match', -(match / match_count), str(dix) + ':' + str(diy))
+                            if exception_heap:
+                                heapq.heappush(predict_heap_2d, (-(match / match_count), rule, condition_group, change_type, abs_pos, str(dix) + ':' + str(diy), uncertainty, predict_rule_1d, dix, diy, exception_heap[0], val))
+                            elif change_type[1] == 0:
+                                heapq.heappush(predict_heap_2d, (-(match / match_count), rule, condition_group, change_type, abs_pos, str(dix) + ':' + str(diy), uncertainty, predict_rule_1d, dix, diy, [0], val))
+                            else:
+                                heapq.heappush(predict_heap_2d, (-(match / match_count), rule, condition_group, change_type, abs_pos, str(dix) + ':' + str(diy), uncertainty, predict_rule_1d, dix, diy, [1], val))
+                            if self.debug: print('Rule ID', rule)
+                            try:
+                                if self.debug: print('exception match', exception_heap[0][0], str(dix) + ':' + str(diy))
+                            except IndexError:
+                                if self.debug: print('exception match', 'NONE', str(dix) + ':' + str(diy))
+                            if self.debug: print('prediction match', -(match / match_count), str(dix) + ':' + str(diy))
 
                     if not predict_heap_2d:
                         if self.debug: print('no applicable rules found')
@@ -998,7 +1275,7 @@ class AIRIS(object):
                             predict_rule_2d[str(dix) + ':' + str(diy)] = best_result_2d[0]
                         if self.debug: print('check_pos check', (dix, diy) in orig_pos, best_result_2d[0][2], best_result_2d[0][10][0])
                         if (dix, diy) in orig_pos and best_result_2d[0][2] is not None and best_result_2d[0][10][0] != 0:
-                            rel_set_data = self.knowledge['2d/' + str(val) + '/' + str(best_result_2d[0][2]) + '/inclusions/rel_set']
+                            rel_set_data = self.knowledge.group(val, best_result_2d[0][2]).inclusion_set
                             for cond in rel_set_data:
                                 crx, cry, cod, cor = cond
                                 if (dix + crx, diy + cry) not in check_set:
@@ -1037,7 +1314,7 @@ class AIRIS(object):
 
             if predict_rule_2d[loc_key][3] is not None:
                 if predict_rule_2d[loc_key][3][0] == 'rel':
-                    predict_state.input_2D[loc_x][loc_y] += predict_rule_2d[loc_key][3][1]
+                    predict_state.set_2d(loc_x, loc_y, predict_state.input_2D[loc_x][loc_y] + predict_rule_2d[loc_key][3][1])
 
             predict_state.applied_rules[loc_key] = predict_rule_2d[loc_key]
             if predict_rule_2d[loc_key][1] != 'None' and predict_rule_2d[loc_key][3] is not None and predict_rule_2d[loc_key][10][0] != 0:
@@ -1048,7 +1325,7 @@ class AIRIS(object):
             if predict_rule_2d[loc_key][3] is not None:
                 if not used_rules_1d and predict_rule_2d[loc_key][1] != 'None':
                     used_rules_1d.add(predict_rule_2d[loc_key][1])
-                    for mrule in self.knowledge['2d/' + str(predict_rule_2d[loc_key][11]) + '/' + str(predict_rule_2d[loc_key][2]) + '/mrules'].keys():
+                    for mrule in self.knowledge.group(predict_rule_2d[loc_key][11], predict_rule_2d[loc_key][2]).mrules.keys():
                         mrules_1d.add(mrule)
                     predict_1d = predict_rule_2d[loc_key][7]
                     if self.debug: print('applied 1d rule', predict_rule_2d[loc_key][1])
@@ -1077,7 +1354,7 @@ class AIRIS(object):
                                         predict_state.anti_goal = True
                             except IndexError:
                                 pass
-                    for mrule in self.knowledge['2d/' + str(predict_rule_2d[loc_key][11]) + '/' + str(predict_rule_2d[loc_key][2]) + '/mrules'].keys():
+                    for mrule in self.knowledge.group(predict_rule_2d[loc_key][11], predict_rule_2d[loc_key][2]).mrules.keys():
                         mrules_1d.add(mrule)
 
         if self.debug: print('final used rules 1d', used_rules_1d)
@@ -1088,10 +1365,8 @@ class AIRIS(object):
             predict_state.applied_exceptions[loc_key] = exceptions[loc_key]
             predict_state.applied_exception_ids.add(exceptions[loc_key][3])
 
-        predict_state.heap()
-
-        with open('./predict_log/' + str(self.time_step) + '.txt', 'a') as f:
-            f.write(str(predict_state.input_2D) + '\n')
+        if self.predict_log is not None:
+            self.predict_log.write(self.time_step, predict_state.input_2D)
 
         if self.debug: print('Predict state', len(self.states), act, predict_state.input_1D, 'prev state', predict_state.prev_state, predict_state.prev_action, predict_state.anti_goal, predict_state.bad_rules, '+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++')
         if self.debug:
@@ -1128,137 +1403,93 @@ class AIRIS(object):
 
         return predict_state, predict_rule_2d, predict_rule_1d, uncertainty, exception_uncertainty, exceptions, no_rule_found
 
+    # The (rule, val, inclusions, action) entries compare scores the states by for a given goal, in the order it
+    # scores them. Compiled once per goal and again only when a rule with conditions on one of the goal 1D
+    # indices was created or changed since
+    def goal_table(self, given_goal):
+        key = str(given_goal)
+        versions = tuple(self.knowledge.versions_1d.get(goal_data[0], 0) for goal_data in (given_goal[0] or ()))
+        try:
+            compiled = self.goal_tables[key]
+            if compiled[0] == versions:
+                return compiled[1]
+        except KeyError:
+            pass
+
+        table = []
+        rule_list = []
+        check_rules = []
+        action = None
+        for gi, goal in enumerate(given_goal):
+            if goal:
+                for goal_data in goal:
+                    if gi == 0:
+                        try:
+                            check_rules = self.knowledge.groups_1d[goal_data[0]]
+                        except KeyError:
+                            if self.debug: print('compare passing ', '1d/' + str(goal_data[0]))
+                            pass
+                        if goal_data[1] == '+' or goal_data[1] == '-':
+                            for group_1d in check_rules:
+                                change_heap = []
+                                rel_data = group_1d.rel
+
+                                for rel_key in rel_data.keys():
+                                    heapq.heappush(change_heap, (-(rel_data[rel_key][0] / rel_data[rel_key][1]), 'rel', rel_key, group_1d.rule_id))
+
+                                if change_heap:
+                                    if change_heap[0][1] == 'rel':
+                                        if (goal_data[1] == '+' and change_heap[0][2] > 0) or (goal_data[1] == '-' and change_heap[0][2] < 0):
+                                            rule_list.append(change_heap[0][3])
+
+                            if self.debug: print('Compare rule list', rule_list)
+
+                            for rule in rule_list:
+                                group_data = self.knowledge.rules[rule]
+                                for act in group_data.act.keys():
+                                    action = act
+                                table.append((rule, group_data.val, group_data.inclusions, action))
+
+        self.goal_tables[key] = (versions, table)
+        return table
+
     def compare(self, compare_state, given_goal, generated, state_num):
         rule_heap = []
-        rule_list = []
-        change_heap = []
         best_action = None
-        check_rules = []
         if given_goal and not generated:
-            for gi, goal in enumerate(given_goal):
-                if goal:
-                    for goal_data in goal:
-                        if gi == 0:
-                            try:
-                                check_rules = self.knowledge['1d/' + str(goal_data[0])]
-                            except KeyError:
-                                if self.debug: print('compare passing ', '1d/' + str(goal_data[0]))
-                                pass
-                            if goal_data[1] == '+':
-                                for rule in check_rules:
-                                    rule_cond_id = self.knowledge['1d/' + str(goal_data[0]) + '/' + rule]
-                                    change_heap = []
-                                    rel_data = self.knowledge['1d/' + str(goal_data[0]) + '/' + str(rule_cond_id) + '/rel']
-
-                                    for key in rel_data.keys():
-                                        heapq.heappush(change_heap, (-(rel_data[key][0] / rel_data[key][1]), 'rel', key, rule))
-
-                                    if change_heap:
-                                        if change_heap[0][1] == 'rel':
-                                            if change_heap[0][2] > 0:
-                                                rule_list.append(change_heap[0][3])
-
-                                if self.debug: print('Compare rule list', rule_list)
-
-                                for rule in rule_list:
-                                    val = self.knowledge['2d/' + rule]
-                                    if val in compare_state.input_2D_idx.keys():
-                                        rule_2d_cond_id = self.knowledge['2d/' + str(val) + '/' + rule]
-                                        rel_condition_data = self.knowledge['2d/' + str(val) + '/' + str(rule_2d_cond_id) + '/inclusions/rel']
-                                        for key in self.knowledge['2d/' + str(val) + '/' + str(rule_2d_cond_id) + '/act'].keys():
-                                            action = key
-                                        exception_groups = []
-
-                                        for pos in compare_state.input_2D_idx[val]:
-                                            diff = 0
-                                            try:
-                                                for ci, condition in enumerate(rel_condition_data):
-                                                    crx, cry, cod, cor = condition
-                                                    if compare_state.input_2D[pos[0] + crx][pos[1] + cry] == cod:
-                                                        pass
-                                            except IndexError:
-                                                if self.debug: print('Index Error, continuing')
-                                                continue
-
-                                            if self.debug: print('Compare rel_condition_data', rel_condition_data, rule, val)
-                                            for ci, condition in enumerate(rel_condition_data):
-                                                rel_diff_heap = []
-                                                crx, cry, cod, cor = condition
-
-                                                if self.debug: print('Compare cod', cod)
-                                                if cod in compare_state.input_2D_idx.keys():
-                                                    if self.debug: print('Compare cod found')
-                                                    for rel_pos in compare_state.input_2D_idx[cod]:
-                                                        if self.debug: print('Compare rel_pos', rel_pos, pos, crx, cry, abs(rel_pos[0] - (pos[0] + crx)), abs(rel_pos[1] - (pos[1] + cry)))
-                                                        heapq.heappush(rel_diff_heap, abs(rel_pos[0] - (pos[0] + crx)) + abs(rel_pos[1] - (pos[1] + cry)))
-                                                    if self.debug: print('Compare rel_diff_heap')
-                                                    diff += rel_diff_heap[0]
-                                                else:
-                                                    diff += 1
-                                            if self.debug: print('Compare debug ', val, diff, rule, (pos[0], pos[1]), rel_condition_data)
-                                            heapq.heappush(rule_heap, (diff, rule, action))
-
-                            if goal_data[1] == '-':
-                                for rule in check_rules:
-                                    rule_cond_id = self.knowledge['1d/' + str(goal_data[0]) + '/' + rule]
-                                    change_heap = []
-                                    rel_data = self.knowledge['1d/' + str(goal_data[0]) + '/' + str(rule_cond_id) + '/rel']
-
-                                    for key in rel_data.keys():
-                                        heapq.heappush(change_heap, (-(rel_data[key][0] / rel_data[key][1]), 'rel', key, rule))
-
-                                    if change_heap:
-                                        if change_heap[0][1] == 'rel':
-                                            if change_heap[0][2] < 0:
-                                                rule_list.append(change_heap[0][3])
-
-                                if self.debug: print('Compare rule list', rule_list)
-
-                                for rule in rule_list:
-                                    val = self.knowledge['2d/' + rule]
-                                    if val in compare_state.input_2D_idx.keys():
-                                        rule_2d_cond_id = self.knowledge['2d/' + str(val) + '/' + rule]
-                                        rel_condition_data = self.knowledge['2d/' + str(val) + '/' + str(rule_2d_cond_id) + '/inclusions/rel']
-                                        for key in self.knowledge['2d/' + str(val) + '/' + str(rule_2d_cond_id) + '/act'].keys():
-                                            action = key
-                                        exception_groups = []
-
-                                        for pos in compare_state.input_2D_idx[val]:
-                                            diff = 0
-                                            try:
-                                                for ci, condition in enumerate(rel_condition_data):
-                                                    crx, cry, cod, cor = condition
-                                                    if compare_state.input_2D[pos[0] + crx][pos[1] + cry] == cod:
-                                                        pass
-                                            except IndexError:
-                                                if self.debug: print('Index Error, continuing')
-                                                continue
-
-                                            if self.debug: print('Compare rel_condition_data', rel_condition_data, rule, val)
-                                            for ci, condition in enumerate(rel_condition_data):
-                                                rel_diff_heap = []
-                                                crx, cry, cod, cor = condition
-
-                                                if self.debug: print('Compare cod', cod)
-                                                if cod in compare_state.input_2D_idx.keys():
-                                                    if self.debug: print('Compare cod found')
-                                                    for rel_pos in compare_state.input_2D_idx[cod]:
-                                                        if self.debug: print('Compare rel_pos', rel_pos, pos, crx, cry, abs(rel_pos[0] - (pos[0] + crx)), abs(rel_pos[1] - (pos[1] + cry)))
-                                                        heapq.heappush(rel_diff_heap, abs(rel_pos[0] - (pos[0] + crx)) + abs(rel_pos[1] - (pos[1] + cry)))
-                                                    if self.debug: print('Compare rel_diff_heap')
-                                                    diff += rel_diff_heap[0]
-                                                else:
-                                                    diff += 1
-                                            if self.debug: print('Compare debug ', val, diff, rule, (pos[0], pos[1]), rel_condition_data)
-                                            heapq.heappush(rule_heap, (diff, rule, action))
+            for rule, val, rel_condition_data, action in self.goal_table(given_goal):
+                if val in compare_state.input_2D_idx.keys():
+                    for pos in compare_state.input_2D_idx[val]:
+                        diff = 0
+                        try:
+                            for ci, condition in enumerate(rel_condition_data):
+                                crx, cry, cod, cor = condition
+                                if compare_state.input_2D[pos[0] + crx][pos[1] + cry] == cod:
+                                    pass
+                        except IndexError:
+                            if self.debug: print('Index Error, continuing')
+                            continue
+
+                        if self.debug: print('Compare rel_condition_data', rel_condition_data, rule, val)
+                        for ci, condition in enumerate(rel_condition_data):
+                            crx, cry, cod, cor = condition
+
+                            if self.debug: print('Compare cod', cod)
+                            if cod in compare_state.input_2D_idx.keys():
+                                rel_diff = compare_state.distance(cod, pos[0] + crx, pos[1] + cry)
+                                if self.debug: print('Compare cod found', pos, crx, cry, rel_diff)
+                                diff += rel_diff
+                            else:
+                                diff += 1
+                        if self.debug: print('Compare debug ', val, diff, rule, (pos[0], pos[1]), rel_condition_data)
+                        heapq.heappush(rule_heap, (diff, rule, action))
 
         if generated:
             diff = None
             for pos in compare_state.input_2D_idx[given_goal[1]]:
-                check_pos = [pos[0] + given_goal[2][0], pos[1] + given_goal[2][1]]
-                for pos_idx in compare_state.input_2D_idx[given_goal[2][2]]:
-                    if diff is None or (abs(pos_idx[0] - check_pos[0]) + abs(pos_idx[1] - check_pos[1])) < diff:
-                        diff = abs(pos_idx[0] - check_pos[0]) + abs(pos_idx[1] - check_pos[1])
+                pos_diff = compare_state.distance(given_goal[2][2], pos[0] + given_goal[2][0], pos[1] + given_goal[2][1])
+                if pos_diff is not None and (diff is None or pos_diff < diff):
+                    diff = pos_diff
 
         if rule_heap:
             if self.debug: print('Compare diff:', generated, rule_heap[0][0], rule_heap[0][1], state_num, rule_heap)
@@ -1277,33 +1508,30 @@ class AIRIS(object):
         else:
             return diff, best_action, False
 
-    def create_rule(self, act, dix, diy, oval, rval, aval, rule_id, state, prev_state, prev_1d, post_1d, prev_2d, post_2d, step):
+    def create_rule(self, act, dix, diy, oval, rval, aval, state, prev_state, prev_1d, post_1d, prev_2d, post_2d, step):
         is_dupe = False
         new_rule = 'ERROR'
-        hold_rules = []
-        try:
-            hold_rules = self.knowledge['2d/' + str(oval)]
-        except KeyError:
-            pass
+        hold_rules = self.knowledge.candidates(oval, act, rval)
 
-        for rule_group, r_id in enumerate(hold_rules):
+        for group_data in hold_rules:
+            r_id = group_data.id
             dupe_act = False
             dupe_1d = True
             dupe_1d_rel = True
             dupe_rel = False
             dupe_inc = False
             if self.debug: print('checking rule ', r_id)
-            if self.knowledge['2d/' + str(oval) + '/' + str(rule_group) + '/combined']:
+            if group_data.combined:
                 if self.debug: print('rule is combined, skipping')
                 continue
 
-            if act in self.knowledge['2d/' + str(oval) + '/' + str(rule_group) + '/act'].keys():
+            if act in group_data.act:
                 dupe_act = True
             else:
                 if self.debug: print('rule is not for this action, skipping')
                 continue
-            if self.debug: print('checking rval', rval, self.knowledge['2d/' + str(oval) + '/' + str(rule_group) + '/rel'].keys())
-            if rval in self.knowledge['2d/' + str(oval) + '/' + str(rule_group) + '/rel'].keys():
+            if self.debug: print('checking rval', rval, group_data.rel.keys())
+            if rval in group_data.rel:
                 dupe_rel = True
             else:
                 if self.debug: print('rule does not have the same rval, skipping')
@@ -1311,25 +1539,14 @@ class AIRIS(object):
 
             if rval != 0:
                 rel_count = 0
-                rel_total = 0
-                rel_set = set()
-                for rel_data in self.knowledge['2d/' + str(oval) + '/' + str(rule_group) + '/inclusions/rel']:
-                    rox = rel_data[0]
-                    roy = rel_data[1]
-                    try:
-                        if self.debug: print('checking inclusion', rox, roy, dix, diy, dix + rox, diy + roy, self.input_2D[dix + rox][diy + roy], rel_data[2])
-                    except IndexError:
-                        if self.debug: print('checking inclusion index error')
-                    if (rox, roy) not in rel_set:
-                        rel_total += 1
-                        rel_set.add((rox, roy))
-
+                rel_total, signature = group_data.signature()
+                for rox, roy, rod in signature:
                     try:
-                        if self.input_2D[dix + rox][diy + roy] == rel_data[2]:
+                        if self.input_2D[dix + rox][diy + roy] == rod:
                             rel_count += 1
                     except IndexError:
-                        pass
-                    if self.debug: print('rel_count', rel_count, 'rel_total', rel_total)
+                        if self.debug: print('checking inclusion index error', rox, roy, dix, diy)
+                if self.debug: print('rel_count', rel_count, 'rel_total', rel_total, signature)
 
                 if rel_count == rel_total:
                     dupe_inc = True
@@ -1341,12 +1558,11 @@ class AIRIS(object):
                 total_1d = 0
                 for di, val in enumerate(self.input_1D):
                     try:
-                        di_group = self.knowledge['1d/' + str(di) + '/' + str(r_id)]
-                        found = self.knowledge['1d/' + str(di) + '/' + str(di_group) + '/oval']
+                        group_1d = group_data.rules_1d[di]
                         total_1d += 1
                         try:
-                            found = self.knowledge['1d/' + str(di) + '/' + str(di_group) + '/oval'][val]
-                            if self.knowledge['1d/' + str(di) + '/' + str(di_group) + '/rel'][post_1d[di] - val]:
+                            found = group_1d.oval[val]
+                            if group_1d.rel[post_1d[di] - val]:
                                 count_1d += 1
                         except KeyError:
                             dupe_1d = False
@@ -1362,12 +1578,11 @@ class AIRIS(object):
                     total_1d = 0
                     for di, val in enumerate(self.input_1D):
                         try:
-                            di_group = self.knowledge['1d/' + str(di) + '/' + str(r_id)]
-                            if self.debug: print('1d/' + str(di) + '/' + str(di_group) + '/rel', self.knowledge['1d/' + str(di) + '/' + str(di_group) + '/rel'], post_1d[di], val)
-                            found = self.knowledge['1d/' + str(di) + '/' + str(di_group) + '/rel']
+                            group_1d = group_data.rules_1d[di]
+                            if self.debug: print('1d/' + str(di) + '/' + str(group_1d.index) + '/rel', group_1d.rel, post_1d[di], val)
                             total_1d += 1
                             try:
-                                found = self.knowledge['1d/' + str(di) + '/' + str(di_group) + '/rel'][post_1d[di] - val]
+                                found = group_1d.rel[post_1d[di] - val]
                                 count_1d += 1
                             except KeyError:
                                 pass
@@ -1383,11 +1598,12 @@ class AIRIS(object):
                         dupe_1d = True
                         if dupe_act and dupe_1d and dupe_inc and dupe_rel:
                             for di, val in enumerate(self.input_1D):
-                                di_group = self.knowledge['1d/' + str(di) + '/' + str(r_id)]
+                                group_1d = group_data.rules_1d[di]
                                 try:
-                                    found = self.knowledge['1d/' + str(di) + '/' + str(di_group) + '/oval'][val]
+                                    found = group_1d.oval[val]
                                 except KeyError:
-                                    self.knowledge['1d/' + str(di) + '/' + str(di_group) + '/oval'] = dict()
+                                    group_1d.oval = dict()
+                                    self.knowledge.touch(*group_data.handle())
 
                 if dupe_act and dupe_1d and dupe_inc and dupe_rel:
                     if self.debug: print('setting is_dupe to true')
@@ -1399,14 +1615,14 @@ class AIRIS(object):
             if self.debug: print('all checks for r_id', r_id, dupe_act, dupe_1d, dupe_inc, dupe_rel, dupe_1d_rel, is_dupe)
 
             if is_dupe:
+                self.knowledge.touch(*group_data.handle())
                 try:
-                    data = self.knowledge['2d/' + str(oval) + '/' + str(rule_group) + '/apos'][str(dix) + ':' + str(diy)]
+                    data = group_data.apos[str(dix) + ':' + str(diy)]
                     data[0] += 1
                     data[1] += 1
-                    self.knowledge['2d/' + str(oval) + '/' + str(rule_group) + '/apos'][str(dix) + ':' + str(diy)] = data
                 except KeyError:
                     if self.debug: print('clearing apos from rule', r_id)
-                    self.knowledge['2d/' + str(oval) + '/' + str(rule_group) + '/apos'] = {}
+                    group_data.apos = {}
 
                 for loc_key in self.states[state].applied_rules.keys():
                     key = loc_key.split(':')
@@ -1418,44 +1634,33 @@ class AIRIS(object):
                         cond_group = self.states[state].applied_rules[loc_key][2]
                         check_val = self.states[state].applied_rules[loc_key][11]
                         if self.debug: print('Applied rules at loc ', loc_key, self.states[state].applied_rules[loc_key])
-                        if self.input_2D[loc_x][loc_y] == check_val and post_2d[loc_x][loc_y] - check_val in self.knowledge['2d/' + str(check_val) + '/' + str(cond_group) + '/rel'].keys():
-                            self.knowledge['2d/' + str(oval) + '/' + str(rule_group) + '/mrules'][check_rule] = [1, 1]
+                        if self.input_2D[loc_x][loc_y] == check_val and post_2d[loc_x][loc_y] - check_val in self.knowledge.group(check_val, cond_group).rel:
+                            group_data.mrules[check_rule] = [1, 1]
 
                 new_rule = r_id
                 break
 
         if not is_dupe:
             starttime = time.time()
+            rule_id = self.knowledge.new_rule_id()
             new_rule = rule_id
 
-            self.knowledge['plan_depth'] = self.plan_depth
-
-            try:
-                self.knowledge[act].append(rule_id)
-            except KeyError:
-                self.knowledge[act] = [rule_id]
+            self.knowledge.plan_depth = self.plan_depth
 
-            try:
-                self.knowledge['2d/' + str(oval)].append(rule_id)
-            except KeyError:
-                self.knowledge['2d/' + str(oval)] = [rule_id]
-
-            rule_num = str(len(self.knowledge['2d/' + str(oval)]) - 1)
-
-            self.knowledge['2d/' + str(oval) + '/' + rule_num + '/act'] = {act: [1, 1]}
-            self.knowledge['2d/' + str(oval) + '/' + rule_num + '/rel'] = {rval: [1, 1]}
-            self.knowledge['2d/' + str(oval) + '/' + rule_num + '/abs'] = {aval: [1, 1]}
-            self.knowledge['2d/' + str(oval) + '/' + rule_num + '/apos'] = {str(dix) + ':' + str(diy): [1, 1]}
-            self.knowledge['2d/' + str(oval) + '/' + rule_num + '/oraw'] = [self.input_1D, self.input_2D]
-            self.knowledge['2d/' + str(oval) + '/' + rule_num + '/lraw'] = [self.input_1D, self.input_2D]
-            self.knowledge['2d/' + str(oval) + '/' + rule_num + '/id'] = rule_id
-            self.knowledge['2d/' + str(oval) + '/' + rule_num + '/lstep'] = step
-            self.knowledge['2d/' + str(oval) + '/' + rule_num + '/rstep'] = {}
-            self.knowledge['2d/' + str(oval) + '/' + rule_num + '/combined'] = False
-            self.knowledge['2d/' + str(oval) + '/' + str(rule_id)] = len(self.knowledge['2d/' + str(oval)]) - 1
+            group_data = self.knowledge.add_rule(rule_id, act, oval)
+            group_data.act = {act: [1, 1]}
+            group_data.rel = {rval: [1, 1]}
+            group_data.abs = {aval: [1, 1]}
+            self.knowledge.index_rule(group_data)
+            group_data.apos = {str(dix) + ':' + str(diy): [1, 1]}
+            group_data.oraw = self.knowledge.snapshot([self.input_1D, self.input_2D])
+            group_data.lraw = group_data.oraw
+            group_data.lstep = step
+            group_data.rstep = {}
+            group_data.combined = False
 
             if rval != 0:
-                self.knowledge['2d/' + str(oval) + '/' + rule_num + '/mrules'] = dict()
+                group_data.mrules = dict()
                 for loc_key in self.states[state].applied_rules.keys():
                     key = loc_key.split(':')
                     loc_x = int(key[0])
@@ -1466,8 +1671,8 @@ class AIRIS(object):
                         cond_group = self.states[state].applied_rules[loc_key][2]
                         check_val = self.states[state].applied_rules[loc_key][11]
                         if self.debug: print('Applied rules at loc ', loc_key, self.states[state].applied_rules[loc_key])
-                        if self.input_2D[loc_x][loc_y] == check_val and post_2d[loc_x][loc_y] - check_val in self.knowledge['2d/' + str(check_val) + '/' + str(cond_group) + '/rel'].keys():
-                            self.knowledge['2d/' + str(oval) + '/' + rule_num + '/mrules'][check_rule] = [1, 1]
+                        if self.input_2D[loc_x][loc_y] == check_val and post_2d[loc_x][loc_y] - check_val in self.knowledge.group(check_val, cond_group).rel:
+                            group_data.mrules[check_rule] = [1, 1]
 
                 if self.debug: print('new rule position ', dix, diy)
                 for loc_key in self.states[state].applied_rules.keys():
@@ -1481,15 +1686,13 @@ class AIRIS(object):
                         check_val = self.states[state].applied_rules[loc_key][11]
                         if self.debug: print('Applied rules at loc ', loc_key, self.states[state].applied_rules[loc_key])
                         if self.debug: print('Adding inclusions from rule ' + str(check_rule), 'val: ' + str(check_val), 'cond_group: ' + str(cond_group))
-                        for check_rel in self.knowledge['2d/' + str(check_val) + '/' + str(cond_group) + '/inclusions/rel_set']:
+                        for check_rel in self.knowledge.group(check_val, cond_group).inclusion_set:
                             if (loc_x + check_rel[0]) - dix != 0 or (loc_y + check_rel[1]) - diy != 0:
                                 try:
-                                    if ((loc_x + check_rel[0]) - dix, (loc_y + check_rel[1]) - diy, self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])], post_2d[(loc_x + check_rel[0])][(loc_y + check_rel[1])] - self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])]) not in self.knowledge['2d/' + str(oval) + '/' + rule_num + '/inclusions/rel']:
-                                        self.knowledge['2d/' + str(oval) + '/' + rule_num + '/inclusions/rel'].append(((loc_x + check_rel[0]) - dix, (loc_y + check_rel[1]) - diy, self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])], post_2d[(loc_x + check_rel[0])][(loc_y + check_rel[1])] - self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])]))
+                                    inclusion = ((loc_x + check_rel[0]) - dix, (loc_y + check_rel[1]) - diy, self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])], post_2d[(loc_x + check_rel[0])][(loc_y + check_rel[1])] - self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])])
+                                    if inclusion not in group_data.inclusions:
+                                        group_data.inclusions.append(inclusion)
                                         if self.debug: print('Added loc: ', dix, diy, loc_x, loc_y, check_rel[0], check_rel[1], self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])])
-                                except KeyError:
-                                    self.knowledge['2d/' + str(oval) + '/' + rule_num + '/inclusions/rel'] = [((loc_x + check_rel[0]) - dix, (loc_y + check_rel[1]) - diy, self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])], post_2d[(loc_x + check_rel[0])][(loc_y + check_rel[1])] - self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])])]
-                                    if self.debug: print('Added loc: ', dix, diy, loc_x, loc_y, check_rel[0], check_rel[1], self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])])
                                 except IndexError:
                                     if self.debug: print('Location outside view, skipping')
                             else:
@@ -1506,15 +1709,13 @@ class AIRIS(object):
                     if self.debug: print('Applied exception at loc ', str(loc_x) + ':' + str(loc_y), exception_data)
                     if self.input_2D[loc_x][loc_y] != post_2d[loc_x][loc_y]:
                         if self.debug: print('Adding inclusions from rule exception ' + str(check_rule), 'val: ' + str(check_val), 'cond_group: ' + str(cond_group))
-                        for check_rel in self.knowledge['2d/' + str(check_val) + '/' + str(cond_group) + '/inclusions/rel_set']:
+                        for check_rel in self.knowledge.group(check_val, cond_group).inclusion_set:
                             if (loc_x + check_rel[0]) - dix != 0 or (loc_y + check_rel[1]) - diy != 0:
                                 try:
-                                    if ((loc_x + check_rel[0]) - dix, (loc_y + check_rel[1]) - diy, self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])], post_2d[(loc_x + check_rel[0])][(loc_y + check_rel[1])] - self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])]) not in self.knowledge['2d/' + str(oval) + '/' + rule_num + '/inclusions/rel']:
-                                        self.knowledge['2d/' + str(oval) + '/' + rule_num + '/inclusions/rel'].append(((loc_x + check_rel[0]) - dix, (loc_y + check_rel[1]) - diy, self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])], post_2d[(loc_x + check_rel[0])][(loc_y + check_rel[1])] - self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])]))
+                                    inclusion = ((loc_x + check_rel[0]) - dix, (loc_y + check_rel[1]) - diy, self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])], post_2d[(loc_x + check_rel[0])][(loc_y + check_rel[1])] - self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])])
+                                    if inclusion not in group_data.inclusions:
+                                        group_data.inclusions.append(inclusion)
                                         if self.debug: print('Added loc: ', dix, diy, loc_x, loc_y, check_rel[0], check_rel[1], self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])])
-                                except KeyError:
-                                    self.knowledge['2d/' + str(oval) + '/' + rule_num + '/inclusions/rel'] = [((loc_x + check_rel[0]) - dix, (loc_y + check_rel[1]) - diy, self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])], post_2d[(loc_x + check_rel[0])][(loc_y + check_rel[1])] - self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])])]
-                                    if self.debug: print('Added loc: ', dix, diy, loc_x, loc_y, check_rel[0], check_rel[1], self.input_2D[(loc_x + check_rel[0])][(loc_y + check_rel[1])])
                                 except IndexError:
                                     if self.debug: print('Exception location outside view, skipping')
                             else:
@@ -1522,58 +1723,25 @@ class AIRIS(object):
                     else:
                         if self.debug: print('Skipped adding inclusions from rule exception due to exception success')
 
-                try:
-                    if self.debug: print('pre-added inclusions: ', self.knowledge['2d/' + str(oval) + '/' + rule_num + '/inclusions/rel'])
-                except KeyError:
-                    pass
+                if self.debug: print('pre-added inclusions: ', group_data.inclusions)
                 for cox, coy, cod, cord, coad in self.last_change_2D:
                     if cox != dix or coy != diy:
-                        try:
-                            if (cox - dix, coy - diy, cod, cord) not in self.knowledge['2d/' + str(oval) + '/' + rule_num + '/inclusions/rel']:
-                                self.knowledge['2d/' + str(oval) + '/' + rule_num + '/inclusions/rel'].append((cox - dix, coy - diy, cod, cord))
-                        except KeyError:
-                            self.knowledge['2d/' + str(oval) + '/' + rule_num + '/inclusions/rel'] = [(cox - dix, coy - diy, cod, cord)]
+                        if (cox - dix, coy - diy, cod, cord) not in group_data.inclusions:
+                            group_data.inclusions.append((cox - dix, coy - diy, cod, cord))
 
-                for item in self.knowledge['2d/' + str(oval) + '/' + rule_num + '/inclusions/rel']:
-                    try:
-                        self.knowledge['2d/' + str(oval) + '/' + rule_num + '/inclusions/rel_set'].add(item)
-                    except KeyError:
-                        self.knowledge['2d/' + str(oval) + '/' + rule_num + '/inclusions/rel_set'] = {item}
+                for item in group_data.inclusions:
+                    group_data.inclusion_set.add(item)
             else:
-                self.knowledge['2d/' + str(oval) + '/' + rule_num + '/mrules'] = dict()
-                self.knowledge['2d/' + str(oval) + '/' + rule_num + '/inclusions/rel'] = []
-                self.knowledge['2d/' + str(oval) + '/' + rule_num + '/inclusions/rel_set'] = set()
-
-            try:
-                if oval not in self.knowledge['2d{']:
-                    self.knowledge['2d'].append(oval)
-                    self.knowledge['2d{'].add(oval)
-            except KeyError:
-                self.knowledge['2d'] = [oval]
-                self.knowledge['2d{'] = {oval}
-
-            self.knowledge['2d/' + rule_id] = oval
+                group_data.mrules = dict()
+                group_data.inclusions = []
+                group_data.inclusion_set = set()
 
             if rval != 0:
                 for di, val in enumerate(prev_1d):
-                    try:
-                        if rule_id not in self.knowledge['1d{' + str(di)]:
-                            self.knowledge['1d/' + str(di)].append(rule_id)
-                        self.knowledge['1d{' + str(di)].add(rule_id)
-                    except KeyError:
-                        self.knowledge['1d/' + str(di)] = [rule_id]
-                        self.knowledge['1d{' + str(di)] = {rule_id}
-
-                    rule_num_1d = str(len(self.knowledge['1d/' + str(di)]) - 1)
-                    self.knowledge['1d/' + str(di) + '/' + rule_num_1d + '/oval'] = {val: [1, 1]}
-                    self.knowledge['1d/' + str(di) + '/' + rule_num_1d + '/rel'] = {post_1d[di] - val: [1, 1]}
-                    self.knowledge['1d/' + str(di) + '/' + rule_num_1d + '/abs'] = {post_1d[di]: [1, 1]}
-                    self.knowledge['1d/' + str(di) + '/' + str(rule_id)] = rule_num_1d
-
-                    try:
-                        self.knowledge['1d/' + rule_id].add(di)
-                    except KeyError:
-                        self.knowledge['1d/' + rule_id] = {di}
+                    group_1d = self.knowledge.add_rule_1d(group_data, di)
+                    group_1d.oval = {val: [1, 1]}
+                    group_1d.rel = {post_1d[di] - val: [1, 1]}
+                    group_1d.abs = {post_1d[di]: [1, 1]}
 
             if self.debug: print('================ create condition', dix, diy, 'time:', round(time.time() - starttime, 10), len(self.knowledge), rule_id)
 
@@ -1593,20 +1761,22 @@ class AIRIS(object):
             is_dupe = False
             exception_group = None
             try:
-                for group in self.knowledge['2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions']:
+                group_data = self.knowledge.group(oval, rule_data[2])
+                for group in group_data.exception_candidates(self.last_action, self.input_2D, pos[0], pos[1]):
                     dupe_act = False
                     dupe_1d = True
                     dupe_1d_rel = True
                     dupe_rel = False
+                    exception_data = group_data.exception_groups[group]
 
-                    if self.last_action in self.knowledge['2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions/' + group + '/act'].keys():
+                    if self.last_action in exception_data.act:
                         dupe_act = True
                     else:
                         continue
 
                     rel_count = 0
                     rel_total = 0
-                    for rel_data in self.knowledge['2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions/' + group + '/rel']:
+                    for rel_data in exception_data.rel:
                         rel_total += 1
                         rox = rel_data[0]
                         roy = rel_data[1]
@@ -1627,11 +1797,11 @@ class AIRIS(object):
                     total_1d = 0
                     for di, val in enumerate(self.input_1D):
                         try:
-                            di_group = self.knowledge['1d/' + str(di) + '/' + str(rule_data[1])]
-                            if self.knowledge['1d/' + str(di) + '/' + str(di_group) + '/exceptions/' + group + '/oval']:
+                            group_1d = self.knowledge.rules[rule_data[1]].rules_1d[di]
+                            if group_1d.exception_oval[group]:
                                 total_1d += 1
                                 try:
-                                    found = self.knowledge['1d/' + str(di) + '/' + str(di_group) + '/exceptions/' + group + '/oval'][val]
+                                    found = group_1d.exception_oval[group][val]
                                     count_1d += 1
                                 except KeyError:
                                     dupe_1d = False
@@ -1649,11 +1819,11 @@ class AIRIS(object):
                         total_1d = 0
                         for di, val in enumerate(self.input_1D):
                             try:
-                                di_group = self.knowledge['1d/' + str(di) + '/' + str(rule_data[1])]
-                                if self.knowledge['1d/' + str(di) + '/' + str(di_group) + '/exceptions/' + group + '/rel']:
+                                group_1d = self.knowledge.rules[rule_data[1]].rules_1d[di]
+                                if group_1d.exception_rel[group]:
                                     total_1d += 1
                                     try:
-                                        found = self.knowledge['1d/' + str(di) + '/' + str(di_group) + '/exceptions/' + group + '/rel'][input_1d[di] - val]
+                                        found = group_1d.exception_rel[group][input_1d[di] - val]
                                         count_1d += 1
                                     except KeyError:
                                         pass
@@ -1666,12 +1836,13 @@ class AIRIS(object):
                         if dupe_1d_rel:
                             dupe_1d = True
                             if dupe_act and dupe_rel:
+                                self.knowledge.touch(*group_data.handle())
                                 for di, val in enumerate(self.input_1D):
-                                    di_group = self.knowledge['1d/' + str(di) + '/' + str(rule_data[1])]
+                                    group_1d = self.knowledge.rules[rule_data[1]].rules_1d[di]
                                     try:
-                                        found = self.knowledge['1d/' + str(di) + '/' + str(di_group) + '/exceptions/' + group + '/oval'][val]
+                                        found = group_1d.exception_oval[group][val]
                                     except KeyError:
-                                        self.knowledge['1d/' + str(di) + '/' + str(di_group) + '/exceptions/' + group + '/oval'] = dict()
+                                        group_1d.exception_oval[group] = dict()
 
                                 for loc_key in self.states[state].applied_rules.keys():
                                     key = loc_key.split(':')
@@ -1683,8 +1854,8 @@ class AIRIS(object):
                                         cond_group = self.states[state].applied_rules[loc_key][2]
                                         check_val = self.states[state].applied_rules[loc_key][11]
                                         if self.debug: print('Applied rules at loc ', loc_key, self.states[state].applied_rules[loc_key])
-                                        if self.input_2D[loc_x][loc_y] == check_val and input_2d[loc_x][loc_y] - check_val in self.knowledge['2d/' + str(check_val) + '/' + str(cond_group) + '/rel'].keys():
-                                            self.knowledge['2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions/' + group + '/mrules'][check_rule] = [1, 1]
+                                        if self.input_2D[loc_x][loc_y] == check_val and input_2d[loc_x][loc_y] - check_val in self.knowledge.group(check_val, cond_group).rel:
+                                            exception_data.mrules[check_rule] = [1, 1]
 
                     if dupe_act and dupe_rel and dupe_1d:
                         is_dupe = True
@@ -1695,20 +1866,18 @@ class AIRIS(object):
                 if self.debug: print('Exception KeyError')
 
             if not is_dupe:
-                exception_group = str(uuid.uuid4())[:6]
-                try:
-                    self.knowledge['2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions'].append(exception_group)
-                except KeyError:
-                    self.knowledge['2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions'] = [exception_group]
+                exception_group = self.knowledge.new_exception_id()
+                group_data = self.knowledge.group(oval, rule_data[2])
+                exception_data = self.knowledge.add_exception(group_data, exception_group)
 
                 if self.debug: print('creating exception ', exception_group, '2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions')
 
-                self.knowledge['2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions/' + exception_group + '/act'] = {self.last_action: [1, 1]}
-                self.knowledge['2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions/' + exception_group + '/apos'] = {loc_key: [1, 1]}
-                self.knowledge['2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions/' + exception_group + '/rstep'] = {}
-                self.knowledge['2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions/' + exception_group + '/lstep'] = self.time_step
+                exception_data.act = {self.last_action: [1, 1]}
+                exception_data.apos = {loc_key: [1, 1]}
+                exception_data.rstep = {}
+                exception_data.lstep = self.time_step
 
-                self.knowledge['2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions/' + exception_group + '/mrules'] = dict()
+                exception_data.mrules = dict()
                 for loc_key in self.states[state].applied_rules.keys():
                     key = loc_key.split(':')
                     loc_x = int(key[0])
@@ -1719,34 +1888,29 @@ class AIRIS(object):
                         cond_group = self.states[state].applied_rules[loc_key][2]
                         check_val = self.states[state].applied_rules[loc_key][11]
                         if self.debug: print('Applied rules at loc ', loc_key, self.states[state].applied_rules[loc_key])
-                        if self.input_2D[loc_x][loc_y] == check_val and input_2d[loc_x][loc_y] - check_val in self.knowledge['2d/' + str(check_val) + '/' + str(cond_group) + '/rel'].keys():
-                            self.knowledge['2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions/' + exception_group + '/mrules'][check_rule] = [1, 1]
+                        if self.input_2D[loc_x][loc_y] == check_val and input_2d[loc_x][loc_y] - check_val in self.knowledge.group(check_val, cond_group).rel:
+                            exception_data.mrules[check_rule] = [1, 1]
                 if self.debug: print(rule_data)
-                self.knowledge['2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions/' + exception_group + '/rel'] = []
-                for rel_data in self.knowledge['2d/' + str(oval) + '/' + str(rule_data[2]) + '/inclusions/rel']:
+                exception_data.rel = []
+                for rel_data in group_data.inclusions:
                     rox = rel_data[0]
                     roy = rel_data[1]
                     rod = self.input_2D[pos[0] + rox][pos[1] + roy]
                     ror = input_2d[pos[0] + rox][pos[1] + roy] - self.input_2D[pos[0] + rox][pos[1] + roy]
-                    self.knowledge['2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions/' + exception_group + '/rel'].append((rox, roy, rod, ror))
+                    exception_data.rel.append((rox, roy, rod, ror))
 
-                hold_rel = set(self.knowledge['2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions/' + exception_group + '/rel'])
+                hold_rel = set(exception_data.rel)
 
-                if self.debug: print('Exception rel:', self.knowledge['2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions/' + exception_group + '/rel'], hold_rel, '2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions/' + exception_group + '/rel')
-                self.knowledge['2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions/' + exception_group + '/rel'] = list(hold_rel)
+                if self.debug: print('Exception rel:', exception_data.rel, hold_rel, '2d/' + str(oval) + '/' + str(rule_data[2]) + '/exceptions/' + str(exception_group) + '/rel')
+                exception_data.rel = list(hold_rel)
+                group_data.index_exception(exception_group)
 
                 for di_key, di_val in enumerate(self.input_1D):
-                    di_group = self.knowledge['1d/' + str(di_key) + '/' + str(rule_data[1])]
-                    try:
-                        self.knowledge['1d/' + rule_data[1] + '/' + str(di_group) + '/exceptions/' + exception_group].append(di_key)
-                    except KeyError:
-                        self.knowledge['1d/' + rule_data[1] + '/' + str(di_group) + '/exceptions/' + exception_group] = [di_key]
+                    group_1d = self.knowledge.rules[rule_data[1]].rules_1d[di_key]
+                    exception_data.dims_1d.setdefault((rule_data[1], str(group_1d.index)), []).append(di_key)
 
-                    self.knowledge['1d/' + str(di_key) + '/' + str(di_group) + '/exceptions/' + exception_group + '/oval'] = {di_val: [1, 1]}
-                    self.knowledge['1d/' + str(di_key) + '/' + str(di_group) + '/exceptions/' + exception_group + '/rel'] = {input_1d[di_key] - di_val: [1, 1]}
-
-                self.knowledge['2d/exceptions/' + str(exception_group)] = oval
-                self.knowledge['2d/exceptions/' + str(exception_group) + '/cond_group'] = rule_data[2]
+                    group_1d.exception_oval[exception_group] = {di_val: [1, 1]}
+                    group_1d.exception_rel[exception_group] = {input_1d[di_key] - di_val: [1, 1]}
 
             if exception_group is not None:
                 return exception_group, rule_data[1]
@@ -1756,8 +1920,8 @@ class AIRIS(object):
 
         if update and not exception:
             for rule_id in rules_list:
-                val = self.knowledge['2d/' + str(rule_id)]
-                cond_group = self.knowledge['2d/' + str(val) + '/' + str(rule_id)]
+                group_data = self.knowledge.rules[rule_id]
+                self.knowledge.touch(*group_data.handle())
 
                 for rule in applied_rules:
                     loc_x = rule[1]
@@ -1765,117 +1929,109 @@ class AIRIS(object):
 
                     check_rule = rule[0]
 
-                    check_val = self.knowledge['2d/' + str(check_rule)]
-                    check_cond_group = self.knowledge['2d/' + str(check_val) + '/' + str(check_rule)]
+                    check_group = self.knowledge.rules[check_rule]
+                    check_val = check_group.val
 
                     if self.debug: print('Applied rules at loc ', loc_x, loc_y, rule)
-                    if self.input_2D[loc_x][loc_y] == check_val and input_2d[loc_x][loc_y] - check_val in self.knowledge['2d/' + str(check_val) + '/' + str(check_cond_group) + '/rel'].keys():
-                        self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/mrules'][check_rule] = [1, 1]
-
-                try:
-                    if self.debug: print('updating lrules for rule', rule_id, self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/lrules'])
-                except KeyError:
-                    if self.debug: print('updating lrules for rule', rule_id, 'no lrules')
-                if prules_list:
-                    try:
-                        if self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/lrules']:
-                            if self.debug: print('updating rule lrules', '2d/' + str(val) + '/' + str(cond_group) + '/lrules', self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/lrules'], prules_list, self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/lrules'] & prules_list)
-                            self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/lrules'] = self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/lrules'] & prules_list
-                    except KeyError:
-                        if self.debug: print('updating rule no lrules entry, creating')
-                        self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/lrules'] = copy.deepcopy(prules_list)
-                else:
-                    try:
-                        if self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/lrules']:
-                            if self.debug: print('updating rule no prules, clearing')
-                            self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/lrules'] = set()
-                    except KeyError:
-                        if self.debug: print('updating rule no lrules entry, creating')
-                        self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/lrules'] = copy.deepcopy(prules_list)
+                    if self.input_2D[loc_x][loc_y] == check_val and input_2d[loc_x][loc_y] - check_val in check_group.rel:
+                        group_data.mrules[check_rule] = [1, 1]
+
+                if self.debug: print('updating lrules for rule', rule_id, group_data.lrules)
+                if group_data.lrules is None:
+                    if self.debug: print('updating rule no lrules entry, creating')
+                    group_data.lrules = copy.deepcopy(prules_list)
+                elif group_data.lrules:
+                    if prules_list:
+                        if self.debug: print('updating rule lrules', rule_id, group_data.lrules, prules_list, group_data.lrules & prules_list)
+                        group_data.lrules = group_data.lrules & prules_list
+                    else:
+                        if self.debug: print('updating rule no prules, clearing')
+                        group_data.lrules = set()
 
         if update and exception:
             for exception_id in exceptions_list:
-                val = self.knowledge['2d/exceptions/' + str(exception_id)]
-                cond_group = self.knowledge['2d/exceptions/' + str(exception_id) + '/cond_group']
-                try:
-                    if self.debug: print('updating lrules for exception', exception_id, self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/exceptions/' + str(exception_id) + '/lrules'])
-                except KeyError:
-                    if self.debug: print('updating lrules for exception', exception_id, 'no rules')
-                if prules_list:
-                    try:
-                        if self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/exceptions/' + str(exception_id) + '/lrules']:
-                            if self.debug: print('updating exception lrules', '2d/' + str(val) + '/' + str(cond_group) + '/exceptions/' + str(exception_id) + '/lrules', self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/exceptions/' + str(exception_id) + '/lrules'], prules_list, self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/exceptions/' + str(exception_id) + '/lrules'] & prules_list)
-                            self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/exceptions/' + str(exception_id) + '/lrules'] = self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/exceptions/' + str(exception_id) + '/lrules'] & prules_list
-                    except KeyError:
-                        if self.debug: print('updating exception lrules no lrules entry, creating')
-                        self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/exceptions/' + str(exception_id) + '/lrules'] = copy.deepcopy(prules_list)
-                else:
-                    try:
-                        if self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/exceptions/' + str(exception_id) + '/lrules']:
-                            if self.debug: print('updating exception no prules, clearing')
-                            self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/exceptions/' + str(exception_id) + '/lrules'] = set()
-                    except KeyError:
-                        if self.debug: print('updating exception lrules no lrules entry, creating')
-                        self.knowledge['2d/' + str(val) + '/' + str(cond_group) + '/exceptions/' + str(exception_id) + '/lrules'] = copy.deepcopy(prules_list)
+                exception_data = self.knowledge.exceptions[exception_id]
+                self.knowledge.touch(exception_data.val, exception_data.cond_group)
+                if self.debug: print('updating lrules for exception', exception_id, exception_data.lrules)
+                if exception_data.lrules is None:
+                    if self.debug: print('updating exception lrules no lrules entry, creating')
+                    exception_data.lrules = copy.deepcopy(prules_list)
+                elif exception_data.lrules:
+                    if prules_list:
+                        if self.debug: print('updating exception lrules', exception_id, exception_data.lrules, prules_list, exception_data.lrules & prules_list)
+                        exception_data.lrules = exception_data.lrules & prules_list
+                    else:
+                        if self.debug: print('updating exception no prules, clearing')
+                        exception_data.lrules = set()
 
     def clean_rule(self, source_rule, post_2d):
         source_rule_id = source_rule[0]
-        source_val = self.knowledge['2d/' + str(source_rule_id)]
-        source_cond_group = self.knowledge['2d/' + str(source_val) + '/' + str(source_rule_id)]
-        hold_conditions = copy.deepcopy(self.knowledge['2d/' + str(source_val) + '/' + str(source_cond_group) + '/inclusions/rel'])
+        source_group = self.knowledge.rules[source_rule_id]
+        self.knowledge.touch(*source_group.handle())
+        hold_conditions = copy.deepcopy(source_group.inclusions)
         if self.debug: print('cleaning rule', source_rule_id, hold_conditions)
-        self.knowledge['2d/' + str(source_val) + '/' + str(source_cond_group) + '/inclusions/rel/cleaned'] = True
+        source_group.cleaned = True
         for condition in hold_conditions:
             crx, cry, cod, cor = condition
             if cor != 0:
                 try:
-                    for except_id in self.knowledge['2d/' + str(source_val) + '/' + str(source_cond_group) + '/exceptions']:
+                    for except_id in source_group.exceptions:
                         is_match = True
                         for i in range(3):
-                            source_1d = self.knowledge['1d/' + str(i) + '/' + str(source_rule_id)]
+                            source_1d = source_group.rules_1d[i]
                             try:
-                                if self.knowledge['1d/' + str(i) + '/' + str(source_1d) + '/oval'] != self.knowledge['1d/' + str(i) + '/' + str(source_1d) + '/exceptions/' + str(except_id) + '/oval']:
+                                if source_1d.oval != source_1d.exception_oval[except_id]:
                                     is_match = False
-                                if self.knowledge['1d/' + str(i) + '/' + str(source_1d) + '/rel'] != self.knowledge['1d/' + str(i) + '/' + str(source_1d) + '/exceptions/' + str(except_id) + '/rel']:
+                                if source_1d.rel != source_1d.exception_rel[except_id]:
                                     is_match = False
                             except KeyError:
                                 if self.debug: print('clean rule exception mismatch')
                                 self.error_stop = True
                         if is_match:
-                            hold_except_conditions = copy.deepcopy(self.knowledge['2d/' + str(source_val) + '/' + str(source_cond_group) + '/exceptions/' + str(except_id) + '/rel'])
+                            exception_data = source_group.exception_groups[except_id]
+                            hold_except_conditions = copy.deepcopy(exception_data.rel)
                             for exception_cond in hold_except_conditions:
                                 erx, ery, eod, eor = exception_cond
                                 if crx == erx and cry == ery and cod == eod and self.input_2D[source_rule[1] + crx][source_rule[2] + cry] == cod and post_2d[source_rule[1] + crx][source_rule[2] + cry] == self.input_2D[source_rule[1] + crx][source_rule[2] + cry]:
                                     if self.debug: print('removing condition from inclusions/rel', condition, 'based on', exception_cond)
+                                    if source_group.removed is not None and exception_data.removed is not None:
+                                        source_group.removed.append(condition)
+                                        exception_data.removed.append(exception_cond)
+                                    else:
+                                        source_group.removed = [condition]
+                                        exception_data.removed = [exception_cond]
                                     try:
-                                        self.knowledge['2d/' + str(source_val) + '/' + str(source_cond_group) + '/inclusions/rel/removed'].append(condition)
-                                        self.knowledge['2d/' + str(source_val) + '/' + str(source_cond_group) + '/exceptions/' + str(except_id) + '/rel/removed'].append(exception_cond)
-                                    except KeyError:
-                                        self.knowledge['2d/' + str(source_val) + '/' + str(source_cond_group) + '/inclusions/rel/removed'] = [condition]
-                                        self.knowledge['2d/' + str(source_val) + '/' + str(source_cond_group) + '/exceptions/' + str(except_id) + '/rel/removed'] = [exception_cond]
-                                    try:
-                                        self.knowledge['2d/' + str(source_val) + '/' + str(source_cond_group) + '/inclusions/rel'].remove(condition)
-                                        self.knowledge['2d/' + str(source_val) + '/' + str(source_cond_group) + '/exceptions/' + str(except_id) + '/rel'].remove(exception_cond)
+                                        source_group.inclusions.remove(condition)
+                                        source_group.inclusion_signature = None
+                                        exception_data.rel.remove(exception_cond)
+                                        source_group.exception_index = None
                                     except ValueError:
                                         pass
                                     if self.debug: print('finished removing using', except_id, hold_except_conditions)
                 except KeyError:
                     if self.debug: print('clean_rule keyerror')
                     pass
-        if not self.knowledge['2d/' + str(source_val) + '/' + str(source_cond_group) + '/inclusions/rel']:
+        if not source_group.inclusions:
             self.error_stop = True
 
     def save_knowledge(self, fname):
-        np.save(fname, self.knowledge)
-        sorted_keys = list(self.knowledge.keys())
-        sorted_keys.sort()
+        if self.knowledge_journal and not self.error_stop:
+            self.knowledge.save_journal(fname)
+        else:
+            self.knowledge.save(fname)
+            self.knowledge.close()
 
         if self.error_stop:
             raise Exception
 
+    # The caches were built from the knowledge being replaced, a fresh store starts its versions at 0 again
     def load_knowledge(self, fname):
+        self.predict_cache = OrderedDict()
+        self.rule_stencils = dict()
+        self.goal_tables = dict()
         try:
-            self.knowledge = np.load(fname, allow_pickle=True).item()
-            self.plan_depth = self.knowledge['plan_depth']
+            self.knowledge = Knowledge.load(fname)
+            if self.knowledge.plan_depth is not None:
+                self.plan_depth = self.knowledge.plan_depth
         except FileNotFoundError:
-            self.knowledge = dict()
+            self.knowledge = Knowledge()
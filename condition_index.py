@@ -0,0 +1,59 @@
+import numpy as np
+
+
+# Index of the vis_data / aux_data of airis_aux conditions, one float32 row per condition in the order they
+# are first asked for. distances() gives the L1 difference between a model and any set of rows in blocks
+# of block rows, the same np.sum(array_dif(vis, vis_data)) + np.sum(array_dif(aux, aux_data)) compare_conditions
+# and make_plan compute one condition at a time. Every row is summed on its own the way np.sum adds up a
+# single array, so the distances are bit for bit the same
+class ConditionIndex(object):
+
+    def __init__(self, block=4096):
+        self.block = block
+        self.rows = dict()
+        self.vis = None
+        self.aux = None
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    # Row of the condition at data_path, added from knowledge the first time. Stored conditions never change
+    def row(self, knowledge, data_path):
+        try:
+            return self.rows[data_path]
+        except KeyError:
+            pass
+        vis_data = np.asarray(knowledge[data_path + 'vis_data'], dtype=np.float32).ravel()
+        aux_data = np.asarray(knowledge[data_path + 'aux_data'], dtype=np.float32).ravel()
+        if self.vis is None:
+            self.vis = np.zeros((16, len(vis_data)), dtype=np.float32)
+            self.aux = np.zeros((16, len(aux_data)), dtype=np.float32)
+        elif len(vis_data) != self.vis.shape[1] or len(aux_data) != self.aux.shape[1]:
+            raise ValueError('condition ' + data_path + ' does not have the shape of the indexed conditions')
+        if self.count == len(self.vis):
+            self.vis = np.concatenate((self.vis, np.zeros_like(self.vis)))
+            self.aux = np.concatenate((self.aux, np.zeros_like(self.aux)))
+        self.vis[self.count] = vis_data
+        self.aux[self.count] = aux_data
+        self.rows[data_path] = self.count
+        self.count += 1
+        return self.count - 1
+
+    # Difference of rows to the model. vis_model / aux_model are one env for all rows, or one per row
+    def distances(self, rows, vis_model, aux_model):
+        rows = np.asarray(rows, dtype=int)
+        vis_model = np.asarray(vis_model, dtype=np.float32).reshape(-1, self.vis.shape[1])
+        aux_model = np.asarray(aux_model, dtype=np.float32).reshape(-1, self.aux.shape[1])
+        difs = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), self.block):
+            end = start + self.block
+            block = rows[start:end]
+            block_vis = vis_model if len(vis_model) == 1 else vis_model[start:end]
+            block_aux = aux_model if len(aux_model) == 1 else aux_model[start:end]
+            difs[start:end] = np.abs(block_vis - self.vis[block]).sum(axis=1) + np.abs(block_aux - self.aux[block]).sum(axis=1)
+        return difs
+
+    # Position in rows of the row closest to the model, the first one of equally close rows
+    def closest(self, rows, vis_model, aux_model):
+        return int(np.argmin(self.distances(rows, vis_model, aux_model)))
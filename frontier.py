@@ -0,0 +1,48 @@
+import heapq
+
+
+# confidence_heap of make_plan. Entries are (priority, state index) and pop in the same order as with
+# heapq on a plain list. A second heap keeps the indices of the states that are not anti goals, largest
+# first, so the furthest of them is found without sorting. Popped entries are only counted out and
+# dropped from that heap once they reach its top
+class Frontier(object):
+
+    def __init__(self, states):
+        self.states = states
+        self.heap = []
+        self.far_heap = []
+        self.counts = dict()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __repr__(self):
+        return repr(self.heap)
+
+    def push(self, entry):
+        heapq.heappush(self.heap, entry)
+        index = entry[1]
+        self.counts[index] = self.counts.get(index, 0) + 1
+        if not self.states[index].anti_goal:
+            heapq.heappush(self.far_heap, -index)
+
+    def pop(self):
+        entry = heapq.heappop(self.heap)
+        self.counts[entry[1]] -= 1
+        return entry
+
+    # Pops entries until one whose state index is not skipped, or until the last entry. Returns the index
+    # of the last popped entry
+    def pop_until(self, skip):
+        index = self.pop()[1]
+        while self.heap and skip(index):
+            index = self.pop()[1]
+        return index
+
+    # Largest state index in the heap that is not an anti goal. Raises IndexError if there is none
+    def furthest(self):
+        while self.far_heap and self.counts[-self.far_heap[0]] == 0:
+            heapq.heappop(self.far_heap)
+        if not self.far_heap:
+            raise IndexError('no state in the heap that is not an anti goal')
+        return -self.far_heap[0]
@@ -0,0 +1,949 @@
+import io
+import os
+import pickle
+import threading
+import numpy as np
+from snapshots import SnapshotStore
+
+
+# Flat key of a rule under prefix, like the '2d/<rule_id>' value and '1d/<rule_id>' 1D indices of a rule or its
+# '2d/<val>/<rule_id>' condition group index. Integer ids would land on the '2d/<val>' and '1d/<di>' keys, so
+# every key holding an integer rule id writes it as '#<rule_id>'. The 6 character string ids of older files
+# keep their keys
+def rule_key(prefix, rule_id):
+    if isinstance(rule_id, str):
+        return prefix + '/' + rule_id
+    return prefix + '/#' + str(rule_id)
+
+
+# Rule id of a key segment written by rule_key. legacy is set for files with string ids. Files written with
+# integer ids before every key went through rule_key may hold a bare integer
+def parse_rule_id(segment, legacy):
+    if legacy:
+        return segment
+    if segment.startswith('#'):
+        segment = segment[1:]
+    return int(segment)
+
+
+# Base of the rule objects. load_columns only sets the attributes kept in its numeric tables and points lazy at
+# (knowledge, start, end) of the rest, pickled in Knowledge.blobs. The first read of any other attribute
+# unpickles them
+class LazyFields(object):
+
+    lazy = None
+
+    def __getattr__(self, name):
+        if self.lazy is None or name.startswith('__'):
+            raise AttributeError(name)
+        self.load()
+        return getattr(self, name)
+
+    def load(self):
+        if self.lazy is not None:
+            knowledge, start, end = self.lazy
+            self.lazy = None
+            knowledge.unpack(self, pickle.loads(knowledge.blobs[start:end].tobytes()))
+
+
+# A 2D rule. Each rule owns exactly one condition group per original value, so the
+# condition group is reachable either by its rule id or by its (val, index) handle.
+# The attributes mirror the '2d/<val>/<index>/...' keys of the flat Knowledge.npy layout
+class ConditionGroup(LazyFields):
+
+    def __init__(self, rule_id, val, index):
+        self.id = rule_id
+        self.val = val
+        self.index = index
+        self.act = dict()
+        self.rel = dict()
+        self.abs = dict()
+        self.apos = dict()
+        self.oraw = None
+        self.lraw = None
+        # rows of Knowledge.raw_1d / raw_2d holding oraw and lraw when loaded with load_columns
+        self.raw_rows = None
+        self.lstep = None
+        self.rstep = dict()
+        self.combined = False
+        self.mrules = dict()
+        self.lrules = None
+        self.inclusions = []
+        self.inclusion_set = set()
+        # cached signature(), reset to None whenever inclusions change
+        self.inclusion_signature = None
+        self.cleaned = None
+        self.removed = None
+        self.exceptions = []
+        self.exception_groups = dict()
+        # act -> rel offsets -> values expected at those offsets -> [(position in exceptions, exception id)],
+        # built on first use by exception_candidates and reset to None when an exception rel changes
+        self.exception_index = None
+        # 1D condition groups of this rule keyed by 1D index. dims_1d is None for rules that never stored 1D data
+        self.rules_1d = dict()
+        self.dims_1d = None
+
+    def handle(self):
+        return self.val, self.index
+
+    # The inclusions the way create_rule compares them to the input when looking for a duplicate rule: the
+    # number of distinct offsets and the (x offset, y offset, value) of every inclusion
+    def signature(self):
+        if self.inclusion_signature is None:
+            offsets = set((rel_data[0], rel_data[1]) for rel_data in self.inclusions)
+            self.inclusion_signature = (len(offsets), tuple((rel_data[0], rel_data[1], rel_data[2]) for rel_data in self.inclusions))
+        return self.inclusion_signature
+
+    # Adds an exception to exception_index once its act and rel are set. Exceptions whose rel holds an offset
+    # twice go under offsets None and are always checked
+    def index_exception(self, exception_id, order=None):
+        if self.exception_index is None:
+            return
+        if order is None:
+            order = len(self.exceptions) - 1
+            if self.exceptions[order] != exception_id:
+                order = self.exceptions.index(exception_id)
+        exception = self.exception_groups[exception_id]
+        rel = sorted(set((rel_data[0], rel_data[1], rel_data[2]) for rel_data in exception.rel))
+        offsets = tuple((rox, roy) for rox, roy, rod in rel)
+        values = tuple(rod for rox, roy, rod in rel)
+        if len(set(offsets)) != len(offsets):
+            offsets = None
+            values = None
+        for act in exception.act.keys():
+            self.exception_index.setdefault(act, dict()).setdefault(offsets, dict()).setdefault(values, []).append((order, exception_id))
+
+    # Ids of the exceptions for act whose rel conditions all hold at (x, y) of input_2d, in the order of
+    # exceptions. An offset off the grid holds for any value, like in update_rule
+    def exception_candidates(self, act, input_2d, x, y):
+        if self.exception_index is None:
+            self.exception_index = dict()
+            for order, exception_id in enumerate(self.exceptions):
+                self.index_exception(exception_id, order)
+        found = []
+        for offsets, by_values in self.exception_index.get(act, {}).items():
+            if offsets is None:
+                for exceptions in by_values.values():
+                    found.extend(exceptions)
+                continue
+            values = []
+            off_grid = []
+            for rox, roy in offsets:
+                try:
+                    values.append(input_2d[x + rox][y + roy])
+                    off_grid.append(False)
+                except IndexError:
+                    values.append(None)
+                    off_grid.append(True)
+            if any(off_grid):
+                # only the offsets on the grid have to hold
+                for rel_values, exceptions in by_values.items():
+                    if all(off or value == rod for off, value, rod in zip(off_grid, values, rel_values)):
+                        found.extend(exceptions)
+            else:
+                found.extend(by_values.get(tuple(values), ()))
+        found.sort()
+        return [exception_id for order, exception_id in found]
+
+
+# An exception of a 2D rule, mirroring the '2d/<val>/<index>/exceptions/<id>/...' keys
+class ExceptionGroup(LazyFields):
+
+    def __init__(self, exception_id, val, cond_group):
+        self.id = exception_id
+        self.val = val
+        self.cond_group = cond_group
+        self.act = dict()
+        self.apos = dict()
+        self.rstep = dict()
+        self.lstep = None
+        self.mrules = dict()
+        self.rel = []
+        self.lrules = None
+        self.removed = None
+        # '1d/<rule_id>/<group_1d>/exceptions/<id>' lists keyed by (rule_id, group_1d)
+        self.dims_1d = dict()
+
+
+# The 1D condition group of a rule for one 1D index, mirroring the '1d/<di>/<index>/...' keys
+class ConditionGroup1D(LazyFields):
+
+    def __init__(self, rule_id, di, index):
+        self.rule_id = rule_id
+        self.di = di
+        self.index = index
+        self.oval = dict()
+        self.rel = dict()
+        self.abs = dict()
+        # '1d/<di>/<index>/exceptions/<id>/oval' and '/rel' keyed by exception id
+        self.exception_oval = dict()
+        self.exception_rel = dict()
+
+    def handle(self):
+        return self.di, self.index
+
+
+# Rule store used by airis_stable.AIRIS in place of the flat string keyed knowledge dict.
+# to_dict() / from_dict() convert to and from the original Knowledge.npy layout so saved files stay
+# readable by Knowledge_View.py, rule_viewer.py and older builds
+class Knowledge(object):
+
+    def __init__(self):
+        self.plan_depth = None
+        self.actions = dict()
+        self.values = []
+        self.value_set = set()
+        self.groups = dict()
+        self.rules = dict()
+        self.groups_1d = dict()
+        self.exceptions = dict()
+        self.extra = dict()
+        # (val, index) handles changed since the last journal record and whether any rule was added
+        self.dirty = set()
+        self.created = set()
+        self.grown = False
+        self.journal = None
+        # Rules and exceptions are numbered from 0 in the order they are created, see new_rule_id
+        self.next_rule_id = 0
+        self.next_exception_id = 0
+        # (val, act, rval) -> condition groups create_rule checks for a duplicate, built on first use
+        self.signatures = None
+        # val -> number of changes to the rules of val
+        self.versions = dict()
+        # 1D index -> number of changes to the rules with conditions on that index
+        self.versions_1d = dict()
+        # shared oraw / lraw observations
+        self.snapshots = SnapshotStore()
+        # memory mapped oraw / lraw columns and pickled rule attributes set by load_columns
+        self.raw_1d = None
+        self.raw_2d = None
+        self.blobs = None
+
+    def __len__(self):
+        return len(self.rules)
+
+    # Returns the condition group for a (val, index) handle, raising KeyError like the flat dict did
+    def group(self, val, cond_group):
+        try:
+            return self.groups[val][cond_group]
+        except IndexError:
+            raise KeyError((val, cond_group))
+
+    def rules_for(self, val):
+        try:
+            return self.groups[val]
+        except KeyError:
+            return []
+
+    def rule(self, rule_id):
+        return self.rules[rule_id]
+
+    # Integer id for a new rule / exception. The counters are saved with the knowledge, so ids are never reused
+    # and stay dense enough to index arrays with
+    def new_rule_id(self):
+        rule_id = self.next_rule_id
+        self.next_rule_id += 1
+        return rule_id
+
+    def new_exception_id(self):
+        exception_id = self.next_exception_id
+        self.next_exception_id += 1
+        return exception_id
+
+    # Gives every rule and exception an integer id in load order and rewrites every reference to them. Files
+    # saved before integer ids, with 6 character uuid strings, are converted this way when they are loaded
+    def renumber(self):
+        rule_ids = dict()
+        for val in self.values:
+            for group in self.groups[val]:
+                rule_ids[group.id] = len(rule_ids)
+        exception_ids = dict()
+        for val in self.values:
+            for group in self.groups[val]:
+                for exception_id in group.exceptions:
+                    exception_ids[exception_id] = len(exception_ids)
+
+        # ids referenced by mrules / lrules whose rule is gone get a number of their own
+        def rule(rule_id):
+            return rule_ids.setdefault(rule_id, len(rule_ids))
+
+        def rules(rule_set):
+            if rule_set is None:
+                return None
+            return set(rule(rule_id) for rule_id in rule_set)
+
+        self.rules = dict()
+        self.exceptions = dict()
+        for val in self.values:
+            for group in self.groups[val]:
+                group.id = rule(group.id)
+                group.mrules = dict((rule(rule_id), data) for rule_id, data in group.mrules.items())
+                group.lrules = rules(group.lrules)
+                self.rules[group.id] = group
+                exception_groups = dict()
+                for exception_id in group.exceptions:
+                    exception = group.exception_groups[exception_id]
+                    exception.id = exception_ids[exception_id]
+                    exception.mrules = dict((rule(rule_id), data) for rule_id, data in exception.mrules.items())
+                    exception.lrules = rules(exception.lrules)
+                    exception.dims_1d = dict(((rule(rule_id), group_1d), dims) for (rule_id, group_1d), dims in exception.dims_1d.items())
+                    exception_groups[exception.id] = exception
+                    self.exceptions[exception.id] = exception
+                group.exceptions = [exception_ids[exception_id] for exception_id in group.exceptions]
+                group.exception_groups = exception_groups
+                group.exception_index = None
+        for act in self.actions.keys():
+            self.actions[act] = [rule(rule_id) for rule_id in self.actions[act]]
+        for di_groups in self.groups_1d.values():
+            for group_1d in di_groups:
+                group_1d.rule_id = rule(group_1d.rule_id)
+                group_1d.exception_oval = dict((exception_ids.get(exception_id, exception_id), oval) for exception_id, oval in group_1d.exception_oval.items())
+                group_1d.exception_rel = dict((exception_ids.get(exception_id, exception_id), rel) for exception_id, rel in group_1d.exception_rel.items())
+        self.next_rule_id = len(rule_ids)
+        self.next_exception_id = len(exception_ids)
+        self.signatures = None
+
+    # Condition groups of val whose act holds act and whose rel holds rval, in the order of rules_for(val)
+    def candidates(self, val, act, rval):
+        if self.signatures is None:
+            self.signatures = dict()
+            for val_groups in self.groups.values():
+                for group in val_groups:
+                    self.index_rule(group)
+        try:
+            return self.signatures[val, act, rval]
+        except KeyError:
+            return []
+
+    # Adds a condition group to the candidates index once its act and rel are set. The act and rel keys of a
+    # rule never change after that, update_rule only counts in them
+    def index_rule(self, group):
+        if self.signatures is None:
+            return
+        for act in group.act.keys():
+            for rval in group.rel.keys():
+                self.signatures.setdefault((group.val, act, rval), []).append(group)
+
+    def add_rule(self, rule_id, act, val):
+        self.actions.setdefault(act, []).append(rule_id)
+        if val not in self.value_set:
+            self.values.append(val)
+            self.value_set.add(val)
+        val_groups = self.groups.setdefault(val, [])
+        group = ConditionGroup(rule_id, val, len(val_groups))
+        val_groups.append(group)
+        self.rules[rule_id] = group
+        self.touch(val, group.index)
+        self.created.add((val, group.index))
+        self.grown = True
+        return group
+
+    def add_rule_1d(self, group, di):
+        di_groups = self.groups_1d.setdefault(di, [])
+        group_1d = ConditionGroup1D(group.id, di, len(di_groups))
+        di_groups.append(group_1d)
+        group.rules_1d[di] = group_1d
+        if group.dims_1d is None:
+            group.dims_1d = {di}
+        else:
+            group.dims_1d.add(di)
+        self.touch(*group.handle())
+        self.grown = True
+        return group_1d
+
+    def add_exception(self, group, exception_id):
+        exception = ExceptionGroup(exception_id, group.val, group.index)
+        group.exceptions.append(exception_id)
+        group.exception_groups[exception_id] = exception
+        self.exceptions[exception_id] = exception
+        self.touch(*group.handle())
+        return exception
+
+    # oraw (which=0) or lraw (which=1) of a group, read from the memory mapped columns if it was loaded from them
+    def raw(self, group, which):
+        if group.raw_rows is None:
+            if which == 0:
+                return group.oraw
+            return group.lraw
+        row = group.raw_rows[which]
+        return [self.raw_1d[row].tolist(), self.raw_2d[row].tolist()]
+
+    # The shared copy of a raw observation, so equal oraw / lraw of different rules are stored once
+    def snapshot(self, raw):
+        if raw is None:
+            return None
+        return self.snapshots.intern(raw)
+
+    # Marks the condition group at handle (val, index) as changed since the last journal record and
+    # moves on the version of val, which invalidates cached predictions of states holding val, and the
+    # versions of its 1D indices, which invalidate the compiled goals of airis_stable.compare
+    def touch(self, val, cond_group):
+        self.dirty.add((val, cond_group))
+        self.versions[val] = self.versions.get(val, 0) + 1
+        dims_1d = self.group(val, cond_group).dims_1d
+        if dims_1d:
+            for di in dims_1d:
+                self.versions_1d[di] = self.versions_1d.get(di, 0) + 1
+
+    def _index_items(self, knowledge):
+        if self.plan_depth is not None:
+            knowledge['plan_depth'] = self.plan_depth
+        knowledge['next_ids'] = [self.next_rule_id, self.next_exception_id]
+        for act, rule_ids in self.actions.items():
+            knowledge[act] = list(rule_ids)
+        if self.values:
+            knowledge['2d'] = list(self.values)
+            knowledge['2d{'] = set(self.value_set)
+        for val in self.values:
+            knowledge['2d/' + str(val)] = [group.id for group in self.groups[val]]
+        for di, di_groups in self.groups_1d.items():
+            knowledge['1d/' + str(di)] = [group_1d.rule_id for group_1d in di_groups]
+            knowledge['1d{' + str(di)] = {group_1d.rule_id for group_1d in di_groups}
+
+    def _group_items(self, group, knowledge):
+        val = group.val
+        path = '2d/' + str(val) + '/' + str(group.index)
+        knowledge[rule_key('2d/' + str(val), group.id)] = group.index
+        knowledge[rule_key('2d', group.id)] = val
+        knowledge[path + '/act'] = group.act
+        knowledge[path + '/rel'] = group.rel
+        knowledge[path + '/abs'] = group.abs
+        knowledge[path + '/apos'] = group.apos
+        knowledge[path + '/oraw'] = self.raw(group, 0)
+        knowledge[path + '/lraw'] = self.raw(group, 1)
+        knowledge[path + '/id'] = group.id
+        knowledge[path + '/lstep'] = group.lstep
+        knowledge[path + '/rstep'] = group.rstep
+        knowledge[path + '/combined'] = group.combined
+        knowledge[path + '/mrules'] = group.mrules
+        knowledge[path + '/inclusions/rel'] = group.inclusions
+        knowledge[path + '/inclusions/rel_set'] = group.inclusion_set
+        if group.lrules is not None:
+            knowledge[path + '/lrules'] = group.lrules
+        if group.cleaned is not None:
+            knowledge[path + '/inclusions/rel/cleaned'] = group.cleaned
+        if group.removed is not None:
+            knowledge[path + '/inclusions/rel/removed'] = group.removed
+        if group.dims_1d is not None:
+            knowledge[rule_key('1d', group.id)] = group.dims_1d
+        if group.exceptions:
+            knowledge[path + '/exceptions'] = group.exceptions
+        for exception_id in group.exceptions:
+            exception = group.exception_groups[exception_id]
+            ex_path = path + '/exceptions/' + str(exception_id)
+            knowledge[ex_path + '/act'] = exception.act
+            knowledge[ex_path + '/apos'] = exception.apos
+            knowledge[ex_path + '/rstep'] = exception.rstep
+            knowledge[ex_path + '/lstep'] = exception.lstep
+            knowledge[ex_path + '/mrules'] = exception.mrules
+            knowledge[ex_path + '/rel'] = exception.rel
+            if exception.lrules is not None:
+                knowledge[ex_path + '/lrules'] = exception.lrules
+            if exception.removed is not None:
+                knowledge[ex_path + '/rel/removed'] = exception.removed
+            for (rule_id, group_1d), dims in exception.dims_1d.items():
+                knowledge[rule_key('1d', rule_id) + '/' + str(group_1d) + '/exceptions/' + str(exception_id)] = dims
+            knowledge['2d/exceptions/' + str(exception_id)] = exception.val
+            knowledge['2d/exceptions/' + str(exception_id) + '/cond_group'] = exception.cond_group
+
+    def _group_1d_items(self, group_1d, knowledge):
+        di = group_1d.di
+        path = '1d/' + str(di) + '/' + str(group_1d.index)
+        knowledge[rule_key('1d/' + str(di), group_1d.rule_id)] = str(group_1d.index)
+        knowledge[path + '/oval'] = group_1d.oval
+        knowledge[path + '/rel'] = group_1d.rel
+        knowledge[path + '/abs'] = group_1d.abs
+        for exception_id, oval in group_1d.exception_oval.items():
+            knowledge[path + '/exceptions/' + str(exception_id) + '/oval'] = oval
+        for exception_id, rel in group_1d.exception_rel.items():
+            knowledge[path + '/exceptions/' + str(exception_id) + '/rel'] = rel
+
+    def to_dict(self):
+        knowledge = dict(self.extra)
+        self._index_items(knowledge)
+        for val in self.values:
+            for group in self.groups[val]:
+                self._group_items(group, knowledge)
+        for di_groups in self.groups_1d.values():
+            for group_1d in di_groups:
+                self._group_1d_items(group_1d, knowledge)
+        return knowledge
+
+    # The flat keys of every condition group touched since the last record. The rule id lists are only
+    # written again when rules were added, and oraw / lraw, which never change, only for new rules
+    def journal_record(self):
+        record = dict()
+        if self.grown:
+            self._index_items(record)
+        else:
+            # exceptions are added without growing the rule lists, the id counters go in every record
+            record['next_ids'] = [self.next_rule_id, self.next_exception_id]
+            if self.plan_depth is not None:
+                record['plan_depth'] = self.plan_depth
+        for val, cond_group in self.dirty:
+            group = self.group(val, cond_group)
+            self._group_items(group, record)
+            if (val, cond_group) not in self.created:
+                path = '2d/' + str(val) + '/' + str(cond_group)
+                del record[path + '/oraw']
+                del record[path + '/lraw']
+            for group_1d in group.rules_1d.values():
+                self._group_1d_items(group_1d, record)
+        self.dirty = set()
+        self.created = set()
+        self.grown = False
+        return record
+
+    @classmethod
+    def from_dict(cls, knowledge):
+        kb = cls()
+        data = dict(knowledge)
+        kb.plan_depth = data.pop('plan_depth', None)
+        # files without next_ids use uuid string ids and are renumbered below
+        next_ids = data.pop('next_ids', None)
+        kb.values = data.pop('2d', [])
+        kb.value_set = data.pop('2d{', set(kb.values))
+        shared = dict()
+
+        for val in kb.values:
+            kb.groups[val] = []
+            for index, rule_id in enumerate(data.pop('2d/' + str(val))):
+                path = '2d/' + str(val) + '/' + str(index)
+                group = ConditionGroup(rule_id, val, index)
+                group.act = data.pop(path + '/act')
+                group.rel = data.pop(path + '/rel')
+                group.abs = data.pop(path + '/abs')
+                group.apos = data.pop(path + '/apos')
+                # observations pickled as one shared object are interned once
+                oraw = data.pop(path + '/oraw', None)
+                lraw = data.pop(path + '/lraw', None)
+                if id(oraw) not in shared:
+                    shared[id(oraw)] = (oraw, kb.snapshot(oraw))
+                if id(lraw) not in shared:
+                    shared[id(lraw)] = (lraw, kb.snapshot(lraw))
+                group.oraw = shared[id(oraw)][1]
+                group.lraw = shared[id(lraw)][1]
+                group.lstep = data.pop(path + '/lstep', None)
+                group.rstep = data.pop(path + '/rstep', dict())
+                group.combined = data.pop(path + '/combined', False)
+                group.mrules = data.pop(path + '/mrules', dict())
+                group.lrules = data.pop(path + '/lrules', None)
+                group.inclusions = data.pop(path + '/inclusions/rel', [])
+                group.inclusion_set = data.pop(path + '/inclusions/rel_set', set())
+                group.cleaned = data.pop(path + '/inclusions/rel/cleaned', None)
+                group.removed = data.pop(path + '/inclusions/rel/removed', None)
+                group.dims_1d = data.pop(rule_key('1d', rule_id), None)
+                data.pop(path + '/id', None)
+                data.pop(rule_key('2d/' + str(val), rule_id), None)
+                data.pop('2d/' + str(val) + '/' + str(rule_id), None)
+                data.pop(rule_key('2d', rule_id), None)
+
+                for exception_id in data.pop(path + '/exceptions', []):
+                    ex_path = path + '/exceptions/' + str(exception_id)
+                    exception = ExceptionGroup(exception_id, val, index)
+                    exception.act = data.pop(ex_path + '/act')
+                    exception.apos = data.pop(ex_path + '/apos', dict())
+                    exception.rstep = data.pop(ex_path + '/rstep', dict())
+                    exception.lstep = data.pop(ex_path + '/lstep', None)
+                    exception.mrules = data.pop(ex_path + '/mrules', dict())
+                    exception.rel = data.pop(ex_path + '/rel', [])
+                    exception.lrules = data.pop(ex_path + '/lrules', None)
+                    exception.removed = data.pop(ex_path + '/rel/removed', None)
+                    data.pop('2d/exceptions/' + str(exception_id), None)
+                    data.pop('2d/exceptions/' + str(exception_id) + '/cond_group', None)
+                    group.exceptions.append(exception_id)
+                    group.exception_groups[exception_id] = exception
+                    kb.exceptions[exception_id] = exception
+
+                kb.groups[val].append(group)
+                kb.rules[rule_id] = group
+
+        for group in kb.rules.values():
+            for act in group.act.keys():
+                if act not in kb.actions and isinstance(data.get(act), list):
+                    kb.actions[act] = data.pop(act)
+
+        di = 0
+        while isinstance(data.get('1d/' + str(di)), list):
+            kb.groups_1d[di] = []
+            data.pop('1d{' + str(di), None)
+            for index, rule_id in enumerate(data.pop('1d/' + str(di))):
+                path = '1d/' + str(di) + '/' + str(index)
+                group_1d = ConditionGroup1D(rule_id, di, index)
+                group_1d.oval = data.pop(path + '/oval')
+                group_1d.rel = data.pop(path + '/rel')
+                group_1d.abs = data.pop(path + '/abs')
+                data.pop(rule_key('1d/' + str(di), rule_id), None)
+                data.pop('1d/' + str(di) + '/' + str(rule_id), None)
+                kb.groups_1d[di].append(group_1d)
+                try:
+                    kb.rules[rule_id].rules_1d[di] = group_1d
+                except KeyError:
+                    pass
+            di += 1
+
+        for key in list(data.keys()):
+            if not isinstance(key, str) or not key.startswith('1d/'):
+                continue
+            parts = key.split('/')
+            if len(parts) == 6 and parts[3] == 'exceptions' and parts[5] in ('oval', 'rel'):
+                try:
+                    group_1d = kb.groups_1d[int(parts[1])][int(parts[2])]
+                    exception_id = parts[4] if next_ids is None else int(parts[4])
+                except (ValueError, KeyError, IndexError):
+                    continue
+                if parts[5] == 'oval':
+                    group_1d.exception_oval[exception_id] = data.pop(key)
+                else:
+                    group_1d.exception_rel[exception_id] = data.pop(key)
+            elif len(parts) == 5 and parts[3] == 'exceptions':
+                try:
+                    rule_id = parse_rule_id(parts[1], next_ids is None)
+                    exception = kb.exceptions[parts[4] if next_ids is None else int(parts[4])]
+                except (ValueError, KeyError):
+                    continue
+                exception.dims_1d[(rule_id, parts[2])] = data.pop(key)
+
+        kb.extra = data
+        if next_ids is None:
+            kb.renumber()
+        else:
+            kb.next_rule_id, kb.next_exception_id = next_ids
+        return kb
+
+    def save(self, fname):
+        if self.journal is not None and self.journal.fname == fname:
+            self.journal.save(self.to_dict())
+        else:
+            np.save(fname, self.to_dict())
+        self.dirty = set()
+        self.created = set()
+        self.grown = False
+
+    # Journaled save: appends only the changed condition groups to <fname>.journal and rewrites the full
+    # snapshot every compact_every records. The first call of a session always writes a snapshot
+    def save_journal(self, fname, compact_every=500):
+        if self.journal is None or self.journal.fname != fname:
+            self.close()
+            self.journal = KnowledgeJournal(fname, compact_every)
+            self.save(fname)
+            return
+        if self.dirty or self.grown:
+            self.journal.append(self.journal_record())
+        if self.journal.records >= self.journal.compact_every:
+            self.journal.compact()
+
+    def close(self):
+        if self.journal is not None:
+            journal = self.journal
+            self.journal = None
+            journal.close()
+
+    # Attributes of a rule object load_columns does not keep in its tables. Derived indexes are left out and
+    # references to other rule objects are written as their handles. oraw / lraw are left out when they go to
+    # the raw columns
+    def pack(self, obj, raw_columns=False):
+        obj.load()
+        fields = dict(obj.__dict__)
+        fields.pop('lazy', None)
+        if isinstance(obj, ConditionGroup):
+            for name in ('id', 'val', 'index', 'raw_rows', 'exception_groups', 'exception_index', 'inclusion_signature'):
+                fields.pop(name, None)
+            if raw_columns:
+                del fields['oraw']
+                del fields['lraw']
+            else:
+                fields['oraw'] = self.raw(obj, 0)
+                fields['lraw'] = self.raw(obj, 1)
+            fields['rules_1d'] = dict((di, group_1d.index) for di, group_1d in obj.rules_1d.items())
+        elif isinstance(obj, ExceptionGroup):
+            for name in ('id', 'val', 'cond_group'):
+                del fields[name]
+        else:
+            for name in ('rule_id', 'di', 'index'):
+                del fields[name]
+        return pickle.dumps(fields, pickle.HIGHEST_PROTOCOL)
+
+    # Sets the attributes pack() wrote on a rule object created by load_columns. Attributes assigned before the
+    # object was loaded are newer than the saved ones and are kept
+    def unpack(self, obj, fields):
+        if isinstance(obj, ConditionGroup):
+            fields['rules_1d'] = dict((di, self.groups_1d[di][index]) for di, index in fields['rules_1d'].items())
+            fields['exception_groups'] = dict((exception_id, self.exceptions[exception_id]) for exception_id in fields['exceptions'])
+            fields['exception_index'] = None
+            fields['inclusion_signature'] = None
+            fields.setdefault('oraw', None)
+            fields.setdefault('lraw', None)
+        for name, value in fields.items():
+            obj.__dict__.setdefault(name, value)
+
+    # Writes the knowledge as a directory of .npy files that load_columns opens with np.memmap:
+    # - groups.npy, exceptions.npy and groups_1d.npy: one fixed dtype row per rule, exception and 1D condition
+    #   group with its id, handle, oraw / lraw rows and the span of its other attributes in blobs.npy
+    # - actions.npy: (action, rule id) rows in the order of the action lists
+    # - blobs.npy: the pickled counters, conditions and links of every row above
+    # - raw_1d.npy / raw_2d.npy: every distinct raw observation once
+    # - index.npy: the values, actions, id counters and keys that are not part of a rule
+    # Every file is written next to its target and moved over it, so processes still mapping the old files
+    # keep reading them
+    def save_columns(self, dirname):
+        value_pos = dict((val, pos) for pos, val in enumerate(self.values))
+        rows = dict()
+        raw_1d = []
+        raw_2d = []
+        raw_rows = dict()
+        for val in self.values:
+            for group in self.groups[val]:
+                group_rows = []
+                for which in (0, 1):
+                    raw = self.raw(group, which)
+                    row = -1
+                    if raw is not None and len(raw) == 2:
+                        snapshot_id = SnapshotStore.digest(raw)
+                        if snapshot_id not in rows:
+                            rows[snapshot_id] = len(raw_1d)
+                            raw_1d.append(raw[0])
+                            raw_2d.append(raw[1])
+                        row = rows[snapshot_id]
+                    group_rows.append(row)
+                raw_rows[val, group.index] = group_rows
+        try:
+            raw_1d = np.array(raw_1d)
+            raw_2d = np.array(raw_2d)
+            if raw_1d.dtype == object or raw_2d.dtype == object:
+                raise ValueError
+        except ValueError:
+            # observations of different sizes are pickled with the rest of the rule
+            raw_1d = np.zeros((0, 0))
+            raw_2d = np.zeros((0, 0, 0))
+            raw_rows = dict((handle, [-1, -1]) for handle in raw_rows.keys())
+
+        blobs = io.BytesIO()
+
+        def blob(obj, raw_columns=False):
+            start = blobs.tell()
+            blobs.write(self.pack(obj, raw_columns))
+            return start, blobs.tell()
+
+        groups = []
+        exceptions = []
+        for val in self.values:
+            for group in self.groups[val]:
+                orow, lrow = raw_rows[val, group.index]
+                start, end = blob(group, orow != -1)
+                groups.append((group.id, value_pos[val], group.index, orow, lrow, start, end))
+                for exception_id in group.exceptions:
+                    start, end = blob(group.exception_groups[exception_id])
+                    exceptions.append((exception_id, value_pos[val], group.index, start, end))
+        groups_1d = []
+        for di in sorted(self.groups_1d.keys()):
+            for group_1d in self.groups_1d[di]:
+                start, end = blob(group_1d)
+                groups_1d.append((group_1d.rule_id, di, group_1d.index, start, end))
+        acts = list(self.actions.keys())
+        actions = [(pos, rule_id) for pos, act in enumerate(acts) for rule_id in self.actions[act]]
+
+        index = {'plan_depth': self.plan_depth, 'next_ids': [self.next_rule_id, self.next_exception_id],
+                 'values': list(self.values), 'actions': acts, 'extra': dict(self.extra)}
+        span = [('start', 'i8'), ('end', 'i8')]
+        columns = {
+            'groups.npy': np.array(groups, dtype=[('id', 'i8'), ('val', 'i8'), ('index', 'i8'), ('oraw', 'i8'), ('lraw', 'i8')] + span),
+            'exceptions.npy': np.array(exceptions, dtype=[('id', 'i8'), ('val', 'i8'), ('cond_group', 'i8')] + span),
+            'groups_1d.npy': np.array(groups_1d, dtype=[('rule_id', 'i8'), ('di', 'i8'), ('index', 'i8')] + span),
+            'actions.npy': np.array(actions, dtype=[('act', 'i8'), ('rule_id', 'i8')]),
+            'blobs.npy': np.frombuffer(blobs.getvalue(), dtype=np.uint8),
+            'raw_1d.npy': raw_1d,
+            'raw_2d.npy': raw_2d,
+            'index.npy': np.array(index, dtype=object),
+        }
+        os.makedirs(dirname, exist_ok=True)
+        for name, column in columns.items():
+            path = os.path.join(dirname, name)
+            with open(path + '.tmp', 'wb') as f:
+                np.save(f, column)
+            os.replace(path + '.tmp', path)
+
+    # Opens a directory written by save_columns. Only index.npy is unpickled. Every rule, exception and 1D
+    # condition group is created from its table row and unpickles the rest of its attributes the first time
+    # they are read. The columns stay on disk and read only processes loading the same directory share their
+    # pages
+    @classmethod
+    def load_columns(cls, dirname):
+        kb = cls()
+        index = np.load(os.path.join(dirname, 'index.npy'), allow_pickle=True).item()
+        kb.plan_depth = index['plan_depth']
+        kb.next_rule_id, kb.next_exception_id = index['next_ids']
+        kb.values = index['values']
+        kb.value_set = set(kb.values)
+        kb.extra = index['extra']
+        kb.blobs = np.load(os.path.join(dirname, 'blobs.npy'), mmap_mode='r')
+        kb.raw_1d = np.load(os.path.join(dirname, 'raw_1d.npy'), mmap_mode='r')
+        kb.raw_2d = np.load(os.path.join(dirname, 'raw_2d.npy'), mmap_mode='r')
+
+        for val in kb.values:
+            kb.groups[val] = []
+        for rule_id, pos, cond_group, orow, lrow, start, end in np.load(os.path.join(dirname, 'groups.npy'), mmap_mode='r').tolist():
+            group = ConditionGroup.__new__(ConditionGroup)
+            group.id = rule_id
+            group.val = kb.values[pos]
+            group.index = cond_group
+            group.raw_rows = None if orow == -1 else (orow, lrow)
+            group.lazy = (kb, start, end)
+            kb.groups[group.val].append(group)
+            kb.rules[rule_id] = group
+        for exception_id, pos, cond_group, start, end in np.load(os.path.join(dirname, 'exceptions.npy'), mmap_mode='r').tolist():
+            exception = ExceptionGroup.__new__(ExceptionGroup)
+            exception.id = exception_id
+            exception.val = kb.values[pos]
+            exception.cond_group = cond_group
+            exception.lazy = (kb, start, end)
+            kb.exceptions[exception_id] = exception
+        for rule_id, di, cond_group, start, end in np.load(os.path.join(dirname, 'groups_1d.npy'), mmap_mode='r').tolist():
+            group_1d = ConditionGroup1D.__new__(ConditionGroup1D)
+            group_1d.rule_id = rule_id
+            group_1d.di = di
+            group_1d.index = cond_group
+            group_1d.lazy = (kb, start, end)
+            kb.groups_1d.setdefault(di, []).append(group_1d)
+        for act in index['actions']:
+            kb.actions[act] = []
+        for pos, rule_id in np.load(os.path.join(dirname, 'actions.npy'), mmap_mode='r').tolist():
+            kb.actions[index['actions'][pos]].append(rule_id)
+        return kb
+
+    @classmethod
+    def load(cls, fname):
+        if os.path.isdir(fname):
+            return cls.load_columns(fname)
+        return cls.from_dict(read_knowledge(fname))
+
+
+# Append-only log of knowledge changes kept next to a Knowledge.npy snapshot. Each record is a pickled dict
+# of flat keys that replaces the same keys of the snapshot, so replaying every record over a snapshot taken
+# before or after some of them gives the same knowledge. compact() only marks the end of the journal, a
+# background thread replays the records up to the mark onto the snapshot on disk and drops them from the
+# journal, so the caller never pickles the whole knowledge. Both files are replaced with os.replace, so an
+# interrupted write never leaves a half written Knowledge.npy. An error of the background write is raised
+# by the next wait(), compact(), save() or close()
+class KnowledgeJournal(object):
+
+    def __init__(self, fname, compact_every=500):
+        self.fname = fname
+        self.journal_name = fname + '.journal'
+        self.compact_every = compact_every
+        self.records = 0
+        self.lock = threading.Lock()
+        self.thread = None
+        self.error = None
+        self.file = open(self.journal_name, 'ab')
+        self.file.seek(0, os.SEEK_END)
+
+    def append(self, record):
+        with self.lock:
+            pickle.dump(record, self.file, pickle.HIGHEST_PROTOCOL)
+            self.file.flush()
+        self.records += 1
+
+    def compact(self, wait=False):
+        self.wait()
+        with self.lock:
+            offset = self.file.tell()
+        self.records = 0
+        self.thread = threading.Thread(target=self.write_snapshot, args=(offset,))
+        self.thread.start()
+        if wait:
+            self.wait()
+
+    # Writes the full knowledge dict as the snapshot on the calling thread and empties the journal
+    def save(self, knowledge):
+        self.wait()
+        self.write_file(knowledge)
+        with self.lock:
+            offset = self.file.tell()
+            self.drop_records(offset)
+        self.records = 0
+
+    # Runs on the background thread. Any error is kept for wait() to raise on the caller's thread
+    def write_snapshot(self, offset):
+        try:
+            try:
+                knowledge = np.load(self.fname, allow_pickle=True).item()
+            except FileNotFoundError:
+                knowledge = dict()
+            for record in self.read(self.fname, offset):
+                knowledge.update(record)
+            self.write_file(knowledge)
+            with self.lock:
+                self.drop_records(offset)
+        except Exception as error:
+            self.error = error
+
+    def write_file(self, knowledge):
+        with open(self.fname + '.tmp', 'wb') as f:
+            np.save(f, knowledge)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.fname + '.tmp', self.fname)
+
+    # Keeps only the records appended after offset. Called with the lock held
+    def drop_records(self, offset):
+        self.file.close()
+        try:
+            with open(self.journal_name, 'rb') as f:
+                f.seek(offset)
+                rest = f.read()
+            with open(self.journal_name + '.tmp', 'wb') as f:
+                f.write(rest)
+            os.replace(self.journal_name + '.tmp', self.journal_name)
+        finally:
+            # reopened even when the rewrite failed, so append keeps working
+            self.file = open(self.journal_name, 'ab')
+            self.file.seek(0, os.SEEK_END)
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self.file.close()
+
+    # Records of <fname>.journal in write order, up to byte offset end. A record cut short by an interrupted
+    # write ends the replay
+    @staticmethod
+    def read(fname, end=None):
+        records = []
+        try:
+            with open(fname + '.journal', 'rb') as f:
+                while end is None or f.tell() < end:
+                    try:
+                        records.append(pickle.load(f))
+                    except (EOFError, pickle.UnpicklingError, ValueError):
+                        break
+        except FileNotFoundError:
+            pass
+        return records
+
+
+# The flat knowledge dict saved at fname, with the records of its journal replayed, or of a directory written by
+# save_columns. Tools that read Knowledge.npy directly would miss every change made since the last compaction
+def read_knowledge(fname):
+    if os.path.isdir(fname):
+        return Knowledge.load_columns(fname).to_dict()
+    knowledge = np.load(fname, allow_pickle=True).item()
+    for record in KnowledgeJournal.read(fname):
+        knowledge.update(record)
+    return knowledge
+
+
+# python knowledge.py Knowledge.npy Knowledge.cols converts a saved knowledge file (and its journal) to columns
+if __name__ == '__main__':
+    import sys
+    Knowledge.load(sys.argv[1]).save_columns(sys.argv[2])
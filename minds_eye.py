@@ -1,7 +1,7 @@
 from minds_eye_constants import *
 from minds_eye_game_objects import *
-import sys, os, glob
-import ast
+import sys
+from trace_log import latest_frames
 
 class PyGameView(object):
     '''
@@ -239,32 +239,20 @@ if __name__ == '__main__':
         running, there_is_input = controller.handle_input()
 
         if not len(plan_log):
-            try:
-                if not controller.mode:
-                    LatestFile = max(glob.iglob('./plan_log/*.txt'), key=os.path.getctime)
-                    view_mode = False
-                else:
-                    LatestFile = max(glob.iglob('./predict_log/*.txt'), key=os.path.getctime)
-                    view_mode = True
-
-                text_file = open(LatestFile, "r")
-                while True:
-                    line = text_file.readline()
-                    if line:
-                        plan_log.append(line)
-                    else:
-                        break
-                text_file.close()
-                log_len = len(plan_log)
-                log_current = 1
-            except ValueError:
-                pass
+            if not controller.mode:
+                plan_log = latest_frames('./plan_log')
+                view_mode = False
+            else:
+                plan_log = latest_frames('./predict_log')
+                view_mode = True
+            log_len = len(plan_log)
+            log_current = 1
         else:
 
             if not view_mode:
-                screen = ast.literal_eval(plan_log.pop())
+                screen = plan_log.pop()
             else:
-                screen = ast.literal_eval(plan_log.pop(0))
+                screen = plan_log.pop(0)
             model.update(screen)
 
             # display the view
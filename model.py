@@ -59,7 +59,7 @@ class Model(object):
 
         # dictionary of different subsymbolic visual input values
         # key: subsymoblic input value
-        # value: list of position tuples of locations of said subsymbolic input key
+        # value: tuple of position tuples of locations of said subsymbolic input key
         self.vis_count_pos = {}
 
         # fill self.vis_count with the frequency of input values in this vis_env
@@ -75,6 +75,10 @@ class Model(object):
                 if val not in self.vis_count_list:
                     self.vis_count_list.append(val)
 
+        # the position lists are never changed after this, models derived from this one share them
+        for val, positions in self.vis_count_pos.items():
+            self.vis_count_pos[val] = tuple(positions)
+
         # heap (specifically a min-heap) of different sub-symbolic input values
         # key: count,  value: subsymbolic input value
         self.vis_count_heap = list(map(lambda x: (x[1], x[0]),
@@ -85,38 +89,65 @@ class Model(object):
         # this model's vis_env to the airis's goal source value
         self.compare = None
 
+        # whether the visual / auxiliary inputs above belong to this model alone, see own_vis and own_aux
+        self.vis_owned = True
+        self.aux_owned = True
+
+    # copy on write: the new model shares the inputs of the source model, and whichever of the two
+    # changes them first through update_vis_value / update_aux_value makes its own copy
     def initialize_from_model(self, model):
 
         # visual and non-visual inputs of this model
-        self.vis_env = copy.deepcopy(model.vis_env)
-        self.aux_env = copy.deepcopy(model.aux_env)
+        self.vis_env = model.vis_env
+        self.aux_env = model.aux_env
 
         # copy the focus_value position from the source models
-        self.focus_pos = copy.deepcopy(model.focus_pos)
-        self.focus_value = copy.deepcopy(model.focus_value)
-        self.focus_value_is_aux = copy.deepcopy(model.focus_value_is_aux)
-        self.focus_index = copy.deepcopy(model.focus_index)
+        self.focus_pos = model.focus_pos
+        self.focus_value = model.focus_value
+        self.focus_value_is_aux = model.focus_value_is_aux
+        self.focus_index = model.focus_index
 
         # tally of how many of a particular visual subsymbolic input value
         # is in this model. (used to determine focus value)
         # In the puzzle game it counts how many walls, empty spaces, characters, etc.
-        self.vis_count = copy.deepcopy(model.vis_count)
+        self.vis_count = model.vis_count
 
         # list of different inputs its ever seen since birth
-        self.vis_count_list = copy.deepcopy(model.vis_count_list)
+        self.vis_count_list = model.vis_count_list
 
         # dictionary of different subsymbolic visual input values
         # key: subsymoblic input value
-        # value: list of position tuples of locations of said subsymbolic input key
-        self.vis_count_pos = copy.deepcopy(model.vis_count_pos)
+        # value: tuple of position tuples of locations of said subsymbolic input key
+        self.vis_count_pos = model.vis_count_pos
 
         # heap (specifically a min-heap) of different sub-symbolic input values
         # key: count,  value: subsymbolic input value
-        self.vis_count_heap = copy.deepcopy(model.vis_count_heap)
+        self.vis_count_heap = model.vis_count_heap
 
         # distance of the goal value in
         # this model's vis_env to the airis's goal source value
-        self.compare = copy.deepcopy(model.compare)
+        self.compare = model.compare
+
+        self.vis_owned = False
+        self.aux_owned = False
+        model.vis_owned = False
+        model.aux_owned = False
+
+    # copies the shared visual inputs before this model changes them. The position tuples in
+    # vis_count_pos are replaced rather than changed, so only the dict itself is copied
+    def own_vis(self):
+        if not self.vis_owned:
+            self.vis_env = copy.deepcopy(self.vis_env)
+            self.vis_count = dict(self.vis_count)
+            self.vis_count_list = list(self.vis_count_list)
+            self.vis_count_pos = dict(self.vis_count_pos)
+            self.vis_count_heap = list(self.vis_count_heap)
+            self.vis_owned = True
+
+    def own_aux(self):
+        if not self.aux_owned:
+            self.aux_env = copy.deepcopy(self.aux_env)
+            self.aux_owned = True
 
     def update_vis_value(self, posterior_val, value_pos, focus_value=None):
 
@@ -127,6 +158,8 @@ class Model(object):
         # vis_count_heap
         # vis_count_pos
 
+        self.own_vis()
+
         # get the actual prior for the focus index
         x, y = value_pos
         prior_val = self.vis_env[x][y]
@@ -145,8 +178,11 @@ class Model(object):
         heapq.heapify(self.vis_count_heap)
 
         # remove this pos from vis_count_pos
-        self.vis_count_pos[prior_val].remove((x, y))
-        if self.vis_count_pos[prior_val] == []:
+        positions = list(self.vis_count_pos[prior_val])
+        positions.remove((x, y))
+        if positions:
+            self.vis_count_pos[prior_val] = tuple(positions)
+        else:
             del self.vis_count_pos[prior_val]
 
         # set the value to the posterior
@@ -169,9 +205,9 @@ class Model(object):
 
         # add the posterior value to the model's vis_count_pos
         try:
-            self.vis_count_pos[posterior_val].append((x, y))
+            self.vis_count_pos[posterior_val] = self.vis_count_pos[posterior_val] + ((x, y),)
         except KeyError:
-            self.vis_count_pos[posterior_val] = [(x, y)]
+            self.vis_count_pos[posterior_val] = ((x, y),)
 
         #if the posterior value is the focus_value, return the new position of the focus_value
         if posterior_val == focus_value:
@@ -185,6 +221,8 @@ class Model(object):
         # aux_env
         # predicted_aux_change
 
+        self.own_aux()
+
         # get the actual prior and predicted posterior for the focus index
         prior_val = self.aux_env[focus_index]
 
@@ -207,6 +245,9 @@ class Model(object):
                     new_line_end=False,
                     draw_line=DEFAULT_DRAW_LINE):
 
+        if not DEBUG_LOGGING:
+            return
+
         if title:
             pprint(title, indent=indent, num_indents=num_indents,
                 new_line_start=new_line_start, draw_line=draw_line)
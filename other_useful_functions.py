@@ -1,12 +1,31 @@
 import numpy as np
 import heapq
 import re
+import atexit
 from numba import vectorize
 from constants import *
 
+# True when pprint writes anywhere. log, print_vis_env and print_aux_env return at once when it is off
+DEBUG_LOGGING = DEBUG_WITH_CONSOLE or DEBUG_WITH_LOGFILE
+
+# DEBUG_LOGFILE_PATH stays open for appending once pprint first writes to it, until the interpreter exits
+debug_logfile = None
+
+
+def close_debug_logfile():
+    global debug_logfile
+    if debug_logfile is not None:
+        debug_logfile.close()
+        debug_logfile = None
+
+
+atexit.register(close_debug_logfile)
+
+
 # cleaner way to print things
 def pprint(string='', indent=DEFAULT_INDENT, num_indents=0,
            new_line_start=False, new_line_end=False, draw_line=DEFAULT_DRAW_LINE):
+    global debug_logfile
 
     if DEBUG_WITH_CONSOLE:
 
@@ -23,7 +42,9 @@ def pprint(string='', indent=DEFAULT_INDENT, num_indents=0,
 
     if DEBUG_WITH_LOGFILE:
 
-        f = open(DEBUG_LOGFILE_PATH, 'a')
+        if debug_logfile is None:
+            debug_logfile = open(DEBUG_LOGFILE_PATH, 'a', buffering=1)
+        f = debug_logfile
 
         new_indent = '\t'
 
@@ -43,13 +64,28 @@ def pprint(string='', indent=DEFAULT_INDENT, num_indents=0,
         if new_line_end:
             f.write((total_indent1 if draw_line else total_indent0) + '\n')
 
-        f.close()
+# pprint of string % args, formatted only when logging is on. Arguments are passed as they are, so
+# log('x: %s', x) costs a call when logging is off where pprint('x: ' + str(x)) would build the string
+def log(string='', *args, indent=DEFAULT_INDENT, num_indents=0,
+        new_line_start=False, new_line_end=False, draw_line=DEFAULT_DRAW_LINE):
+
+    if not DEBUG_LOGGING:
+        return
+
+    if args:
+        string = string % args
+
+    pprint(string, indent=indent, num_indents=num_indents,
+           new_line_start=new_line_start, new_line_end=new_line_end, draw_line=draw_line)
 
 # pretty prints the 2d numpy array env
 def print_vis_env(env, title=None, indent=DEFAULT_INDENT, num_indents=0,
                   new_line_start=False, new_line_end=False,
                   draw_line=DEFAULT_DRAW_LINE):
 
+    if not DEBUG_LOGGING:
+        return
+
     if title:
         pprint(title, indent=indent, num_indents=num_indents,
             new_line_start=new_line_start, draw_line=draw_line)
@@ -75,6 +111,9 @@ def print_aux_env(env, title=None, indent=DEFAULT_INDENT, num_indents=0,
                   new_line_start=False, new_line_end=False,
                   draw_line=DEFAULT_DRAW_LINE):
 
+    if not DEBUG_LOGGING:
+        return
+
     if title:
         pprint(title, indent=indent, num_indents=num_indents,
             new_line_start=new_line_start, draw_line=draw_line)
@@ -1242,6 +1242,7 @@ if __name__ == '__main__':
     # pygame setup
     ai_controlled = False  # True
     approval_mode = False
+    minds_eye = False  # trace plans and predicted states for minds_eye.py
     pygame.init()
     pygame.display.set_caption('Ai '+str(id(pygame)))
     controller = PyGameKeyboardController()
@@ -1249,6 +1250,8 @@ if __name__ == '__main__':
     if ai_controlled:
         controller.time_slow = False
     model = Model(controller, ai_controlled)
+    if minds_eye:
+        model.airis.start_trace()
     if GAME_SHOW_SCREEN:
         view = PyGameView(model)
 
@@ -572,6 +572,7 @@ if __name__ == '__main__':
     # pygame setup
     airis_controlled = True
     approval_mode = False
+    minds_eye = False  # trace plans and predicted states for minds_eye.py
     pygame.init()
     pygame.display.set_caption('Airis '+str(id(pygame)))
     controller = PyGameKeyboardController()
@@ -579,6 +580,8 @@ if __name__ == '__main__':
     if airis_controlled:
         controller.time_slow = False
     model = Model(controller, airis_controlled)
+    if minds_eye:
+        model.airis.start_trace()
     if GAME_SHOW_SCREEN:
         view = PyGameView(model)
 
@@ -0,0 +1,364 @@
+import heapq
+import numpy as np
+
+
+# Heap of (-similarity, key) of the 1D values in oval_data to oval, as built by AIRIS.predict_rules
+def similar_1d(oval_data, oval):
+    di_heap = []
+    for key in oval_data.keys():
+        if key != 0 and oval != 0:
+            if key > 0 and oval > 0:
+                if key < oval:
+                    heapq.heappush(di_heap, (-(key / oval), key))
+                else:
+                    heapq.heappush(di_heap, (-(oval / key), key))
+            elif key < 0 and oval < 0:
+                if key > oval:
+                    heapq.heappush(di_heap, (-(-key / -oval), key))
+                else:
+                    heapq.heappush(di_heap, (-(-oval / -key), key))
+            else:
+                if oval < 0:
+                    hold_val = -oval + key
+                    heapq.heappush(di_heap, (-(key / hold_val), key))
+                else:
+                    hold_val = -key + oval
+                    heapq.heappush(di_heap, (-(oval / hold_val), key))
+        else:
+            heapq.heappush(di_heap, (0, key))
+    return di_heap
+
+
+# (match, uncertainty) additions of one 1D index. uncertainty is None when nothing is added
+def score_1d(oval_data, oval):
+    try:
+        check = oval_data[oval]
+        return [(1, None)]
+    except KeyError:
+        di_heap = similar_1d(oval_data, oval)
+        if di_heap:
+            if -(di_heap[0][0]) != 1:
+                if di_heap[0][0] != 0:
+                    return [(-(di_heap[0][0]), -(di_heap[0][0]))]
+                return [(-(di_heap[0][0]), 1)]
+            return [(1, None)]
+    return []
+
+
+# Offsets grouped by the neighbour they look at, in the order the rule first mentions them.
+# Returns the x / y offsets and expected values of every condition and where each neighbour starts
+def compile_conditions(conditions):
+    slots = dict()
+    for crx, cry, cod, cor in conditions:
+        slots.setdefault((crx, cry), []).append(cod)
+    dx = []
+    dy = []
+    cods = []
+    starts = []
+    for (crx, cry), values in slots.items():
+        starts.append(len(dx))
+        for cod in values:
+            dx.append(crx)
+            dy.append(cry)
+            cods.append(cod)
+    return dx, dy, cods, starts
+
+
+# Condition stencils of every rule (inclusions) and exception (rel) of one value, concatenated so a whole
+# batch of cells is scored with a handful of numpy operations
+class ValueStencil(object):
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.units = []
+        self.rule_units = []
+        self.exception_units = []
+        for group in rules:
+            self.rule_units.append(len(self.units))
+            self.units.append(group.inclusions)
+            units = []
+            for exception_group in group.exceptions:
+                units.append(len(self.units))
+                self.units.append(group.exception_groups[exception_group].rel)
+            self.exception_units.append(units)
+
+        dx = []
+        dy = []
+        cods = []
+        cond_unit = []
+        key_starts = []
+        key_unit = []
+        key_slot = []
+        self.key_counts = []
+        for unit, conditions in enumerate(self.units):
+            unit_dx, unit_dy, unit_cods, unit_starts = compile_conditions(conditions)
+            for slot, start in enumerate(unit_starts):
+                key_starts.append(len(dx) + start)
+                key_unit.append(unit)
+                key_slot.append(slot + 1)
+            dx += unit_dx
+            dy += unit_dy
+            cods += unit_cods
+            cond_unit += [unit] * len(unit_dx)
+            self.key_counts.append(len(unit_starts))
+
+        self.dx = np.array(dx, dtype=np.int64)
+        self.dy = np.array(dy, dtype=np.int64)
+        self.cods = np.array(cods, dtype=np.float64)
+        self.key_starts = np.array(key_starts, dtype=np.int64)
+        self.key_unit = np.array(key_unit, dtype=np.int64)
+        self.key_slot = np.array(key_slot, dtype=np.int64)
+        self.slots = max(self.key_counts, default=0) + 1
+        self.cond_onehot = np.zeros((len(dx), len(self.units)))
+        self.cond_onehot[np.arange(len(dx)), cond_unit] = 1
+        self.key_onehot = np.zeros((len(key_starts), len(self.units)))
+        self.key_onehot[np.arange(len(key_starts)), key_unit] = 1
+
+
+# Vectorized replacement for the rule loop of AIRIS.predict_rules, used when AIRIS.vectorized_predict is set.
+# Scores of every rule and exception of a value are computed for all of the initially checked cells holding
+# that value the first time one of them is visited. Sums are taken in the same order as the reference loop,
+# so the tuples pushed to predict_heap_2d are identical
+class RuleMatcher(object):
+
+    def __init__(self, knowledge, stencils, input_2d, input_1d, base_input_1d, act, check_pos):
+        self.knowledge = knowledge
+        self.stencils = stencils
+        self.grid = np.array(input_2d, dtype=np.float64)
+        if self.grid.ndim != 2:
+            raise ValueError('input_2D is not rectangular')
+        self.width, self.height = self.grid.shape
+        self.input_1d = input_1d
+        self.base_input_1d = base_input_1d
+        self.act = act
+        self.check_pos = check_pos
+        self.batches = dict()
+        self.rule_data = dict()
+
+    # Compiled stencil of the rules of val, rebuilt whenever a rule of val changed
+    def stencil(self, val, rules):
+        version = self.knowledge.versions.get(val, 0)
+        try:
+            stencil_version, stencil = self.stencils[val]
+            if stencil_version == version and stencil.rules is rules and len(stencil.rules) == len(rules):
+                return stencil
+        except KeyError:
+            pass
+        stencil = ValueStencil(rules)
+        self.stencils[val] = (version, stencil)
+        return stencil
+
+    # Cell independent part of a rule: act check, change type and 1D scores
+    def rule(self, group):
+        try:
+            return self.rule_data[group.handle()]
+        except KeyError:
+            pass
+
+        data = dict()
+        try:
+            act_data = group.act[self.act]
+            if act_data[0] / act_data[1] == 1:
+                data['match'] = 1
+                data['count'] = 1
+            else:
+                data['match'] = 0
+                data['count'] = 0
+        except KeyError:
+            data['skip'] = True
+
+        if 'skip' not in data:
+            try:
+                self.rule_scores(group, data)
+            except Exception as error:
+                # raised again by push_cell once the reference loop would have reached the same statement
+                data['error'] = error
+
+        self.rule_data[group.handle()] = data
+        return data
+
+    # Change type, 1D scores and exception act / 1D scores of a rule whose act matched
+    def rule_scores(self, group, data):
+        rel_heap = []
+        rel_data = group.rel
+        for rel_key in rel_data.keys():
+            heapq.heappush(rel_heap, (-(rel_data[rel_key][0] / rel_data[rel_key][1]), rel_key))
+        data['rel_heap'] = rel_heap
+        if rel_heap:
+            data['change_type'] = ('rel', rel_heap[0][1])
+            if data['change_type'][1] == 0:
+                data['match'] = data['count']
+
+        adds = []
+        template = dict()
+        if group.dims_1d is not None:
+            for di in group.dims_1d:
+                template[di] = []
+                group_1d = group.rules_1d[di]
+                adds += score_1d(group_1d.oval, self.input_1d[di])
+                rel_1d_data = group_1d.rel
+                for rel_key in rel_1d_data.keys():
+                    heapq.heappush(template[di], (-(rel_1d_data[rel_key][0] / rel_1d_data[rel_key][1]), 'rel', rel_key, group_1d.index, self.base_input_1d[di]))
+        data['adds_1d'] = adds
+        data['template_1d'] = template
+
+        exceptions = []
+        for exception_group in group.exceptions:
+            exception_data = group.exception_groups[exception_group]
+            exception_act_data = exception_data.act
+            match = 0
+            count = 0
+            try:
+                if exception_act_data[self.act][0] / exception_act_data[self.act][1] == 1:
+                    match += 1
+                    count += 1
+            except KeyError:
+                if len(exception_act_data.keys()) == 0:
+                    match += 1
+                count += 1
+
+            exception_adds = []
+            try:
+                rule_1d_data = group.dims_1d or ()
+                for di in rule_1d_data:
+                    group_1d = group.rules_1d[di]
+                    exception_adds += score_1d(group_1d.exception_oval[exception_group], self.input_1d[di])
+            except KeyError:
+                pass
+            exceptions.append((exception_group, match, count, exception_adds))
+        data['exceptions'] = exceptions
+
+    # Scores of every unit of the stencil for the cells (xs, ys): whether all rule conditions are inside
+    # the grid, match and uncertainty sums and whether the uncertainty picked up a float
+    def batch(self, val, rules, xs, ys):
+        stencil = self.stencil(val, rules)
+        n = len(xs)
+        units = len(stencil.units)
+
+        starts = np.zeros(units)
+        for ri, group in enumerate(rules):
+            data = self.rule(group)
+            if 'skip' not in data and 'error' not in data:
+                starts[stencil.rule_units[ri]] = data['match']
+                for ei, unit in enumerate(stencil.exception_units[ri]):
+                    starts[unit] = data['exceptions'][ei][1]
+
+        gx = xs[:, None] + stencil.dx[None, :]
+        gy = ys[:, None] + stencil.dy[None, :]
+        # python lists wrap negative indexes, anything further out raised IndexError
+        inside = (gx >= -self.width) & (gx < self.width) & (gy >= -self.height) & (gy < self.height)
+        gx = np.where(inside, np.where(gx < 0, gx + self.width, gx), 0)
+        gy = np.where(inside, np.where(gy < 0, gy + self.height, gy), 0)
+        found = self.grid[gx, gy]
+        cods = stencil.cods[None, :]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(cods < found, cods / found, found / cods)
+        sim = np.where(found == cods, 1.0, np.where((cods != 0) & (found != 0), ratio, 0.0))
+        sim = np.where(inside, sim, 0.0)
+        outside = (~inside).astype(np.float64) @ stencil.cond_onehot
+
+        match = np.zeros((n, units, stencil.slots))
+        match[:, :, 0] = starts[None, :]
+        uncertainty = np.zeros((n, units, stencil.slots))
+        floats = np.zeros((n, units))
+        if len(stencil.key_starts):
+            best = np.maximum.reduceat(sim, stencil.key_starts, axis=1)
+            match[:, stencil.key_unit, stencil.key_slot] = best
+            uncertainty[:, stencil.key_unit, stencil.key_slot] = np.where(best == 1, 0.0, np.where(best == 0, 1.0, best))
+            floats = ((best != 1) & (best != 0)).astype(np.float64) @ stencil.key_onehot
+
+        # cumsum adds strictly left to right, like the += of the reference loop
+        match = np.cumsum(match, axis=2)[:, :, -1]
+        uncertainty = np.cumsum(uncertainty, axis=2)[:, :, -1]
+        return stencil, outside, match, uncertainty, floats > 0
+
+    # Scores of the cell (dix, diy) as plain python lists, one entry per stencil unit
+    def cell(self, val, rules, dix, diy):
+        try:
+            result, i = self.batches[val][dix, diy]
+        except KeyError:
+            if val not in self.batches:
+                cells = [pos for pos in self.check_pos if -self.width <= pos[0] < self.width and -self.height <= pos[1] < self.height and self.grid[pos[0], pos[1]] == val]
+                if (dix, diy) not in cells:
+                    cells.append((dix, diy))
+                result = self.batch(val, rules, np.array([pos[0] for pos in cells], dtype=np.int64), np.array([pos[1] for pos in cells], dtype=np.int64))
+                self.batches[val] = dict()
+                for i, pos in enumerate(cells):
+                    self.batches[val][pos] = (result, i)
+            else:
+                result = self.batch(val, rules, np.array([dix], dtype=np.int64), np.array([diy], dtype=np.int64))
+                self.batches[val][dix, diy] = (result, 0)
+            result, i = self.batches[val][dix, diy]
+        stencil, outside, match, uncertainty, floats = result
+        return stencil, outside[i].tolist(), match[i].tolist(), uncertainty[i].tolist(), floats[i].tolist()
+
+    # Pushes the candidates of every rule of val at (dix, diy) to predict_heap_2d. Returns the 1D prediction
+    # dict of the last rule scored, which predict_rules hands back as predict_rule_1d, or None
+    def push_cell(self, rules, val, dix, diy, predict_heap_2d):
+        last_1d = None
+        loc_key = str(dix) + ':' + str(diy)
+        stencil, outside, match_sums, uncertainty_sums, floats = self.cell(val, rules, dix, diy)
+
+        for ri, group_data in enumerate(rules):
+            rule = group_data.id
+            condition_group = group_data.index
+            if group_data.combined:
+                continue
+
+            abs_pos = False
+            if group_data.apos:
+                if loc_key in group_data.apos:
+                    abs_pos = True
+                else:
+                    continue
+
+            unit = stencil.rule_units[ri]
+            if outside[unit]:
+                continue
+
+            data = self.rule(group_data)
+            if 'skip' in data:
+                continue
+            if 'error' in data:
+                raise data['error']
+
+            change_type = ('rel', data['rel_heap'][0][1])
+            match = match_sums[unit]
+            uncertainty = uncertainty_sums[unit]
+            if not floats[unit]:
+                uncertainty = int(uncertainty)
+            match_count = data['count'] + stencil.key_counts[unit]
+            for match_add, uncertainty_add in data['adds_1d']:
+                match += match_add
+                if uncertainty_add is not None:
+                    uncertainty += uncertainty_add
+                match_count += 1
+
+            predict_rule_1d = dict()
+            for di, heap in data['template_1d'].items():
+                predict_rule_1d[di] = list(heap)
+            last_1d = predict_rule_1d
+
+            exception_heap = []
+            for ei, (exception_group, exception_match, exception_match_count, exception_adds) in enumerate(data['exceptions']):
+                exception_unit = stencil.exception_units[ri][ei]
+                exception_match = match_sums[exception_unit]
+                exception_uncertainty = uncertainty_sums[exception_unit]
+                if not floats[exception_unit]:
+                    exception_uncertainty = int(exception_uncertainty)
+                exception_match_count += stencil.key_counts[exception_unit]
+                for match_add, uncertainty_add in exception_adds:
+                    exception_match += match_add
+                    if uncertainty_add is not None:
+                        exception_uncertainty += uncertainty_add
+                    exception_match_count += 1
+                heapq.heappush(exception_heap, (-(exception_match / exception_match_count), rule, condition_group, exception_group, loc_key, exception_uncertainty, predict_rule_1d, dix, diy, val))
+
+            if exception_heap:
+                heapq.heappush(predict_heap_2d, (-(match / match_count), rule, condition_group, change_type, abs_pos, loc_key, uncertainty, predict_rule_1d, dix, diy, exception_heap[0], val))
+            elif change_type[1] == 0:
+                heapq.heappush(predict_heap_2d, (-(match / match_count), rule, condition_group, change_type, abs_pos, loc_key, uncertainty, predict_rule_1d, dix, diy, [0], val))
+            else:
+                heapq.heappush(predict_heap_2d, (-(match / match_count), rule, condition_group, change_type, abs_pos, loc_key, uncertainty, predict_rule_1d, dix, diy, [1], val))
+
+        return last_1d
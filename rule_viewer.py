@@ -1,7 +1,8 @@
 import numpy as np
 import sys
+from knowledge import read_knowledge, rule_key
 
-knowledge = np.load('Knowledge.npy', allow_pickle=True).item()
+knowledge = read_knowledge('Knowledge.npy')
 sys.stdout = open('./rules_view.txt', 'w')
 rule_count = 0
 exception_count = 0
@@ -16,8 +17,8 @@ for val in knowledge['2d{']:
     else:
         print(print('\nNew Value ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++'))
         for rule_id in knowledge['2d/' + str(val)]:
-            cond_group = knowledge['2d/' + str(val) + '/' + str(rule_id)]
-            if rule_id[:2:] == 'c-':
+            cond_group = knowledge[rule_key('2d/' + str(val), rule_id)]
+            if str(rule_id)[:2:] == 'c-':
                 combine_count += 1
             if rule_act is not None:
                 try:
@@ -40,17 +41,17 @@ for val in knowledge['2d{']:
             except KeyError:
                 print('Last Rules: NONE')
             try:
-                group1d = knowledge['1d/0/' + str(rule_id)]
+                group1d = knowledge[rule_key('1d/0', rule_id)]
                 print('Keys needed:', knowledge['1d/0/' + str(group1d) + '/oval'])
                 print('Keys rel change:', knowledge['1d/0/' + str(group1d) + '/rel'])
                 print('Keys abs change:', knowledge['1d/0/' + str(group1d) + '/abs'])
 
-                group1d = knowledge['1d/1/' + str(rule_id)]
+                group1d = knowledge[rule_key('1d/1', rule_id)]
                 print('Extinguishers needed:', knowledge['1d/1/' + str(group1d) + '/oval'])
                 print('Extinguishers rel change:', knowledge['1d/1/' + str(group1d) + '/rel'])
                 print('Extinguishers abs change:', knowledge['1d/1/' + str(group1d) + '/abs'])
 
-                group1d = knowledge['1d/2/' + str(rule_id)]
+                group1d = knowledge[rule_key('1d/2', rule_id)]
                 print('Batteries needed:', knowledge['1d/2/' + str(group1d) + '/oval'])
                 print('Batteries rel change:', knowledge['1d/2/' + str(group1d) + '/rel'])
                 print('Batteries abs change:', knowledge['1d/2/' + str(group1d) + '/abs'])
@@ -58,11 +59,11 @@ for val in knowledge['2d{']:
                 pass
             print('Inclusions Relative:', knowledge['2d/' + str(val) + '/' + str(cond_group) + '/inclusions/rel'])
             try:
-                print('Combined from:', knowledge['combined/' + rule_id])
+                print('Combined from:', knowledge['combined/' + str(rule_id)])
             except KeyError:
                 pass
             try:
-                print('Exclusions: ', knowledge['exclusions/' + rule_id])
+                print('Exclusions: ', knowledge['exclusions/' + str(rule_id)])
             except KeyError:
                 pass
             try:
@@ -162,15 +163,15 @@ for val in knowledge['2d{']:
                     except KeyError:
                         print('Exception Last Rules: NONE')
 
-                    group1d = knowledge['1d/0/' + str(rule_id)]
+                    group1d = knowledge[rule_key('1d/0', rule_id)]
                     print('Keys needed:', knowledge['1d/0/' + str(group1d) + '/exceptions/' + str(exception_id) + '/oval'])
                     print('Keys rel change:', knowledge['1d/0/' + str(group1d) + '/exceptions/' + str(exception_id) + '/rel'])
 
-                    group1d = knowledge['1d/1/' + str(rule_id)]
+                    group1d = knowledge[rule_key('1d/1', rule_id)]
                     print('Extinguishers needed:', knowledge['1d/1/' + str(group1d) + '/exceptions/' + str(exception_id) + '/oval'])
                     print('Extinguishers rel change:', knowledge['1d/1/' + str(group1d) + '/exceptions/' + str(exception_id) + '/rel'])
 
-                    group1d = knowledge['1d/2/' + str(rule_id)]
+                    group1d = knowledge[rule_key('1d/2', rule_id)]
                     print('Batteries needed:', knowledge['1d/2/' + str(group1d) + '/exceptions/' + str(exception_id) + '/oval'])
                     print('Batteries rel change:', knowledge['1d/2/' + str(group1d) + '/exceptions/' + str(exception_id) + '/rel'])
 
@@ -0,0 +1,45 @@
+import copy
+import hashlib
+import numpy as np
+
+
+# Content addressed store for raw observations (airis_stable rule oraw / lraw, airis_aux condition
+# vis_data / aux_data). Every distinct observation is kept once under the digest of its contents and
+# whoever stores it holds the shared copy. Equal observations then cost one object in memory, and one
+# entry in Knowledge.npy since pickle writes a shared object only once
+class SnapshotStore(object):
+
+    def __init__(self):
+        self.snapshots = dict()
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    # numpy arrays are addressed by dtype, shape and raw bytes, anything else (the nested lists of
+    # airis_stable) by its repr so that ints and floats never end up sharing an entry
+    @staticmethod
+    def digest(data):
+        if isinstance(data, np.ndarray):
+            content = (data.dtype.str + str(data.shape)).encode() + np.ascontiguousarray(data).tobytes()
+        else:
+            content = repr(data).encode()
+        return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+    # Returns the id of data, storing a copy the first time it is seen. Stored arrays are read only
+    def add(self, data):
+        snapshot_id = self.digest(data)
+        if snapshot_id not in self.snapshots:
+            if isinstance(data, np.ndarray):
+                snapshot = np.array(data)
+                snapshot.setflags(write=False)
+            else:
+                snapshot = copy.deepcopy(data)
+            self.snapshots[snapshot_id] = snapshot
+        return snapshot_id
+
+    def get(self, snapshot_id):
+        return self.snapshots[snapshot_id]
+
+    # The shared copy of data
+    def intern(self, data):
+        return self.snapshots[self.add(data)]
@@ -1,13 +1,105 @@
-from collections import Counter, defaultdict
-from copy import deepcopy
+from collections import Counter, defaultdict, OrderedDict
+from bisect import insort
 import numpy as np
+import hashlib
 import heapq
 
+
+# Copy of a 2D input. The values are immutable, so copying the rows is enough
+def copy_2d(env2):
+    if isinstance(env2, np.ndarray):
+        return env2.copy()
+    return [list(row) for row in env2]
+
+
+# 64 bit key of value val at (x, y). Keys come from the repr, so 1 and 1.0 get different keys just like
+# they did when states were compared by str(input_2D)
+cell_keys = dict()
+
+
+def cell_key(x, y, val):
+    try:
+        return cell_keys[x, y, val, type(val)]
+    except KeyError:
+        key = int.from_bytes(hashlib.blake2b(repr((x, y, val)).encode(), digest_size=8).digest(), 'little')
+        cell_keys[x, y, val, type(val)] = key
+        return key
+
+
+# Zobrist hash of a 2D input, the xor of the keys of all its cells
+def hash_2d(input_2D):
+    zobrist = 0
+    for x, row in enumerate(input_2D):
+        for y, val in enumerate(row):
+            zobrist ^= cell_key(x, y, val)
+    return zobrist
+
+
+# Contents of every hash handed out while State.verify_hashes is set
+hash_contents = dict()
+
+
+# 128 bit hash of a state, 64 bits for input_1D and the Zobrist hash of input_2D. state_history and the
+# duplicate check of make_plan store these instead of the str of both inputs
+def state_hash(input_1D, input_2D, zobrist=None):
+    if zobrist is None:
+        zobrist = hash_2d(input_2D)
+    hash_1d = int.from_bytes(hashlib.blake2b(str(input_1D).encode(), digest_size=8).digest(), 'little')
+    state_id = (hash_1d << 64) | zobrist
+    if State.verify_hashes:
+        contents = (str(input_1D), str(input_2D))
+        if hash_contents.setdefault(state_id, contents) != contents:
+            raise ValueError('state hash collision between ' + str(contents) + ' and ' + str(hash_contents[state_id]))
+    return state_id
+
+
+# Manhattan distance maps of input_2D_idx position lists, keyed by the id of the list and the grid shape.
+# A derived state shares the lists of the values set_2d did not move with the state it was predicted from,
+# so it shares their maps as well. An entry holds on to its list, which keeps the id from being reused
+distance_maps = OrderedDict()
+
+
+# Distance from every cell of a rows x cols grid to the closest of positions, as nested lists
+def distance_map(positions, rows, cols):
+    far = rows + cols
+    mask = np.zeros((rows, cols), dtype=bool)
+    xs, ys = zip(*positions)
+    mask[list(xs), list(ys)] = True
+    row_range = np.arange(rows)
+    col_range = np.arange(cols)
+    # closest position in the same column, then the closest of those over all columns
+    col_dist = np.where(mask[None, :, :], np.abs(row_range[:, None] - row_range[None, :])[:, :, None], far).min(axis=1)
+    dist = (col_dist[:, None, :] + np.abs(col_range[:, None] - col_range[None, :])[None, :, :]).min(axis=2)
+    return dist.tolist()
+
+
+# Derived states whose input_2D is currently materialized, oldest first. Past State.grid_budget the oldest
+# grid is dropped and rebuilt from the parent state the next time it is read
+materialized = OrderedDict()
+
+
 class State(object):
 
+    grid_budget = 4096
+    # Number of distance maps kept, least recently used are dropped first. Shorter position lists than
+    # distance_scan are scanned instead, building a map costs more than a few scans of them
+    distance_budget = 1024
+    distance_scan = 16
+    # Keep the contents behind every hash and raise ValueError when two different states share one
+    verify_hashes = False
+
+    # Planning creates a State for every predicted step, __slots__ keeps them small
+    __slots__ = ('input_1D', '_input_2D', 'parent', 'delta_2d', 'zobrist', 'action', 'prev_state', 'prev_action', 'change_1D', 'change_2D', 'uncertainty',
+                 'step', 'input_2D_idx', 'applied_rules', 'applied_exceptions', 'applied_exception_ids', 'applied_rule_ids',
+                 'anti_goal', 'last_1D', 'last_2D', 'compare', 'confidence', 'last_pos_change_2d', 'no_change', 'bad_rules',
+                 'check_set')
+
     def __init__(self, env1, env2, env2indexes, act, prev, step, last_pos_change_2d, prev_action):
         self.input_1D = env1.copy()
-        self.input_2D = deepcopy(env2)
+        self._input_2D = copy_2d(env2)
+        self.parent = None
+        self.delta_2d = dict()
+        self.zobrist = hash_2d(self._input_2D)
         self.action = act
         self.prev_state = prev
         self.prev_action = prev_action
@@ -15,10 +107,8 @@ class State(object):
         self.change_2D = []
         self.uncertainty = 0
         self.step = step
-        self.input_2D_idx = deepcopy(env2indexes)
-        self.input_2D_heap = []
-        for key in self.input_2D_idx.keys():
-            heapq.heappush(self.input_2D_heap, (len(self.input_2D_idx[key]), key))
+        # The position lists are shared with env2indexes, set_2d replaces a list instead of changing it
+        self.input_2D_idx = defaultdict(list, env2indexes)
         self.applied_rules = dict()
         self.applied_exceptions = dict()
         self.applied_exception_ids = set()
@@ -33,14 +123,142 @@ class State(object):
         self.bad_rules = []
         self.check_set = set()
 
+    # A state predicted from base. It only keeps the cells set_2d changed relative to base, input_2D is
+    # built from those on demand
+    @classmethod
+    def derive(cls, base, act, prev, step, last_pos_change_2d, prev_action):
+        state = cls.__new__(cls)
+        state.input_1D = base.input_1D.copy()
+        state._input_2D = None
+        state.parent = base
+        state.delta_2d = dict()
+        state.zobrist = base.zobrist
+        state.action = act
+        state.prev_state = prev
+        state.prev_action = prev_action
+        state.change_1D = []
+        state.change_2D = []
+        state.uncertainty = 0
+        state.step = step
+        state.input_2D_idx = defaultdict(list, base.input_2D_idx)
+        state.applied_rules = dict()
+        state.applied_exceptions = dict()
+        state.applied_exception_ids = set()
+        state.applied_rule_ids = set()
+        state.anti_goal = False
+        state.last_1D = []
+        state.last_2D = []
+        state.compare = None
+        state.confidence = None
+        state.last_pos_change_2d = last_pos_change_2d
+        state.no_change = False
+        state.bad_rules = []
+        state.check_set = set()
+        return state
+
+    @property
+    def input_2D(self):
+        if self._input_2D is None:
+            self.materialize()
+        return self._input_2D
+
+    # Setting a whole grid detaches the state from its parent
+    @input_2D.setter
+    def input_2D(self, env2):
+        materialized.pop(id(self), None)
+        self._input_2D = env2
+        self.parent = None
+        self.delta_2d = dict()
+        self.zobrist = hash_2d(env2)
+
+    # Builds input_2D from the closest materialized ancestor. Unchanged rows are shared with the parent grid
+    def materialize(self):
+        chain = []
+        state = self
+        while state._input_2D is None:
+            chain.append(state)
+            state = state.parent
+        grid = state._input_2D
+        for state in reversed(chain):
+            grid = list(grid)
+            for x in set(pos[0] for pos in state.delta_2d):
+                grid[x] = list(grid[x])
+            for (x, y), val in state.delta_2d.items():
+                grid[x][y] = val
+            state._input_2D = grid
+            materialized[id(state)] = state
+        while len(materialized) > State.grid_budget:
+            key, state = materialized.popitem(last=False)
+            state._input_2D = None
+
+    # Forgets a state make_plan dropped, the materialized FIFO would otherwise keep it alive
+    def release(self):
+        materialized.pop(id(self), None)
+
     def hash(self):
-        return str(self.input_1D), str(self.input_2D)
+        return state_hash(self.input_1D, self.input_2D if State.verify_hashes else None, self.zobrist)
+
+    # Manhattan distance from (x, y) to the closest position of val, None if val is not in input_2D. (x, y)
+    # may lie outside the grid
+    def distance(self, val, x, y):
+        positions = self.input_2D_idx.get(val)
+        if not positions:
+            return None
+        if len(positions) < State.distance_scan:
+            return min(abs(pos[0] - x) + abs(pos[1] - y) for pos in positions)
+        rows = len(self.input_2D)
+        cols = len(self.input_2D[0])
+        key = (id(positions), rows, cols)
+        try:
+            dist = distance_maps[key][1]
+            distance_maps.move_to_end(key)
+        except KeyError:
+            dist = distance_map(positions, rows, cols)
+            distance_maps[key] = (positions, dist)
+            if len(distance_maps) > State.distance_budget:
+                distance_maps.popitem(last=False)
+        near_x = min(max(x, 0), rows - 1)
+        near_y = min(max(y, 0), cols - 1)
+        return dist[near_x][near_y] + abs(x - near_x) + abs(y - near_y)
+
+    # (number of positions, value) heap of the values in input_2D
+    @property
+    def input_2D_heap(self):
+        input_2D_heap = []
+        for key in self.input_2D_idx.keys():
+            heapq.heappush(input_2D_heap, (len(self.input_2D_idx[key]), key))
+        return input_2D_heap
 
+    # Rebuilds input_2D_idx from input_2D
     def heap(self):
-        self.input_2D_heap = []
         self.input_2D_idx = defaultdict(list)
         for pos, val in np.ndenumerate(self.input_2D):
             self.input_2D_idx[val].append(pos)
 
-        for key in self.input_2D_idx.keys():
-            heapq.heappush(self.input_2D_heap, (len(self.input_2D_idx[key]), key))
+    # Sets input_2D[x][y] to val and moves the position in input_2D_idx, keeping every list in the row major
+    # order heap() builds it in
+    def set_2d(self, x, y, val):
+        if x < 0:
+            x += len(self.input_2D)
+        if y < 0:
+            y += len(self.input_2D[x])
+        old_val = self.input_2D[x][y]
+        # rows can be shared with the parent or derived states, so the row is replaced, not changed
+        row = list(self._input_2D[x])
+        row[y] = val
+        self._input_2D[x] = row
+        self.zobrist ^= cell_key(x, y, old_val) ^ cell_key(x, y, val)
+        if self.parent is not None:
+            self.delta_2d[x, y] = val
+        if old_val == val:
+            return
+
+        positions = [pos for pos in self.input_2D_idx[old_val] if pos != (x, y)]
+        if positions:
+            self.input_2D_idx[old_val] = positions
+        else:
+            del self.input_2D_idx[old_val]
+
+        positions = list(self.input_2D_idx.get(val, ()))
+        insort(positions, (x, y))
+        self.input_2D_idx[val] = positions
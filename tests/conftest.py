@@ -0,0 +1,42 @@
+import os
+import sys
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+# The modules live at the root of the repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from airis_stable import AIRIS
+from state import State
+
+
+# Puzzle game knowledge shipped with the repository, saved with the older uuid string rule ids
+@pytest.fixture
+def trained_path():
+    return os.path.join(ROOT, 'Knowledge - Trained Copy.npy')
+
+
+# Makes an airis_stable AIRIS with the trained knowledge, observing the state the trained rule rule_id was made
+# from as state 0 with every position to check
+@pytest.fixture
+def airis_at(trained_path):
+    def airis_at(rule_id=0):
+        airis = AIRIS([], [], ['up', 'down', 'left', 'right'])
+        airis.load_knowledge(trained_path)
+        input_1d, input_2d = airis.knowledge.raw(airis.knowledge.rule(rule_id), 0)
+        airis.input_1D = list(input_1d)
+        airis.input_2D = [[int(val) for val in row] for row in input_2d]
+        index = defaultdict(list)
+        for pos, val in np.ndenumerate(airis.input_2D):
+            index[val].append(pos)
+        airis.states = [State(airis.input_1D, airis.input_2D, index, None, 0, 0, [], None)]
+        return airis
+    return airis_at
+
+
+@pytest.fixture
+def trained_airis(airis_at):
+    return airis_at()
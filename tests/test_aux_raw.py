@@ -0,0 +1,76 @@
+import random
+
+import numpy as np
+
+from airis_aux import AIRIS
+
+
+# The scan compare_conditions made over the values in the order they were stored
+def scan(stored, value, k):
+    array = np.asarray(stored)
+    nearest = []
+    for count in range(k):
+        idx = (np.abs(array - value)).argmin()
+        nearest.append(float(array[idx]))
+        array = np.delete(array, idx)
+        if len(array) == 0:
+            break
+    return nearest
+
+
+# aux_raw and its pairs after adding values one at a time
+def store(values):
+    aux_raw = []
+    pairs = []
+    for value in values:
+        AIRIS.add_aux_raw(aux_raw, pairs, value)
+    return aux_raw, pairs
+
+
+def airis(knowledge):
+    airis = AIRIS.__new__(AIRIS)
+    airis.knowledge = knowledge
+    airis.aux_raw_tables = {}
+    return airis
+
+
+def test_add_aux_raw_keeps_the_store_order_and_the_sorted_pairs():
+    aux_raw, pairs = store([0.5, -1.0, 2.0, 0.5, 0.0, -1.0])
+    assert aux_raw == [0.5, -1.0, 2.0, 0.0]
+    assert pairs == [(-1.0, 1), (0.0, 3), (0.5, 0), (2.0, 2)]
+
+
+def test_aux_raw_pairs_are_built_from_a_stored_list_and_kept_up_to_date():
+    knowledge = {'up/0/aux_raw': [0.5, -1.0, 2.0]}
+    aux = airis(knowledge)
+    pairs = aux.aux_raw_pairs('up/0/aux_raw')
+    assert pairs == [(-1.0, 1), (0.5, 0), (2.0, 2)]
+    AIRIS.add_aux_raw(knowledge['up/0/aux_raw'], pairs, 0.0)
+    assert aux.aux_raw_pairs('up/0/aux_raw') is pairs
+    # a list changed some other way is sorted again
+    knowledge['up/0/aux_raw'].append(3.0)
+    assert aux.aux_raw_pairs('up/0/aux_raw') == [(-1.0, 1), (0.0, 3), (0.5, 0), (2.0, 2), (3.0, 4)]
+
+
+def test_nearest_aux_raw_puts_the_value_stored_first_ahead_of_an_equally_close_one():
+    aux_raw, pairs = store([1.0, 0.0])
+    assert AIRIS.nearest_aux_raw(pairs, 0.5, 2) == [1.0, 0.0]
+    aux_raw, pairs = store([0.0, 1.0])
+    assert AIRIS.nearest_aux_raw(pairs, 0.5, 2) == [0.0, 1.0]
+    assert AIRIS.nearest_aux_raw(pairs, 0.5, 5) == [0.0, 1.0]
+    assert AIRIS.nearest_aux_raw([], 0.5, 3) == []
+
+
+def test_nearest_aux_raw_matches_the_scan_over_the_stored_values():
+    rng = random.Random(0)
+    for count in range(300):
+        stored = []
+        for number in range(rng.randrange(1, 30)):
+            value = round(rng.uniform(-1, 1), 1)
+            if value not in stored:
+                stored.append(value)
+        aux_raw, pairs = store(stored)
+        assert aux_raw == stored
+        value = round(rng.uniform(-1.2, 1.2), rng.choice([1, 2]))
+        k = rng.randrange(1, 8)
+        assert AIRIS.nearest_aux_raw(pairs, value, k) == scan(stored, value, k)
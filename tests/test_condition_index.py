@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from condition_index import ConditionIndex
+from other_useful_functions import array_dif
+
+
+def conditions(count, vis_shape, aux_len, seed=0):
+    rng = np.random.RandomState(seed)
+    knowledge = dict()
+    for number in range(count):
+        path = 'condition/' + str(number) + '/'
+        knowledge[path + 'vis_data'] = rng.randint(0, 4, vis_shape).astype(np.float32)
+        knowledge[path + 'aux_data'] = np.round(rng.uniform(-2, 2, aux_len), 2).astype(np.float32)
+    return knowledge
+
+
+def raw_dif(knowledge, path, vis, aux):
+    return np.sum(array_dif(vis, knowledge[path + 'vis_data'])) + np.sum(array_dif(aux, knowledge[path + 'aux_data']))
+
+
+@pytest.mark.parametrize('vis_shape, aux_len', [((1, 1), 4), ((5, 7), 3), ((12, 12), 40)])
+def test_distances_are_the_sums_of_array_dif(vis_shape, aux_len):
+    knowledge = conditions(50, vis_shape, aux_len)
+    index = ConditionIndex(block=16)
+    paths = ['condition/' + str(number) + '/' for number in range(0, 50, 3)]
+    rows = [index.row(knowledge, path) for path in paths]
+    rng = np.random.RandomState(1)
+    vis = rng.randint(0, 4, vis_shape).astype(np.float32)
+    aux = np.round(rng.uniform(-2, 2, aux_len), 2).astype(np.float32)
+
+    difs = index.distances(rows, vis, aux)
+    for path, dif in zip(paths, difs):
+        assert dif.tobytes() == raw_dif(knowledge, path, vis, aux).tobytes()
+
+    # one model per row
+    models = [(vis + number, aux - number) for number in range(len(rows))]
+    difs = index.distances(rows, [model[0] for model in models], [model[1] for model in models])
+    for path, model, dif in zip(paths, models, difs):
+        assert dif.tobytes() == raw_dif(knowledge, path, model[0], model[1]).tobytes()
+
+
+def test_row_adds_a_condition_once():
+    knowledge = conditions(3, (2, 2), 2)
+    index = ConditionIndex()
+    assert index.row(knowledge, 'condition/1/') == 0
+    assert index.row(knowledge, 'condition/0/') == 1
+    assert index.row(knowledge, 'condition/1/') == 0
+    assert len(index) == 2
+
+
+def test_row_raises_value_error_for_a_condition_of_another_shape():
+    knowledge = conditions(1, (2, 2), 2)
+    knowledge.update(('other/' + key[len('condition/0/'):], value[:1]) for key, value in list(knowledge.items()))
+    index = ConditionIndex()
+    index.row(knowledge, 'condition/0/')
+    with pytest.raises(ValueError):
+        index.row(knowledge, 'other/')
+
+
+def test_closest_picks_the_first_of_equally_close_rows():
+    knowledge = {'a/vis_data': [[1, 1]], 'a/aux_data': [4.0],
+                 'b/vis_data': [[0, 0]], 'b/aux_data': [1.0],
+                 'c/vis_data': [[2, 2]], 'c/aux_data': [1.0]}
+    index = ConditionIndex()
+    rows = [index.row(knowledge, path) for path in ('a/', 'b/', 'c/')]
+    assert index.closest(rows, [[1, 1]], [1.0]) == 1
+    assert index.closest(rows[::-1], [[1, 1]], [1.0]) == 0
+    assert index.closest(rows, [[1, 1]], [4.0]) == 0
@@ -0,0 +1,64 @@
+import heapq
+import random
+
+import pytest
+
+from frontier import Frontier
+
+
+class Stub(object):
+
+    def __init__(self, anti_goal):
+        self.anti_goal = anti_goal
+
+
+def test_pops_in_the_order_of_heapq():
+    rng = random.Random(0)
+    states = [Stub(False) for index in range(50)]
+    frontier = Frontier(states)
+    heap = []
+    for count in range(300):
+        if heap and rng.random() < 0.4:
+            assert frontier.pop() == heapq.heappop(heap)
+        else:
+            entry = (rng.randrange(10), rng.randrange(50))
+            frontier.push(entry)
+            heapq.heappush(heap, entry)
+        assert len(frontier) == len(heap)
+    while heap:
+        assert frontier.pop() == heapq.heappop(heap)
+
+
+def test_furthest_skips_anti_goals_and_popped_states():
+    states = [Stub(False), Stub(False), Stub(False), Stub(True)]
+    frontier = Frontier(states)
+    for entry in ((3, 0), (2, 1), (1, 2), (0, 3), (4, 2)):
+        frontier.push(entry)
+    assert frontier.furthest() == 2
+    assert frontier.pop() == (0, 3)
+    assert frontier.pop() == (1, 2)
+    # state 2 is still in the heap as (4, 2)
+    assert frontier.furthest() == 2
+    assert frontier.pop() == (2, 1)
+    assert frontier.pop() == (3, 0)
+    assert frontier.furthest() == 2
+    assert frontier.pop() == (4, 2)
+    with pytest.raises(IndexError):
+        frontier.furthest()
+
+
+def test_furthest_raises_index_error_with_only_anti_goals():
+    frontier = Frontier([Stub(True)])
+    frontier.push((0, 0))
+    with pytest.raises(IndexError):
+        frontier.furthest()
+
+
+def test_pop_until_stops_at_the_first_index_not_skipped_or_the_last_entry():
+    frontier = Frontier([Stub(False) for index in range(4)])
+    for entry in ((0, 0), (1, 1), (2, 2), (3, 3)):
+        frontier.push(entry)
+    assert frontier.pop_until(lambda index: index < 2) == 2
+    assert len(frontier) == 1
+    assert frontier.pop_until(lambda index: True) == 3
+    assert len(frontier) == 0
@@ -0,0 +1,37 @@
+import pytest
+
+
+def fresh_table(airis, given_goal):
+    airis.goal_tables = dict()
+    return airis.goal_table(given_goal)
+
+
+@pytest.mark.parametrize('given_goal', [[[(2, '+')], []], [[(0, '-')], []], [[(1, '+'), (2, '-')], []]])
+def test_cached_table_is_the_fresh_compile(trained_airis, given_goal):
+    table = trained_airis.goal_table(given_goal)
+    assert table
+    assert trained_airis.goal_table(given_goal) is table
+    assert fresh_table(trained_airis, given_goal) == table
+
+
+def test_2d_goal_entries_add_no_rules(trained_airis):
+    table = trained_airis.goal_table([[(2, '+')], []])
+    assert trained_airis.goal_table([[(2, '+')], [(2, '+'), (0, '-')]]) == table
+
+
+def test_touch_of_a_goal_index_recompiles_the_table(trained_airis):
+    airis = trained_airis
+    given_goal = [[(2, '+')], []]
+    table = airis.goal_table(given_goal)
+    listed = set(entry[0] for entry in table)
+    group_1d = next(group_1d for group_1d in airis.knowledge.groups_1d[2] if group_1d.rule_id not in listed)
+    group_1d.rel = {5: [1, 1]}
+
+    # the change is only picked up once the rule is touched
+    assert airis.goal_table(given_goal) is table
+    airis.knowledge.touch(*airis.knowledge.rules[group_1d.rule_id].handle())
+    assert airis.knowledge.versions_1d[2]
+    recompiled = airis.goal_table(given_goal)
+    assert recompiled is not table
+    assert group_1d.rule_id in set(entry[0] for entry in recompiled)
+    assert fresh_table(airis, given_goal) == recompiled
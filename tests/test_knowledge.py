@@ -0,0 +1,243 @@
+import os
+
+import numpy as np
+import pytest
+
+from knowledge import Knowledge, KnowledgeJournal, parse_rule_id, read_knowledge, rule_key
+
+
+# One rule of value 1 for 'up' with a 1D condition group on index 0 and one exception
+def small_knowledge():
+    kb = Knowledge()
+    group = kb.add_rule(kb.new_rule_id(), 'up', 1)
+    group.act['up'] = [1, 1]
+    group.rel[2] = [1, 1]
+    group.abs[2] = [1, 1]
+    group.inclusions = [(0, 1, 1.0, -1.0)]
+    group.inclusion_set = {(0, 1, 1.0, -1.0)}
+    group.oraw = kb.snapshot([[0, 0], [[1, 0], [0, 1]]])
+    group.lraw = kb.snapshot([[0, 0], [[0, 1], [0, 1]]])
+    group.lstep = 3
+    group_1d = kb.add_rule_1d(group, 0)
+    group_1d.oval[5] = [1, 1]
+    group_1d.rel[0] = [1, 1]
+    exception = kb.add_exception(group, kb.new_exception_id())
+    exception.act['up'] = [1, 1]
+    exception.rel = [(1, 0, 2.0, -1.0)]
+    exception.dims_1d[group.id, str(group_1d.index)] = [0]
+    group_1d.exception_oval[exception.id] = {5: [1, 1]}
+    return kb
+
+
+def test_round_trip_keeps_every_flat_key():
+    kb = small_knowledge()
+    knowledge = kb.to_dict()
+    assert Knowledge.from_dict(knowledge).to_dict() == knowledge
+
+
+def test_round_trip_rebuilds_the_rule_objects():
+    kb = Knowledge.from_dict(small_knowledge().to_dict())
+    group = kb.rule(0)
+    assert kb.group(1, 0) is group
+    assert kb.rules_for(1) == [group]
+    assert kb.actions == {'up': [0]}
+    assert group.rules_1d[0] is kb.groups_1d[0][0]
+    assert group.exception_groups[0] is kb.exceptions[0]
+    assert kb.exceptions[0].dims_1d == {(0, '0'): [0]}
+    assert kb.groups_1d[0][0].exception_oval == {0: {5: [1, 1]}}
+    assert (kb.next_rule_id, kb.next_exception_id) == (1, 1)
+
+
+def test_group_raises_key_error_like_the_flat_dict():
+    kb = small_knowledge()
+    for handle in ((1, 1), (2, 0)):
+        try:
+            kb.group(*handle)
+        except KeyError:
+            continue
+        assert False, handle
+
+
+def test_touch_moves_on_the_versions_of_the_value_and_its_1d_indices():
+    kb = small_knowledge()
+    versions = kb.versions[1]
+    versions_1d = kb.versions_1d[0]
+    kb.touch(1, 0)
+    assert kb.versions[1] == versions + 1
+    assert kb.versions_1d[0] == versions_1d + 1
+    assert (1, 0) in kb.dirty
+
+
+def test_trained_knowledge_round_trips(trained_path):
+    knowledge = Knowledge.load(trained_path).to_dict()
+    assert Knowledge.from_dict(knowledge).to_dict() == knowledge
+    assert len(np.load(trained_path, allow_pickle=True).item()['2d']) == len(Knowledge.from_dict(knowledge).values)
+
+
+def test_journal_replays_changes_made_after_the_snapshot(tmp_path):
+    fname = str(tmp_path / 'Knowledge.npy')
+    kb = small_knowledge()
+    kb.save_journal(fname)
+    group = kb.add_rule(kb.new_rule_id(), 'down', 2)
+    group.act['down'] = [1, 1]
+    kb.save_journal(fname)
+    kb.rule(0).act['up'] = [1, 2]
+    kb.touch(1, 0)
+    kb.save_journal(fname)
+    kb.close()
+
+    assert len(KnowledgeJournal.read(fname)) == 2
+    assert np.load(fname, allow_pickle=True).item() != kb.to_dict()
+    assert read_knowledge(fname) == kb.to_dict()
+    assert Knowledge.load(fname).to_dict() == kb.to_dict()
+
+
+def test_journal_compaction_drops_the_records_in_the_snapshot(tmp_path):
+    fname = str(tmp_path / 'Knowledge.npy')
+    kb = small_knowledge()
+    kb.save_journal(fname, compact_every=2)
+    for count in range(3):
+        kb.rule(0).lstep = count
+        kb.touch(1, 0)
+        kb.save_journal(fname, compact_every=2)
+    kb.close()
+
+    assert len(KnowledgeJournal.read(fname)) == 1
+    assert Knowledge.load(fname).rule(0).lstep == 2
+
+
+def test_journal_compaction_replays_the_records_onto_the_snapshot(tmp_path):
+    fname = str(tmp_path / 'Knowledge.npy')
+    journal = KnowledgeJournal(fname)
+    journal.save({'a': 1, 'b': 1})
+    journal.append({'b': 2})
+    journal.compact(wait=True)
+    journal.append({'c': 3})
+    journal.close()
+
+    assert np.load(fname, allow_pickle=True).item() == {'a': 1, 'b': 2}
+    assert KnowledgeJournal.read(fname) == [{'c': 3}]
+
+
+def test_journal_ignores_a_record_cut_short(tmp_path):
+    fname = str(tmp_path / 'Knowledge.npy')
+    journal = KnowledgeJournal(fname)
+    journal.save({'a': 1})
+    journal.append({'b': 2})
+    journal.append({'c': 3})
+    journal.close()
+    with open(fname + '.journal', 'rb+') as f:
+        f.truncate(os.path.getsize(fname + '.journal') - 1)
+
+    assert read_knowledge(fname) == {'a': 1, 'b': 2}
+
+
+def test_journal_raises_a_failed_snapshot_write_on_the_caller(tmp_path):
+    fname = str(tmp_path / 'Knowledge.npy')
+    journal = KnowledgeJournal(fname)
+    journal.append({'a': 1})
+    os.mkdir(fname)
+    journal.compact()
+    with pytest.raises(OSError):
+        journal.wait()
+
+    # the journal keeps working and still holds the record
+    journal.append({'b': 2})
+    os.rmdir(fname)
+    journal.close()
+    assert KnowledgeJournal.read(fname) == [{'a': 1}, {'b': 2}]
+
+
+def test_journal_reopens_its_file_when_the_rewrite_fails(tmp_path):
+    fname = str(tmp_path / 'Knowledge.npy')
+    journal = KnowledgeJournal(fname)
+    journal.append({'a': 1})
+    os.mkdir(fname + '.journal.tmp')
+    journal.compact()
+    with pytest.raises(OSError):
+        journal.wait()
+
+    journal.append({'b': 2})
+    journal.close()
+    assert read_knowledge(fname) == {'a': 1, 'b': 2}
+
+
+def test_columns_round_trip(tmp_path, trained_path):
+    kb = Knowledge.load(trained_path)
+    kb.save_columns(str(tmp_path / 'cols'))
+    assert Knowledge.load(str(tmp_path / 'cols')).to_dict() == kb.to_dict()
+
+
+def test_columns_keep_raw_observations_out_of_the_index(tmp_path, trained_path):
+    kb = Knowledge.load(trained_path)
+    kb.save_columns(str(tmp_path / 'cols'))
+    index = np.load(str(tmp_path / 'cols' / 'index.npy'), allow_pickle=True).item()
+    assert set(index.keys()) == {'plan_depth', 'next_ids', 'values', 'actions', 'extra'}
+
+    loaded = Knowledge.load_columns(str(tmp_path / 'cols'))
+    group = loaded.rule(0)
+    assert isinstance(loaded.raw_2d, np.memmap)
+    assert loaded.raw(group, 0) == kb.raw(kb.rule(0), 0)
+
+
+def test_columns_load_rules_on_first_use(tmp_path):
+    kb = small_knowledge()
+    kb.save_columns(str(tmp_path / 'cols'))
+    loaded = Knowledge.load_columns(str(tmp_path / 'cols'))
+    group = loaded.rule(0)
+    assert 'act' not in group.__dict__
+    assert group.act == {'up': [1, 1]}
+    assert group.rules_1d[0] is loaded.groups_1d[0][0]
+    assert group.exception_groups[0] is loaded.exceptions[0]
+    assert loaded.exceptions[0].rel == [(1, 0, 2.0, -1.0)]
+
+
+def test_columns_can_be_saved_again_from_a_loaded_store(tmp_path):
+    kb = small_knowledge()
+    kb.save_columns(str(tmp_path / 'cols'))
+    loaded = Knowledge.load_columns(str(tmp_path / 'cols'))
+    loaded.rule(0).lstep = 7
+    loaded.save_columns(str(tmp_path / 'cols'))
+    assert Knowledge.load_columns(str(tmp_path / 'cols')).rule(0).lstep == 7
+    assert Knowledge.load_columns(str(tmp_path / 'cols')).rule(0).oraw is None
+
+
+def test_renumber_gives_uuid_rules_integer_ids(trained_path):
+    assert 'next_ids' not in np.load(trained_path, allow_pickle=True).item()
+    kb = Knowledge.load(trained_path)
+    assert sorted(kb.rules) == list(range(len(kb.rules)))
+    assert sorted(kb.exceptions) == list(range(len(kb.exceptions)))
+    assert (kb.next_rule_id, kb.next_exception_id) == (len(kb.rules), len(kb.exceptions))
+    for group in kb.rules.values():
+        assert all(isinstance(rule_id, int) for rule_id in group.mrules)
+        assert all(isinstance(rule_id, int) for rule_id in group.lrules or ())
+        assert all(group.exception_groups[exception_id].id == exception_id for exception_id in group.exceptions)
+        for exception in group.exception_groups.values():
+            assert all(rule_id in kb.rules for rule_id, group_1d in exception.dims_1d)
+    for rule_ids in kb.actions.values():
+        assert all(rule_id in kb.rules for rule_id in rule_ids)
+    for di_groups in kb.groups_1d.values():
+        assert all(isinstance(group_1d.rule_id, int) for group_1d in di_groups)
+
+
+def test_renumbered_rule_ids_are_written_through_rule_key(trained_path):
+    kb = Knowledge.load(trained_path)
+    keys = [key for key in kb.to_dict() if isinstance(key, str) and '#' in key]
+    assert keys
+    for key in keys:
+        segments = [part for part in key.split('/') if part.startswith('#')]
+        assert len(segments) == 1
+        assert parse_rule_id(segments[0], False) in kb.rules
+
+
+def test_rule_ids_of_keys_without_the_marker_are_read(tmp_path):
+    knowledge = small_knowledge().to_dict()
+    assert knowledge[rule_key('1d', 0) + '/0/exceptions/0'] == [0]
+    # files written before every rule id key went through rule_key
+    bare = dict((key.replace('#', ''), value) if key.startswith('1d/#') and '/exceptions/' in key
+                else (key, value) for key, value in knowledge.items())
+    assert '1d/0/0/exceptions/0' in bare
+    assert Knowledge.from_dict(bare).to_dict() == knowledge
+    assert parse_rule_id('3', False) == 3
+    assert parse_rule_id('#3', False) == 3
+    assert parse_rule_id('a1b2c3', True) == 'a1b2c3'
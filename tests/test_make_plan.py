@@ -0,0 +1,68 @@
+import pytest
+
+ACTIONS = ['up', 'down', 'left', 'right']
+GOAL = [[[2, '+']], []]
+
+
+# Plans GOAL with the trained knowledge from the first state of a trained rule whose plan takes about 200 states
+@pytest.fixture
+def plan(airis_at):
+    def plan(**settings):
+        airis = airis_at(18)
+        for name, value in settings.items():
+            setattr(airis, name, value)
+        airis.make_plan(GOAL, False)
+        return airis
+    return plan
+
+
+# Every state of the plan is still there, and each one was predicted from the one before it
+def assert_plan_is_kept(airis):
+    assert airis.action_plan
+    prev_state = 0
+    for act, index in reversed(airis.action_plan):
+        assert airis.states[index] is not None
+        assert airis.states[index].prev_state == prev_state
+        assert airis.states[index].action == act
+        prev_state = index
+
+
+def test_budgets_cut_the_plan_short(plan):
+    unbounded = plan()
+    assert not unbounded.plan_truncated
+    assert len(unbounded.states) > 100
+
+    airis = plan(plan_max_states=40)
+    assert airis.plan_truncated
+    # the budget is checked before each expansion, which adds one state per action
+    assert len(airis.states) - 1 < 40 + len(ACTIONS)
+    assert_plan_is_kept(airis)
+
+    airis = plan(plan_deadline=0)
+    assert airis.plan_truncated
+    assert len(airis.states) == 1 + len(ACTIONS)
+    assert_plan_is_kept(airis)
+
+
+def test_budgets_not_reached_keep_the_unbounded_plan(plan):
+    unbounded = plan()
+    airis = plan(plan_deadline=10 ** 6, plan_max_states=10 ** 6)
+    assert not airis.plan_truncated
+    assert airis.action_plan == unbounded.action_plan
+
+
+def test_evicting_states_keeps_the_unbounded_plan(plan):
+    unbounded = plan()
+    airis = plan(plan_keep_states=20)
+    assert airis.action_plan == unbounded.action_plan
+    # states were dropped while planning, not only by the compaction after it
+    assert airis.plan_kept < len(airis.states)
+    assert sum(state is not None for state in airis.states) == len(airis.action_plan) + 1
+    assert_plan_is_kept(airis)
+
+
+def test_evicting_states_with_a_budget(plan):
+    airis = plan(plan_keep_states=20, plan_max_states=60)
+    assert airis.plan_truncated
+    assert airis.plan_kept < len(airis.states)
+    assert_plan_is_kept(airis)
@@ -0,0 +1,71 @@
+import copy
+
+import numpy as np
+
+from model import Model
+
+
+def snapshot(model):
+    return (copy.deepcopy(model.vis_env), copy.deepcopy(model.vis_count), list(model.vis_count_list),
+            copy.deepcopy(model.vis_count_pos), sorted(model.vis_count_heap), copy.deepcopy(model.aux_env))
+
+
+def assert_unchanged(model, before):
+    after = snapshot(model)
+    assert np.array_equal(after[0], before[0])
+    assert after[1:5] == before[1:5]
+    assert np.array_equal(after[5], before[5])
+
+
+def root():
+    vis_env = np.array([[0, 1, 1], [2, 0, 0]], dtype=np.float32)
+    aux_env = np.array([0.5, -1.0], dtype=np.float32)
+    return Model(vis_env=vis_env, aux_env=aux_env)
+
+
+def test_derived_models_share_the_inputs_until_they_change_them():
+    parent = root()
+    child = Model(prev_model=parent)
+    grandchild = Model(prev_model=child)
+    assert grandchild.vis_env is parent.vis_env
+    assert grandchild.vis_count_pos is parent.vis_count_pos
+    assert grandchild.aux_env is parent.aux_env
+
+
+def test_updates_of_a_child_and_grandchild_leave_the_parent_unchanged():
+    parent = root()
+    before = snapshot(parent)
+    child = Model(prev_model=parent)
+    child.update_vis_value(3.0, (0, 1))
+    child.update_aux_value(2.0, 0)
+    child_before = snapshot(child)
+    grandchild = Model(prev_model=child)
+    grandchild.update_vis_value(2.0, (0, 0))
+    grandchild.update_vis_value(2.0, (0, 2))
+    grandchild.update_aux_value(7.0, 1)
+
+    assert_unchanged(parent, before)
+    assert_unchanged(child, child_before)
+    assert grandchild.vis_env[0].tolist() == [2, 3, 2]
+    assert grandchild.vis_count == {0: 2, 2: 3, 3: 1}
+    assert sorted(grandchild.vis_count_heap) == [(1, 3.0), (2, 0.0), (3, 2.0)]
+    assert grandchild.vis_count_pos[2] == ((1, 0), (0, 0), (0, 2))
+    assert grandchild.aux_env.tolist() == [2.0, 7.0]
+    assert grandchild.predicted_vis_change == [(0, 0, 0.0, 2.0), (0, 2, 1.0, 2.0)]
+
+
+def test_updates_of_the_parent_leave_its_children_unchanged():
+    parent = root()
+    child = Model(prev_model=parent)
+    grandchild = Model(prev_model=child)
+    before = snapshot(child)
+    parent.update_vis_value(2.0, (0, 1))
+    parent.update_vis_value(2.0, (0, 2))
+    parent.update_aux_value(4.0, 1)
+
+    assert_unchanged(child, before)
+    assert_unchanged(grandchild, before)
+    assert 1.0 not in parent.vis_count and 1.0 in child.vis_count
+    assert (1, 1.0) not in parent.vis_count_heap and (2, 1.0) in child.vis_count_heap
+    # a model derived from the changed parent sees the change
+    assert Model(prev_model=parent).aux_env.tolist() == [0.5, 4.0]
@@ -0,0 +1,88 @@
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from state import State
+
+ACTIONS = ['up', 'down', 'left', 'right']
+
+
+# The trained AIRIS, counting the predictions it runs
+@pytest.fixture
+def counted_airis(trained_airis, monkeypatch):
+    airis = trained_airis
+    airis.runs = []
+    predict_rules = airis.predict_rules
+
+    def count(act, base_state, step):
+        airis.runs.append((act, airis.states[base_state].last_pos_change_2d))
+        return predict_rules(act, base_state, step)
+    monkeypatch.setattr(airis, 'predict_rules', count)
+    return airis
+
+
+# Predicts act from the observed state with pos as its only changed position, returns whether it ran the rules
+def predict(airis, act, pos):
+    index = defaultdict(list)
+    for cell, val in np.ndenumerate(airis.input_2D):
+        index[val].append(cell)
+    airis.states = [State(airis.input_1D, airis.input_2D, index, None, 0, 0, [pos], None)]
+    runs = len(airis.runs)
+    airis.predict(act, 0, 1)
+    return len(airis.runs) > runs
+
+
+# Values whose rules the cached prediction of act from pos read
+def looked_at(airis, act, pos):
+    for key, entry in airis.predict_cache.items():
+        if key[0] == act and key[2] == (pos,):
+            return set(val for val, version in entry[0])
+
+
+def create_rule(airis):
+    airis.create_rule('up', 10, 9, 1, 0, 1, 0, 0, airis.input_1D, airis.input_1D, airis.input_2D, airis.input_2D, 1)
+
+
+def update_rule(airis):
+    rule_id = airis.knowledge.rules_for(1)[0].id
+    airis.update_rule(None, True, False, None, airis.input_2D, airis.input_1D, 0, [rule_id], [], set(), [])
+
+
+def clean_rule(airis):
+    airis.clean_rule((airis.knowledge.rules_for(1)[0].id, 10, 10), airis.input_2D)
+
+
+@pytest.mark.parametrize('change', [create_rule, update_rule, clean_rule])
+def test_a_rule_change_drops_the_entries_that_read_its_value(counted_airis, change):
+    airis = counted_airis
+    # (10, 9) is a 0 next to a 1, (6, 10) holds a 3
+    positions = [(act, pos) for act in ACTIONS for pos in ((10, 9), (6, 10), (0, 0))]
+    for act, pos in positions:
+        assert predict(airis, act, pos)
+    stale = [(act, pos) for act, pos in positions if 1 in looked_at(airis, act, pos)]
+    assert stale and len(stale) < len(positions)
+
+    change(airis)
+    for act, pos in positions:
+        assert predict(airis, act, pos) == ((act, pos) in stale)
+    for act, pos in positions:
+        assert not predict(airis, act, pos)
+
+
+def test_the_key_does_not_materialize_a_derived_state(counted_airis):
+    airis = counted_airis
+    assert predict(airis, 'up', (6, 10))
+    base = airis.states[0]
+    child = State.derive(base, 'up', 0, 1, [(6, 10)], None)
+    assert airis.predict_key('up', child) == airis.predict_key('up', base)
+    assert child._input_2D is None
+
+
+def test_loading_a_missing_file_drops_the_cached_predictions(counted_airis, tmp_path):
+    airis = counted_airis
+    assert predict(airis, 'up', (10, 9))
+    assert not predict(airis, 'up', (10, 9))
+    airis.load_knowledge(str(tmp_path / 'Knowledge.npy'))
+    assert not airis.knowledge.rules
+    assert predict(airis, 'up', (10, 9))
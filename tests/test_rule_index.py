@@ -0,0 +1,95 @@
+ACTIONS = ['up', 'down', 'left', 'right']
+
+
+# The filter create_rule ran over every rule of the value before the signature index
+def assert_candidates_match_the_scan(kb):
+    rvals = set(rval for group in kb.rules.values() for rval in group.rel)
+    for val in kb.values:
+        for act in ACTIONS:
+            for rval in rvals:
+                expected = [group.id for group in kb.rules_for(val) if act in group.act and rval in group.rel]
+                assert [group.id for group in kb.candidates(val, act, rval)] == expected
+
+
+def test_candidates_match_the_scan_through_rule_changes(trained_airis):
+    airis = trained_airis
+    kb = airis.knowledge
+    assert_candidates_match_the_scan(kb)
+
+    rule_count = len(kb.rules)
+    # a new rule with inclusions, a new rule without and the duplicate of the last one
+    airis.create_rule('left', 10, 9, 1, 7, 8, 0, 0, airis.input_1D, airis.input_1D, airis.input_2D, airis.input_2D, 1)
+    airis.create_rule('right', 6, 10, 3, 0, 3, 0, 0, airis.input_1D, airis.input_1D, airis.input_2D, airis.input_2D, 1)
+    airis.create_rule('right', 6, 10, 3, 0, 3, 0, 0, airis.input_1D, airis.input_1D, airis.input_2D, airis.input_2D, 1)
+    assert len(kb.rules) == rule_count + 2
+    assert_candidates_match_the_scan(kb)
+
+    rule_id = kb.rules_for(1)[0].id
+    airis.update_rule(None, True, False, None, airis.input_2D, airis.input_1D, 0, [rule_id], [], set(), [])
+    airis.clean_rule((rule_id, 10, 10), airis.input_2D)
+    assert_candidates_match_the_scan(kb)
+
+    # the new rules of values listed before the last value move to the ids of their value
+    kb.renumber()
+    assert kb.rules_for(1)[-1].id != rule_count
+    assert_candidates_match_the_scan(kb)
+
+
+# The check update_rule ran over every exception of the rule before the exception index: the act and every
+# rel condition holds at (x, y), an offset off the grid holding for any value. Exceptions with an offset
+# twice in their rel are always candidates
+def exception_scan(group, act, input_2d, x, y):
+    found = []
+    for exception_id in group.exceptions:
+        exception = group.exception_groups[exception_id]
+        if act not in exception.act:
+            continue
+        offsets = [(rox, roy) for rox, roy, rod in set((rel_data[0], rel_data[1], rel_data[2]) for rel_data in exception.rel)]
+        holds = True
+        for rox, roy, rod, ror in exception.rel:
+            try:
+                if input_2d[x + rox][y + roy] != rod:
+                    holds = False
+            except IndexError:
+                pass
+        if holds or len(set(offsets)) != len(offsets):
+            found.append(exception_id)
+    return found
+
+
+def assert_exception_candidates_match_the_scan(kb, input_2d):
+    checked = 0
+    for group in kb.rules.values():
+        if not group.exceptions:
+            continue
+        for act in ACTIONS:
+            for x in range(0, len(input_2d), 3):
+                for y in range(len(input_2d[0])):
+                    expected = exception_scan(group, act, input_2d, x, y)
+                    assert group.exception_candidates(act, input_2d, x, y) == expected
+                    checked += len(expected)
+    assert checked
+
+
+def test_exception_candidates_match_the_scan_through_rule_changes(trained_airis):
+    airis = trained_airis
+    airis.last_action = 'up'
+    kb = airis.knowledge
+    assert_exception_candidates_match_the_scan(kb, airis.input_2D)
+
+    # new exceptions of a rule of 0 at (10, 9), the second for another action
+    group = next(group for group in kb.rules_for(0) if group.exceptions and group.inclusions and len(group.rules_1d) == len(airis.input_1D))
+    exception_count = len(group.exceptions)
+    airis.update_rule((None, group.id, group.index), False, True, '10:9', airis.input_2D, airis.input_1D, 0, [], [], set(), [])
+    airis.last_action = 'left'
+    airis.update_rule((None, group.id, group.index), False, True, '10:9', airis.input_2D, airis.input_1D, 0, [], [], set(), [])
+    assert len(group.exceptions) == exception_count + 2
+    assert_exception_candidates_match_the_scan(kb, airis.input_2D)
+
+    airis.clean_rule((group.id, 10, 9), airis.input_2D)
+    assert_exception_candidates_match_the_scan(kb, airis.input_2D)
+
+    # the new exceptions move to the ids of their rule
+    kb.renumber()
+    assert group.exceptions[-1] != kb.next_exception_id - 1
+    assert_exception_candidates_match_the_scan(kb, airis.input_2D)
@@ -0,0 +1,58 @@
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from rule_matcher import compile_conditions, score_1d, similar_1d
+from state import State
+
+ACTIONS = ['up', 'down', 'left', 'right']
+
+
+def test_score_1d_counts_an_exact_value_as_a_match():
+    assert score_1d({4: [1, 1]}, 4) == [(1, None)]
+    assert score_1d({}, 4) == []
+
+
+def test_score_1d_scores_the_closest_value_by_ratio():
+    assert score_1d({2: [1, 1], 8: [1, 1]}, 4) == [(0.5, 0.5)]
+    assert score_1d({-2: [1, 1]}, -4) == [(0.5, 0.5)]
+    assert score_1d({0: [1, 1]}, 4) == [(0, 1)]
+    assert similar_1d({2: [1, 1], -2: [1, 1]}, 2)[0] == (-1.0, 2)
+
+
+def test_compile_conditions_groups_offsets_by_neighbour():
+    conditions = [(0, 1, 5, 1), (1, 0, 6, 1), (0, 1, 7, 1)]
+    assert compile_conditions(conditions) == ([0, 0, 1], [1, 1, 0], [5, 7, 6], [0, 2])
+
+
+@pytest.fixture
+def trained_airis(airis_at):
+    def airis(vectorized):
+        airis = airis_at()
+        airis.vectorized_predict = vectorized
+        airis.predict_cache_size = 0
+        return airis
+    return airis(False), airis(True)
+
+
+# The vectorized matcher predicts what the per cell scan does on the states the trained rules were made from
+def test_vectorized_predictions_match_the_scan(trained_airis):
+    scan, vectorized = trained_airis
+    changed = 0
+    for rule_id in list(scan.knowledge.rules)[:40:5]:
+        input_1d, input_2d = scan.knowledge.raw(scan.knowledge.rule(rule_id), 0)
+        index = defaultdict(list)
+        for pos, val in np.ndenumerate(input_2d):
+            index[val].append(pos)
+        for airis in trained_airis:
+            airis.states = [State(input_1d, input_2d, index, None, 0, 0, [], None)]
+        for act in ACTIONS:
+            expected = scan.predict_rules(act, 0, 0)
+            predicted = vectorized.predict_rules(act, 0, 0)
+            assert predicted[0].input_2D == expected[0].input_2D
+            assert predicted[0].input_1D == expected[0].input_1D
+            assert repr(predicted[1:]) == repr(expected[1:])
+            if expected[0].input_2D != [list(row) for row in input_2d]:
+                changed += 1
+    assert changed
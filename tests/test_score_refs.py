@@ -0,0 +1,103 @@
+import random
+
+import numpy as np
+import pytest
+
+from airis_aux import AIRIS
+
+
+# The loop compare_conditions scored the conditions with, one ref at a time
+def loop(knowledge, paths, focus_positions, vis_model, aux_model):
+    difs = []
+    for focus_x, focus_y in focus_positions:
+        row = []
+        for data_path in paths:
+            condition_dif = 0
+            try:
+                for dx, dy, prior_val, _ in knowledge[data_path + 'vis_ref']:
+                    x, y = focus_x + dx, focus_y + dy
+                    if 0 <= x < len(vis_model) and 0 <= y < len(vis_model[0]):
+                        if vis_model[x][y] != prior_val:
+                            condition_dif += abs(vis_model[x][y] - prior_val)
+            except KeyError:
+                pass
+            try:
+                for i, prior_val, _ in knowledge[data_path + 'aux_ref']:
+                    if i < len(aux_model):
+                        if aux_model[i] != prior_val:
+                            condition_dif += abs(aux_model[i] - prior_val)
+            except KeyError:
+                pass
+            row.append(condition_dif)
+        difs.append(row)
+    return difs
+
+
+def airis(knowledge):
+    airis = AIRIS.__new__(AIRIS)
+    airis.knowledge = knowledge
+    airis.ref_tables = {}
+    return airis
+
+
+# prior values as numpy float32 like the stored envs give them, or as Python numbers
+def prior(rng, numpy_priors):
+    val = round(rng.uniform(-3, 3), rng.choice([0, 1, 3]))
+    if numpy_priors:
+        return np.float32(val)
+    return rng.choice([val, int(val)])
+
+
+def conditions(rng, rows, cols, aux_len, count, numpy_priors):
+    knowledge = {}
+    for condition_id in range(count):
+        path = 'act/out/1/' + str(condition_id) + '/'
+        shape = rng.choice(['vis', 'aux', 'both', 'none'])
+        # refs reach past the env on every side
+        if shape in ('vis', 'both'):
+            knowledge[path + 'vis_ref'] = [(rng.randrange(-rows - 1, rows + 1), rng.randrange(-cols - 1, cols + 1), prior(rng, numpy_priors), 0)
+                                           for ref in range(rng.randrange(0, 6))]
+        if shape in ('aux', 'both'):
+            knowledge[path + 'aux_ref'] = [(rng.randrange(0, aux_len + 2), prior(rng, numpy_priors), 0) for ref in range(rng.randrange(0, 6))]
+    knowledge['act/out/1'] = list(range(count))
+    return knowledge
+
+
+@pytest.mark.parametrize('numpy_priors', [True, False])
+def test_score_refs_matches_the_loop(numpy_priors):
+    rng = random.Random(0)
+    for count in range(200):
+        rows, cols, aux_len = rng.randrange(1, 8), rng.randrange(1, 8), rng.randrange(0, 5)
+        vis_model = np.round(np.array([[rng.uniform(-3, 3) for y in range(cols)] for x in range(rows)], dtype=np.float32), 1)
+        aux_model = np.round(np.array([rng.uniform(-3, 3) for i in range(aux_len)], dtype=np.float32), 1)
+        knowledge = conditions(rng, rows, cols, aux_len, rng.randrange(1, 6), numpy_priors)
+        focus_positions = [(rng.randrange(rows), rng.randrange(cols)) for position in range(rng.randrange(1, 4))]
+
+        scorer = airis(knowledge)
+        refs = scorer.condition_refs('act/out/1', knowledge['act/out/1'])
+        difs = scorer.score_refs(refs, focus_positions, vis_model, aux_model)
+        expected = loop(knowledge, refs['paths'], focus_positions, vis_model, aux_model)
+        for row, expected_row in zip(difs, expected):
+            for dif, expected_dif in zip(row, expected_row):
+                assert dif == expected_dif
+                assert isinstance(dif, int) == isinstance(expected_dif, int)
+
+
+def test_conditions_without_refs_score_the_integer_0():
+    knowledge = {'act/out/1': [0, 1], 'act/out/1/0/': None, 'act/out/1/1/vis_ref': [(0, 0, np.float32(2), 0)]}
+    scorer = airis(knowledge)
+    refs = scorer.condition_refs('act/out/1', knowledge['act/out/1'])
+    assert refs['has_vis'] == [False, True] and refs['has_aux'] == [False, False]
+    vis_model = np.array([[2, 5]], dtype=np.float32)
+    assert scorer.score_refs(refs, [(0, 0), (0, 1)], vis_model, np.array([], dtype=np.float32)) == [[0, 0], [0, 3]]
+    assert type(scorer.score_refs(refs, [(0, 0)], vis_model, np.array([], dtype=np.float32))[0][0]) is int
+
+
+def test_refs_are_compiled_again_once_the_list_grows():
+    knowledge = {'act/out/1': [0], 'act/out/1/0/aux_ref': [(0, 1.0, 0)], 'act/out/1/1/aux_ref': [(0, 3.0, 0)]}
+    scorer = airis(knowledge)
+    refs = scorer.condition_refs('act/out/1', knowledge['act/out/1'])
+    assert scorer.condition_refs('act/out/1', knowledge['act/out/1']) is refs
+    knowledge['act/out/1'].append(1)
+    refs = scorer.condition_refs('act/out/1', knowledge['act/out/1'])
+    assert scorer.score_refs(refs, [(0, 0)], np.zeros((1, 1), dtype=np.float32), np.array([2], dtype=np.float32)) == [[1, 1]]
@@ -0,0 +1,96 @@
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from airis_stable import AIRIS
+from knowledge import Knowledge
+from snapshots import SnapshotStore
+from state import State
+
+
+def test_ints_and_floats_do_not_share_an_entry():
+    store = SnapshotStore()
+    ids = [store.add([[0], [[1, 2]]]), store.add([[0.0], [[1.0, 2.0]]]),
+           store.add(np.array([1, 2], dtype=np.int32)), store.add(np.array([1, 2], dtype=np.float32))]
+    assert len(set(ids)) == len(store) == 4
+    assert store.get(ids[0]) == [[0], [[1, 2]]]
+    assert type(store.get(ids[1])[1][0][0]) is float
+
+
+def test_arrays_are_addressed_by_dtype_shape_and_bytes():
+    store = SnapshotStore()
+    data = np.arange(6, dtype=np.float32).reshape(2, 3)
+    assert store.add(data) == store.add(data.copy())
+    # a strided view with the same contents is the same entry
+    assert store.add(np.arange(12, dtype=np.float32).reshape(2, 6)[:, ::2] / 2) == store.add(data)
+    assert store.add(data.reshape(3, 2)) != store.add(data)
+    assert store.add(data.view(np.int32)) != store.add(data)
+    assert len(store) == 3
+
+
+def test_stored_arrays_are_read_only_copies():
+    store = SnapshotStore()
+    data = np.zeros((2, 2), dtype=np.float32)
+    snapshot = store.intern(data)
+    assert snapshot is not data
+    assert not snapshot.flags.writeable
+    with pytest.raises(ValueError):
+        snapshot[0, 0] = 1
+    data[0, 0] = 1
+    assert snapshot[0, 0] == 0
+    assert store.intern(np.zeros((2, 2), dtype=np.float32)) is snapshot
+
+
+def test_lists_are_copied_when_stored():
+    store = SnapshotStore()
+    data = [[0.0], [[1, 2]]]
+    snapshot = store.intern(data)
+    data[1][0][0] = 5
+    assert snapshot == [[0.0], [[1, 2]]]
+
+
+# Two rules create_rule made from the same observation, for different actions. With fname the knowledge is
+# saved to a journal before and after the rules are made
+def created_rules(fname=None):
+    input_2d = [[0, 1, 0], [0, 2, 0]]
+    airis = AIRIS([0.0], input_2d, ['up', 'down'])
+    airis.input_1D = [0.0]
+    airis.input_2D = input_2d
+    index = defaultdict(list)
+    for pos, val in np.ndenumerate(input_2d):
+        index[val].append(pos)
+    airis.states = [State(airis.input_1D, input_2d, index, None, 0, 0, [], None)]
+    if fname is not None:
+        airis.save_knowledge(fname)
+    for act in ('up', 'down'):
+        airis.create_rule(act, 0, 1, 1, 0, 1, 0, 0, [0.0], [0.0], input_2d, input_2d, 1)
+    if fname is not None:
+        airis.save_knowledge(fname)
+        airis.knowledge.close()
+    return airis.knowledge
+
+
+def assert_one_shared_observation(kb):
+    first, second = kb.rules_for(1)
+    assert first.oraw is first.lraw
+    assert second.oraw is first.oraw
+    assert first.oraw == [[0.0], [[0, 1, 0], [0, 2, 0]]]
+
+
+def test_create_rule_shares_one_observation():
+    assert_one_shared_observation(created_rules())
+
+
+def test_shared_observation_survives_the_dict_round_trip():
+    kb = Knowledge.from_dict(created_rules().to_dict())
+    assert_one_shared_observation(kb)
+    assert len(kb.snapshots) == 1
+
+
+def test_shared_observation_survives_the_journal(tmp_path):
+    fname = str(tmp_path / 'Knowledge.npy')
+    created_rules(fname)
+    # the rules are only in the journal, the snapshot was written before they were made
+    assert not Knowledge.from_dict(np.load(fname, allow_pickle=True).item()).rules
+    assert_one_shared_observation(Knowledge.load(fname))
@@ -0,0 +1,88 @@
+import random
+from collections import OrderedDict
+
+import pytest
+
+import state
+from state import State, hash_2d
+
+
+def grid(rows=6, cols=7, seed=0):
+    rng = random.Random(seed)
+    return [[rng.choice([0, 1, 2, 3]) for y in range(cols)] for x in range(rows)]
+
+
+def base_state(input_2D):
+    base = State([0.0], input_2D, {}, None, None, 0, None, None)
+    base.heap()
+    return base
+
+
+def index_of(input_2D):
+    index = dict()
+    for x, row in enumerate(input_2D):
+        for y, val in enumerate(row):
+            index.setdefault(val, []).append((x, y))
+    return index
+
+
+def test_set_2d_keeps_the_index_and_hash_of_the_grid():
+    rng = random.Random(1)
+    current = base_state(grid())
+    for count in range(200):
+        x, y, val = rng.randrange(6), rng.randrange(-7, 7), rng.choice([0, 1, 2, 3, 4])
+        current.set_2d(x, y, val)
+        assert dict(current.input_2D_idx) == index_of(current.input_2D)
+        assert current.zobrist == hash_2d(current.input_2D)
+
+
+def test_derived_states_share_unchanged_rows_and_rebuild_dropped_grids(monkeypatch):
+    monkeypatch.setattr(State, 'grid_budget', 1)
+    monkeypatch.setattr(state, 'materialized', OrderedDict())
+    base = base_state(grid())
+    child = State.derive(base, 'up', base, 1, None, None)
+    child.set_2d(2, 3, 9)
+    grandchild = State.derive(child, 'up', child, 2, None, None)
+    grandchild.set_2d(4, 0, 8)
+
+    assert grandchild.delta_2d == {(4, 0): 8}
+    assert grandchild.input_2D[2][3] == 9
+    assert grandchild.input_2D[1] is base.input_2D[1]
+    # the budget of one grid dropped the child's when the grandchild was built
+    assert child._input_2D is None
+    expected = grid()
+    expected[2][3] = 9
+    assert child.input_2D == expected
+    assert base.input_2D == grid()
+
+
+def test_distance_matches_a_scan_of_the_positions(monkeypatch):
+    monkeypatch.setattr(State, 'distance_scan', 0)
+    current = base_state(grid(9, 11, seed=2))
+    for val in (0, 1, 2, 3):
+        positions = current.input_2D_idx[val]
+        for x in range(-2, 11):
+            for y in range(-2, 13):
+                expected = min(abs(pos[0] - x) + abs(pos[1] - y) for pos in positions)
+                assert current.distance(val, x, y) == expected
+    assert current.distance(5, 0, 0) is None
+
+
+def test_hash_tells_states_apart_by_both_inputs():
+    first = base_state(grid())
+    second = base_state(grid())
+    assert first.hash() == second.hash()
+    second.set_2d(0, 0, 7)
+    assert first.hash() != second.hash()
+    second.set_2d(0, 0, grid()[0][0])
+    second.input_1D[0] = 1.0
+    assert first.hash() != second.hash()
+
+
+def test_verify_hashes_raises_on_a_collision(monkeypatch):
+    monkeypatch.setattr(State, 'verify_hashes', True)
+    monkeypatch.setattr(state, 'hash_contents', dict())
+    monkeypatch.setattr(state, 'hash_2d', lambda input_2D: 0)
+    state.state_hash([0], [[1]])
+    with pytest.raises(ValueError):
+        state.state_hash([0], [[2]])
@@ -0,0 +1,79 @@
+import gc
+import os
+import shutil
+import struct
+import weakref
+
+import pytest
+
+from trace_log import TraceWriter, encode_frame, latest_frames, read_frames, trace_files
+
+
+def write_frames(fname, frames):
+    with open(fname, 'wb') as f:
+        for time_step, grid in frames:
+            f.write(encode_frame(time_step, grid))
+
+
+def test_frames_round_trip_in_the_smallest_type_that_holds_them(tmp_path):
+    fname = str(tmp_path / '0.trace')
+    frames = [(0, [[0, 1], [2, 3]]), (1, [[-200, 300]]), (2, [[70000], [-1]]), (3, [[0.5, 1.0, -2.25]]), (7, [[3.0, 4.0]])]
+    write_frames(fname, frames)
+    assert read_frames(fname) == frames
+    assert len(encode_frame(0, [[0, 1], [2, 3]])) < len(encode_frame(0, [[0, 1], [2, 300]])) < len(encode_frame(0, [[0, 1], [2, 0.5]]))
+
+
+def test_a_frame_cut_short_ends_the_file(tmp_path):
+    fname = str(tmp_path / '0.trace')
+    frames = [(0, [[1, 2], [3, 4]]), (0, [[5, 6], [7, 8]])]
+    write_frames(fname, frames)
+    size = os.path.getsize(fname)
+    for cut in (1, 4, len(encode_frame(0, [[5, 6], [7, 8]])) - 1):
+        with open(fname, 'rb+') as f:
+            f.truncate(size - cut)
+        assert read_frames(fname) == frames[:1]
+
+
+def test_rotate_keeps_the_newest_keep_files(tmp_path):
+    dirname = str(tmp_path / 'trace')
+    writer = TraceWriter(dirname, max_bytes=1, keep_files=3)
+    for time_step in range(6):
+        writer.write(time_step, [[time_step]])
+        writer.flush()
+    writer.close()
+    files = trace_files(dirname)
+    assert [os.path.basename(fname) for fname in files] == ['3.trace', '4.trace', '5.trace']
+    assert [read_frames(fname) for fname in files] == [[(3, [[3]])], [(4, [[4]])], [(5, [[5]])]]
+    assert latest_frames(dirname) == [[[5]]]
+
+
+def test_a_write_error_is_raised_on_the_caller(tmp_path):
+    dirname = str(tmp_path / 'trace')
+    writer = TraceWriter(dirname)
+    shutil.rmtree(dirname)
+    writer.write(0, [[1]])
+    with pytest.raises(OSError):
+        writer.close()
+    assert writer.thread is None
+    writer.close()
+
+
+def test_the_writer_keeps_writing_after_an_error(tmp_path):
+    dirname = str(tmp_path / 'trace')
+    writer = TraceWriter(dirname)
+    writer.write(2 ** 32, [[1]])
+    writer.flush()
+    writer.write(1, [[2]])
+    with pytest.raises(struct.error):
+        writer.close()
+    assert read_frames(trace_files(dirname)[0]) == [(1, [[2]])]
+
+
+def test_a_closed_writer_is_not_kept_alive(tmp_path):
+    writer = TraceWriter(str(tmp_path / 'trace'))
+    writer.write(0, [[1]])
+    writer.close()
+    ref = weakref.ref(writer)
+    del writer
+    gc.collect()
+    assert ref() is None
@@ -0,0 +1,166 @@
+import os
+import glob
+import queue
+import atexit
+import struct
+import threading
+import numpy as np
+
+
+# Frame of a trace file: time step, rows, cols and element type, followed by the rows x cols grid
+FRAME = struct.Struct('<IHHB')
+# Element types a grid is stored as. Whole numbers take the smallest integer type that holds them
+DTYPES = [np.dtype('<i1'), np.dtype('<i2'), np.dtype('<i4'), np.dtype('<f8')]
+
+
+def encode_frame(time_step, grid):
+    values = np.asarray(grid, dtype=np.float64)
+    code = len(DTYPES) - 1
+    if values.size and np.array_equal(values, np.trunc(values)):
+        low = values.min()
+        high = values.max()
+        for code, dtype in enumerate(DTYPES[:-1]):
+            if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+                break
+        else:
+            code = len(DTYPES) - 1
+    rows, cols = values.shape
+    return FRAME.pack(time_step, rows, cols, code) + values.astype(DTYPES[code]).tobytes()
+
+
+# (time step, grid) frames of a trace file. A frame cut short by a write still in progress ends the file
+def read_frames(fname):
+    frames = []
+    with open(fname, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset + FRAME.size <= len(data):
+        time_step, rows, cols, code = FRAME.unpack_from(data, offset)
+        offset += FRAME.size
+        dtype = DTYPES[code]
+        end = offset + rows * cols * dtype.itemsize
+        if end > len(data):
+            break
+        grid = np.frombuffer(data, dtype=dtype, count=rows * cols, offset=offset).reshape(rows, cols)
+        frames.append((time_step, grid.tolist()))
+        offset = end
+    return frames
+
+
+# Numbered trace files of dirname, oldest first
+def trace_files(dirname):
+    files = []
+    for fname in glob.glob(os.path.join(dirname, '*.trace')):
+        try:
+            files.append((int(os.path.basename(fname)[:-6]), fname))
+        except ValueError:
+            pass
+    return [fname for number, fname in sorted(files)]
+
+
+# Grids of the latest time step written to dirname, in write order. A time step can start in the file
+# before the newest one when the files were rotated in between
+def latest_frames(dirname):
+    frames = []
+    for fname in trace_files(dirname)[-2:]:
+        frames.extend(read_frames(fname))
+    if not frames:
+        return []
+    time_step = frames[-1][0]
+    return [grid for step, grid in frames if step == time_step]
+
+
+# Writes the predicted grids minds_eye.py shows to numbered .trace files in dirname. write() only keeps
+# the grid, frames are encoded and appended by a writer thread once flush_frames grids are buffered or
+# flush() is called. A file is closed past max_bytes and only the newest keep_files are kept. An error of
+# the writer thread drops the frames it was writing and is raised by the next flush() or close()
+class TraceWriter(object):
+
+    def __init__(self, dirname, max_bytes=1 << 24, keep_files=4, flush_frames=4096):
+        self.dirname = dirname
+        self.max_bytes = max_bytes
+        self.keep_files = keep_files
+        self.flush_frames = flush_frames
+        self.buffer = []
+        os.makedirs(dirname, exist_ok=True)
+        files = trace_files(dirname)
+        # a new session starts a new file so that the files of an earlier one read as older
+        if files:
+            self.number = int(os.path.basename(files[-1])[:-6]) + 1
+        else:
+            self.number = 0
+        self.file = None
+        self.error = None
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    # The rows are copied, not the cells. States replace a row instead of changing it
+    def write(self, time_step, grid):
+        self.buffer.append((time_step, list(grid)))
+        if len(self.buffer) >= self.flush_frames:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.queue.put(self.buffer)
+            self.buffer = []
+        self.raise_error()
+
+    def raise_error(self):
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
+
+    # Runs on the writer thread. It keeps taking frames off the queue after an error, so the queue does not
+    # grow while nothing is written, and opens a new file for the next ones
+    def run(self):
+        while True:
+            frames = self.queue.get()
+            if frames is None:
+                break
+            try:
+                if self.file is None:
+                    self.open_file()
+                self.file.write(b''.join(encode_frame(time_step, grid) for time_step, grid in frames))
+                self.file.flush()
+                if self.file.tell() >= self.max_bytes:
+                    self.rotate()
+            except Exception as error:
+                self.error = error
+                self.close_file()
+        self.close_file()
+
+    def close_file(self):
+        if self.file is not None:
+            try:
+                self.file.close()
+            except Exception as error:
+                self.error = error
+            self.file = None
+
+    # Opens the next file and removes all but the newest keep_files, the new one included
+    def open_file(self):
+        self.file = open(os.path.join(self.dirname, str(self.number) + '.trace'), 'ab')
+        for fname in trace_files(self.dirname)[:-self.keep_files]:
+            os.remove(fname)
+
+    def rotate(self):
+        self.file.close()
+        self.file = None
+        self.number += 1
+
+    # Writes everything buffered and stops the writer thread. A closed writer no longer needs closing at exit,
+    # so the hook goes and does not keep it alive
+    def close(self):
+        if self.thread is not None:
+            if self.buffer:
+                self.queue.put(self.buffer)
+                self.buffer = []
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+            atexit.unregister(self.close)
+        self.raise_error()